@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+# allow running as `python src/benchmarks/adaptive_io_benchmark.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic_library import MEDIA_DIR_IDENTIFIER, SUFFIXES_BY_MEDIA_TYPE, generate_library, inject_contention
+from core.AdaptiveExecutor import AdaptiveExecutor
+from core.SuffixMatcher import SuffixMatcher
+
+
+def get_rename_pairs(root: Path) -> list[tuple[str, str]]:
+    '''
+    Returns ("add" suffix) rename pairs for every file of the generated library, planned without contention
+    '''
+    __matcher = SuffixMatcher(SUFFIXES_BY_MEDIA_TYPE, ("png", "mp4"))
+    __pairs = []
+    for media_type_dir in sorted(Path(root, "consoles").glob(f"*/{MEDIA_DIR_IDENTIFIER}/*")):
+        __names = sorted(os.listdir(media_type_dir))
+        for name, new_name in zip(__names, __matcher.get_target_names(__names, media_type_dir.name, "add")):
+            if new_name is not None:
+                __pairs.append((str(media_type_dir / name), str(media_type_dir / new_name)))
+    return __pairs
+
+
+def run_case(pairs: list[tuple[str, str]], max_workers: int, adaptive_max_workers: int | None, service: float, capacity: int, timeout: float) -> dict:
+    '''
+    Renames every pair through an `AdaptiveExecutor` against the simulated share, then renames them back without contention
+    '''
+    __failed = []
+
+    def __rename(src: str, dst: str) -> None:
+        try:
+            __executor.retry(os.rename, src, dst)
+        except OSError:
+            __failed.append(src)
+
+    with inject_contention(service, capacity, timeout) as __share:
+        __start = time.perf_counter()
+        with AdaptiveExecutor(max_workers, "bench", adaptive_max_workers) as __executor:
+            for src, dst in pairs:
+                __executor.submit(__rename, src, dst)
+        __seconds = time.perf_counter() - __start
+
+    __failed_srcs = set(__failed)
+    for src, dst in pairs:
+        if src not in __failed_srcs:
+            os.rename(dst, src)
+
+    __stats = __executor.get_stats()
+    return {
+        "case": f"adaptive {max_workers}..{adaptive_max_workers}" if adaptive_max_workers is not None else f"fixed {max_workers}",
+        "seconds": __seconds,
+        "files_per_s": (len(pairs) - len(__failed)) / __seconds,
+        "failed": len(__failed),
+        "timeouts": __share["timeouts"],
+        "retries": __stats["retries"],
+        "limit_history": __stats["limit_history"],
+    }
+
+
+### main ###
+if __name__ == "__main__":
+    __parser = argparse.ArgumentParser(description="Compare fixed and adaptive rename concurrency against a simulated network share with limited capacity")
+    __parser.add_argument("--consoles", type=int, default=4, help="number of generated consoles")
+    __parser.add_argument("--files", type=int, default=100, help="number of files per media type")
+    __parser.add_argument("--service-ms", type=float, default=2.0, help="time the share takes to serve one call")
+    __parser.add_argument("--capacity", type=int, default=6, help="number of calls the share serves at once")
+    __parser.add_argument("--timeout-ms", type=float, default=40.0, help="calls queued longer than this fail with ETIMEDOUT")
+    __parser.add_argument("--fixed", default="2,8,32", help="comma separated fixed pool sizes to compare")
+    __parser.add_argument("--start", type=int, default=8, help="starting limit of the adaptive pool")
+    __parser.add_argument("--max-workers", type=int, default=32, help="upper limit of the adaptive pool")
+    __parser.add_argument("--json", type=Path, help="write results to this JSON file")
+    __args = __parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rommediatool-adaptive-") as __temp_dir:
+        generate_library(Path(__temp_dir), consoles=__args.consoles, files=__args.files)
+        __pairs = get_rename_pairs(Path(__temp_dir))
+        print(f"{len(__pairs):,} renames against a share serving {__args.capacity} call(s) at once, {__args.service_ms} ms each, timing out after {__args.timeout_ms} ms")
+
+        __cases = [(int(size), None) for size in __args.fixed.split(",")] + [(__args.start, __args.max_workers)]
+        __results = [run_case(__pairs, max_workers, adaptive_max_workers, __args.service_ms / 1000, __args.capacity, __args.timeout_ms / 1000) for max_workers, adaptive_max_workers in __cases]
+
+    for result in __results:
+        __history = result["limit_history"]
+        print(f"{result['case']:<16} {result['seconds']:7.2f} s  {result['files_per_s']:8.1f} files/s  {result['failed']:5d} failed  {result['timeouts']:5d} timeouts  {result['retries']:5d} retries  limit {__history[-1]} (range {min(__history)}-{max(__history)})")
+
+    if __args.json:
+        __args.json.write_text(json.dumps(__results, indent=4))
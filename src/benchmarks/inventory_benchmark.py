@@ -0,0 +1,115 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import gc
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import sys
+import time
+
+# allow running as `python src/benchmarks/inventory_benchmark.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic_library import SUFFIXES_BY_MEDIA_TYPE
+from core.MediaInventory import MediaInventory
+
+MEDIA_ROOT = "/mnt/media/consoles"
+FILES_PER_DIR = 2_000
+
+
+def iter_directories(entries: int):
+    '''
+    Yields (media dir, media type, names, sizes, mtimes) for `entries` synthetic files, `FILES_PER_DIR` per media type dir
+    '''
+    __media_types = list(SUFFIXES_BY_MEDIA_TYPE)
+    __dir_count = -(-entries // FILES_PER_DIR)
+    for dir_index in range(__dir_count):
+        __count = min(FILES_PER_DIR, entries - dir_index * FILES_PER_DIR)
+        __media_type = __media_types[dir_index % len(__media_types)]
+        __console = f"console{dir_index // len(__media_types):04d}"
+        __extension = "mp4" if __media_type == "videos" else "png"
+        __names = [f"Game Title {dir_index * FILES_PER_DIR + i:07d} (USA, Europe){SUFFIXES_BY_MEDIA_TYPE[__media_type] if i % 3 == 0 else ''}.{__extension}" for i in range(__count)]
+        __sizes = [100_000 + (dir_index * FILES_PER_DIR + i) * 7 % 900_000 for i in range(__count)]
+        __mtimes = [1_700_000_000_000_000_000 + i * 1_000_000 for i in range(__count)]
+        yield f"{MEDIA_ROOT}/{__console}/downloaded_media", __media_type, __names, __sizes, __mtimes
+
+
+def get_rss_bytes() -> int:
+    # current (not peak) resident set size
+    with open("/proc/self/statm") as __statm:
+        return int(__statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(structure: str, entries: int) -> dict:
+    '''
+    Builds `entries` files into `structure` in this (fresh) process and returns its RSS growth, build time and a full scan time
+    '''
+    # synthetic names are generated one directory at a time, so their own cost is freed before the next measurement
+    gc.collect()
+    __rss_before = get_rss_bytes()
+    __start = time.perf_counter()
+
+    if structure == "paths":
+        # baseline: a Path plus size and mtime per file, as a naive scan would keep
+        __inventory = []
+        for media_dir, media_type, names, sizes, mtimes in iter_directories(entries):
+            __inventory.extend((Path(media_dir, media_type, name), size, mtime) for name, size, mtime in zip(names, sizes, mtimes))
+    else:
+        __inventory = MediaInventory()
+        for media_dir, media_type, names, sizes, mtimes in iter_directories(entries):
+            __inventory.add_directory(media_dir, media_type, names, sizes, mtimes)
+
+    __build_seconds = time.perf_counter() - __start
+    gc.collect()
+    __rss_bytes = get_rss_bytes() - __rss_before
+
+    # names are what the planner reads, so time reading every name back
+    __start = time.perf_counter()
+    if structure == "paths":
+        __name_count = sum(1 for path, _, _ in __inventory if path.name)
+    else:
+        __name_count = sum(len(__inventory.get_names(directory.start, directory.end)) for directory in __inventory.iter_directories())
+    __scan_seconds = time.perf_counter() - __start
+
+    return {
+        "structure": structure,
+        "entries": entries,
+        "rss_bytes": __rss_bytes,
+        "bytes_per_entry": __rss_bytes / entries,
+        "reported_bytes": __inventory.get_nbytes() if structure == "inventory" else None,
+        "build_s": __build_seconds,
+        "read_names_s": __scan_seconds,
+        "names_read": __name_count,
+    }
+
+
+def run_benchmarks(sizes: list[int], baseline: bool) -> list[dict]:
+    __results = []
+    __context = multiprocessing.get_context("spawn")
+    for entries in sizes:
+        for structure in (("paths", "inventory") if baseline else ("inventory",)):
+            # one fresh process per measurement, so memory freed by an earlier case cannot be reused and hide growth
+            with ProcessPoolExecutor(max_workers=1, mp_context=__context) as __executor:
+                __results.append(__executor.submit(measure, structure, entries).result())
+    return __results
+
+
+### main ###
+if __name__ == "__main__":
+    __parser = argparse.ArgumentParser(description="Measure memory per file of MediaInventory against a list of (Path, size, mtime) tuples")
+    __parser.add_argument("--sizes", default="1000000,5000000", help="comma separated entry counts (default: 1M and 5M)")
+    __parser.add_argument("--no-baseline", action="store_true", help="skip the Path list baseline, which needs several GB at 5M entries")
+    __parser.add_argument("--json", type=Path, help="write results to this JSON file, for comparison across commits")
+    __args = __parser.parse_args()
+
+    if not os.path.exists("/proc/self/statm"):
+        sys.exit("This benchmark measures resident memory through /proc and only runs on Linux")
+
+    __results = run_benchmarks([int(size) for size in __args.sizes.split(",")], baseline=not __args.no_baseline)
+    for result in __results:
+        __reported = f"  (reports {result['reported_bytes'] / 1_048_576:,.1f} MiB)" if result["reported_bytes"] is not None else ""
+        print(f"{result['structure']:<10} {result['entries']:>10,} entries  {result['rss_bytes'] / 1_048_576:>9,.1f} MiB  {result['bytes_per_entry']:>7,.1f} B/entry  build {result['build_s']:6.2f} s  read names {result['read_names_s']:6.2f} s{__reported}")
+
+    if __args.json:
+        __args.json.write_text(json.dumps(__results, indent=4))
@@ -0,0 +1,183 @@
+import argparse
+from contextlib import redirect_stdout
+import json
+import os
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# allow running as `python src/benchmarks/library_benchmark.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic_library import generate_library, inject_latency, write_config
+from common import constants
+from config_loaders.ToolConfig import ToolConfig
+from core.MediaWalker import MediaWalker
+from core.SuffixTool import SuffixTool
+from utils.Logger import Logger
+from utils.RunStats import RunStats
+
+def run_benchmarks(root: Path, library: dict, repeat: int, latency: float, log_messages: int) -> dict:
+    '''
+    Times each stage of a run against the synthetic library in `root`, taking the best of `repeat` runs
+
+    Returns {benchmark: {"runs", "best_s", "items", "per_item_us", "per_file_us"}} -- times in seconds, per-item costs in microseconds
+    '''
+    __config_path = write_config(root)
+    ToolConfig.init(__config_path)
+    __validation_cache = Path(ToolConfig.get_output_dir()) / constants.VALIDATION_CACHE_FILE
+    __files = library["total_files"]
+
+    def __discover() -> int:
+        __count = 0
+        for console_media in MediaWalker.walk_consoles(ToolConfig.get_consoles_dir(), ToolConfig.get_media_dir_identifier(), include_files=True, file_types=ToolConfig.get_target_media_file_types()):
+            __count += sum(len(entries) for entries in console_media.media_files.values())
+        return __count
+
+    def __validate(cold: bool) -> int:
+        if cold and __validation_cache.exists():
+            __validation_cache.unlink()
+        if not ToolConfig.is_config_valid(exit_on_error=False):
+            raise RuntimeError(f"Synthetic config failed validation: {ToolConfig.validation_report}")
+        return len(ToolConfig.target_media_dirs)
+
+    def __plan() -> int:
+        return sum(1 for _ in SuffixTool.iter_planned_renames("add"))
+
+    __applied = []
+
+    def __apply() -> int:
+        __renamed, __failed = SuffixTool.apply_rename_plan(SuffixTool.build_rename_plan("add"), on_result=lambda src, dst, renamed: renamed and __applied.append((src, dst)))
+        if __failed:
+            raise RuntimeError(f"{__failed} rename(s) failed")
+        return __renamed
+
+    def __revert() -> None:
+        # untimed -- undo exactly the applied renames so every apply run renames the same files
+        SuffixTool.apply_rename_plan((dst, src) for src, dst in __applied)
+        __applied.clear()
+
+    def __log(count: int) -> int:
+        for i in range(count):
+            Logger.log_message("info", f"Renamed 'Game {i:05d} (USA).png' to 'Game {i:05d} (USA)-thumb.png'", print_to_console=False)
+        return count
+
+    def __log_async(count: int) -> int:
+        Logger.enable_async_logging()
+        try:
+            return __log(count)
+        finally:
+            # include draining the queue, so async logging is not credited for work it deferred
+            Logger.disable_async_logging()
+
+    __cases = {
+        "discovery": (__discover, None),
+        "validation (cold)": (lambda: __validate(cold=True), None),
+        "validation (cached)": (lambda: __validate(cold=False), None),
+        "planning": (__plan, None),
+        "apply": (__apply, __revert),
+        "logging (sync)": (lambda: __log(log_messages), None),
+        "logging (async)": (lambda: __log_async(log_messages), None),
+    }
+
+    __results = {}
+    # run output is not part of any measurement; latency only applies to file system stages
+    with open(os.devnull, "w") as __devnull, redirect_stdout(__devnull):
+        __validate(cold=True)
+        for name, (case, cleanup) in __cases.items():
+            __samples = []
+            __items = 0
+            for _ in range(repeat):
+                RunStats.reset()
+                with inject_latency(0 if name.startswith("logging") else latency):
+                    __start = time.perf_counter()
+                    __items = case()
+                    __samples.append(time.perf_counter() - __start)
+                if cleanup is not None:
+                    cleanup()
+
+            __best = min(__samples)
+            __results[name] = {
+                "runs": __samples,
+                "best_s": __best,
+                "items": __items,
+                "per_item_us": __best / __items * 1e6 if __items else None,
+                "per_file_us": __best / __files * 1e6 if __files and not name.startswith("logging") else None,
+            }
+
+    return __results
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare_results(baseline: dict, current: dict) -> None:
+    '''
+    Prints the change in best time per benchmark between two result files
+    '''
+    print(f"\nCompared to {baseline.get('commit') or 'baseline'}:")
+    __longest_name = max(len(name) for name in current["benchmarks"])
+    for name, result in current["benchmarks"].items():
+        __baseline = baseline.get("benchmarks", {}).get(name)
+        if __baseline is None:
+            print(f"  {name.ljust(__longest_name)}  (not in baseline)")
+            continue
+        __change = (result["best_s"] - __baseline["best_s"]) / __baseline["best_s"] * 100 if __baseline["best_s"] else 0.0
+        print(f"  {name.ljust(__longest_name)}  {__baseline['best_s'] * 1000:10.1f} ms -> {result['best_s'] * 1000:10.1f} ms  ({__change:+.1f}%)")
+
+
+### main ###
+if __name__ == "__main__":
+    __parser = argparse.ArgumentParser(description="Benchmark discovery, validation, planning, apply and logging against a generated synthetic consoles tree")
+    __parser.add_argument("--consoles", type=int, default=10, help="number of generated consoles")
+    __parser.add_argument("--media-types", type=int, default=9, help="number of media types per console (at most 9)")
+    __parser.add_argument("--files", type=int, default=200, help="number of files per media type")
+    __parser.add_argument("--file-size", type=int, default=65_536, help="size of each generated file in bytes")
+    __parser.add_argument("--dense", action="store_true", help="write file contents instead of creating sparse files")
+    __parser.add_argument("--suffixed-ratio", type=float, default=0.1, help="fraction of files generated with their suffix already applied")
+    __parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to each scandir/stat/rename call, to simulate network storage")
+    __parser.add_argument("--log-messages", type=int, default=50_000, help="number of messages written by the logging benchmarks")
+    __parser.add_argument("--repeat", type=int, default=3, help="number of runs to take the best of")
+    __parser.add_argument("--dir", type=Path, help="generate the library here instead of a temp dir (must be empty or missing)")
+    __parser.add_argument("--json", type=Path, help="write results to this JSON file, for comparison across commits")
+    __parser.add_argument("--compare", type=Path, help="print the change against a JSON file written by an earlier --json run")
+    __args = __parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rommediatool-bench-") as __temp_dir:
+        __root = __args.dir or Path(__temp_dir)
+        __root.mkdir(parents=True, exist_ok=True)
+        Logger.init(__root / "eventlog.csv")
+
+        __start = time.perf_counter()
+        __library = generate_library(__root, __args.consoles, __args.media_types, __args.files, __args.file_size, __args.suffixed_ratio, sparse=not __args.dense)
+        print(f"Generated {__library['total_files']} file(s) in {time.perf_counter() - __start:.1f} s under '{__root}'")
+
+        __results = {
+            "commit": get_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "library": __library,
+            "latency_ms": __args.latency_ms,
+            "log_messages": __args.log_messages,
+            "repeat": __args.repeat,
+            "benchmarks": run_benchmarks(__root, __library, __args.repeat, __args.latency_ms / 1000, __args.log_messages),
+        }
+        Logger.shutdown_logging()
+
+    __longest_name = max(len(name) for name in __results["benchmarks"])
+    for name, result in __results["benchmarks"].items():
+        __per_item = f"{result['per_item_us']:10.2f} us/item" if result["per_item_us"] is not None else ""
+        print(f"{name.ljust(__longest_name)}  {result['best_s'] * 1000:10.1f} ms  {result['items']:8d} item(s)  {__per_item}")
+
+    if __args.json:
+        __args.json.write_text(json.dumps(__results, indent=4))
+
+    if __args.compare:
+        compare_results(json.loads(__args.compare.read_text()), __results)
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+
+
+def measure_import_time(module: str="main", runs: int=5) -> dict:
+    '''
+    Runs `python -X importtime -c "import <module>"` `runs` times in an empty temp dir and returns the median cumulative import time per module (in microseconds)
+
+    Also records any files the import created in the working directory, since importing should have no side effects
+    '''
+    __samples = {}
+    __created_files = set()
+
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as __cwd:
+            __result = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                cwd=__cwd, env={**os.environ, "PYTHONPATH": str(SRC_DIR)}, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=60
+            )
+            if __result.returncode != 0:
+                raise RuntimeError(f"Importing '{module}' failed:\n{__result.stderr}")
+            __created_files.update(os.listdir(__cwd))
+
+        for line in __result.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            if not line.startswith("import time:") or "imported package" in line:
+                continue
+            __self_us, __cumulative_us, __name = line[len("import time:"):].split("|")
+            __samples.setdefault(__name.strip(), []).append(int(__cumulative_us))
+
+    __medians = {name: statistics.median(values) for name, values in __samples.items()}
+    return {
+        "module": module,
+        "runs": runs,
+        "total_us": __medians.get(module, 0),
+        "modules_us": dict(sorted(__medians.items(), key=lambda item: item[1], reverse=True)),
+        "created_files": sorted(__created_files),
+    }
+
+
+### main ###
+if __name__ == "__main__":
+    __parser = argparse.ArgumentParser(description="Measure import-time cost of ROMMediaTool startup with `python -X importtime`")
+    __parser.add_argument("--module", default="main", help="module to import (default: main)")
+    __parser.add_argument("--runs", type=int, default=5, help="number of runs to take the median of")
+    __parser.add_argument("--top", type=int, default=15, help="number of slowest modules to print")
+    __parser.add_argument("--json", type=Path, help="write results to this JSON file, for comparison across commits")
+    __parser.add_argument("--max-ms", type=float, help="exit with status 1 if total import time exceeds this many milliseconds")
+    __args = __parser.parse_args()
+
+    __results = measure_import_time(__args.module, __args.runs)
+
+    print(f"import {__results['module']}: {__results['total_us'] / 1000:.1f} ms (median of {__results['runs']} runs)")
+    for name, cumulative_us in list(__results["modules_us"].items())[:__args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if __results["created_files"]:
+        print(f"WARNING: importing created files in the working directory: {__results['created_files']}")
+
+    if __args.json:
+        __args.json.write_text(json.dumps(__results, indent=4))
+
+    if (__args.max_ms is not None and __results["total_us"] / 1000 > __args.max_ms) or __results["created_files"]:
+        sys.exit(1)
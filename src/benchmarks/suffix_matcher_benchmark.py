@@ -0,0 +1,103 @@
+import argparse
+import json
+from pathlib import Path
+import random
+import sys
+import timeit
+
+# allow running as `python src/benchmarks/suffix_matcher_benchmark.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core.SuffixMatcher import SuffixMatcher
+
+SUFFIXES_BY_MEDIA_TYPE = {
+    "3dboxes": "",
+    "covers": "-thumb",
+    "marquees": "-marquee",
+    "screenshots": "-image",
+    "titlescreens": "-title-image",     # ends with another suffix, so matching must prefer the longest one
+    "videos": "-video",
+}
+FILE_TYPES = ("png", "mp4")
+
+
+def generate_names(count: int, seed: int=0) -> list[str]:
+    '''
+    Generates `count` filenames, roughly half of which already carry one of the configured suffixes
+    '''
+    __random = random.Random(seed)
+    __suffixes = [suffix for suffix in SUFFIXES_BY_MEDIA_TYPE.values() if suffix] + [""] * 4
+    return [f"Game Title {i} (USA){__random.choice(__suffixes)}.{__random.choice(FILE_TYPES)}" for i in range(count)]
+
+
+def naive_classify(names: list[str], suffix_pairs: list[tuple[str, str]]) -> list[str | None]:
+    # baseline: one endswith per (media type, suffix) pair for every name, keeping the longest matching suffix as `SuffixMatcher` does
+    __media_types = []
+    for name in names:
+        __stem = name.rpartition(".")[0]
+        __match = None
+        __match_len = 0
+        for media_type, suffix in suffix_pairs:
+            if len(suffix) > __match_len and __stem.endswith(suffix):
+                __match = media_type
+                __match_len = len(suffix)
+        __media_types.append(__match)
+    return __media_types
+
+
+def naive_target_names(names: list[str], suffix: str, action: str, suffix_pairs: list[tuple[str, str]]) -> list[str | None]:
+    # baseline: per-name suffix handling as previously done inline in SuffixTool, leaving names with another media type's (longest matching) suffix alone
+    __suffixes = dict(suffix_pairs)
+    __target_names = []
+    for name, media_type in zip(names, naive_classify(names, suffix_pairs)):
+        __stem, __dot, __extension = name.rpartition(".")
+        __has_suffix = __stem.endswith(suffix)
+        if media_type is not None and __suffixes[media_type] != suffix:
+            __new_stem = None
+        elif action == "add":
+            __new_stem = None if __has_suffix else __stem + suffix
+        else:
+            __new_stem = __stem[:-len(suffix)] if __has_suffix else None
+        __target_names.append(f"{__new_stem}.{__extension}" if __new_stem else None)
+    return __target_names
+
+
+def run_benchmarks(count: int, repeat: int) -> dict:
+    __names = generate_names(count)
+    __matcher = SuffixMatcher(SUFFIXES_BY_MEDIA_TYPE, FILE_TYPES)
+    __suffix_pairs = [(media_type, suffix) for media_type, suffix in SUFFIXES_BY_MEDIA_TYPE.items() if suffix]
+
+    # both implementations must agree before their timings mean anything
+    assert naive_classify(__names, __suffix_pairs) == [match.media_type for match in __matcher.classify_batch(__names)] == __matcher.get_media_types(__names)
+    for action in ("add", "remove"):
+        assert naive_target_names(__names, "-thumb", action, __suffix_pairs) == __matcher.get_target_names(__names, "covers", action)
+
+    __cases = {
+        "classify (naive loop)": lambda: naive_classify(__names, __suffix_pairs),
+        "classify (SuffixMatcher.get_media_types)": lambda: __matcher.get_media_types(__names),
+        "classify (SuffixMatcher.classify_batch)": lambda: __matcher.classify_batch(__names),
+        "target names, add (naive loop)": lambda: naive_target_names(__names, "-thumb", "add", __suffix_pairs),
+        "target names, add (SuffixMatcher)": lambda: __matcher.get_target_names(__names, "covers", "add"),
+        "target names, remove (naive loop)": lambda: naive_target_names(__names, "-thumb", "remove", __suffix_pairs),
+        "target names, remove (SuffixMatcher)": lambda: __matcher.get_target_names(__names, "covers", "remove"),
+    }
+
+    # best of `repeat` runs, in nanoseconds per name
+    return {name: min(timeit.repeat(case, number=1, repeat=repeat)) / count * 1e9 for name, case in __cases.items()}
+
+
+### main ###
+if __name__ == "__main__":
+    __parser = argparse.ArgumentParser(description="Microbenchmark SuffixMatcher against a naive loop over (media type, suffix) pairs")
+    __parser.add_argument("--names", type=int, default=100_000, help="number of generated filenames")
+    __parser.add_argument("--repeat", type=int, default=5, help="number of runs to take the best of")
+    __parser.add_argument("--json", type=Path, help="write results to this JSON file, for comparison across commits")
+    __args = __parser.parse_args()
+
+    __results = run_benchmarks(__args.names, __args.repeat)
+    __longest_name = max(len(name) for name in __results)
+    for name, ns_per_name in __results.items():
+        print(f"{name.ljust(__longest_name)}  {ns_per_name:8.1f} ns/name")
+
+    if __args.json:
+        __args.json.write_text(json.dumps(__results, indent=4))
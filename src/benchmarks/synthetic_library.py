@@ -0,0 +1,178 @@
+from contextlib import contextmanager
+import errno
+import functools
+import json
+import os
+from pathlib import Path
+import random
+import threading
+import time
+from typing import Iterator
+
+MEDIA_DIR_IDENTIFIER = "downloaded_media"
+
+# mirrors the default "suffixes_by_media_type" in settings.json
+SUFFIXES_BY_MEDIA_TYPE = {
+    "3dboxes": "",
+    "backcovers": "",
+    "covers": "-thumb",
+    "fanart": "",
+    "marquees": "-marquee",
+    "miximages": "",
+    "screenshots": "-image",
+    "titlescreens": "",
+    "videos": "-video",
+}
+
+# file system calls slowed down by `inject_latency()`
+LATENCY_CALLS = ("scandir", "stat", "lstat", "rename", "replace", "link")
+
+
+def generate_library(root: Path, consoles: int=10, media_types: int=len(SUFFIXES_BY_MEDIA_TYPE), files: int=100, file_size: int=65_536, suffixed_ratio: float=0.0, sparse: bool=True, seed: int=0) -> dict:
+    '''
+    Creates `<root>/consoles/<console>/downloaded_media/<media_type>/<files>` for `consoles` x `media_types` x `files` media files
+
+    With `sparse`, files are only truncated to `file_size` so a large library costs almost no disk space or write time
+    `suffixed_ratio` of the files already carry their media type's suffix, so "add" runs have files to skip
+
+    Returns a description of the generated library, for benchmark results
+    '''
+    __random = random.Random(seed)
+    __consoles_dir = Path(root) / "consoles"
+    __media_types = list(SUFFIXES_BY_MEDIA_TYPE.items())[:media_types]
+    __file_count = 0
+
+    for console_index in range(consoles):
+        __media_dir = __consoles_dir / f"console{console_index:03d}" / MEDIA_DIR_IDENTIFIER
+        for media_type, suffix in __media_types:
+            __media_type_dir = __media_dir / media_type
+            __media_type_dir.mkdir(parents=True, exist_ok=True)
+            __extension = "mp4" if media_type == "videos" else "png"
+
+            for file_index in range(files):
+                __suffix = suffix if __random.random() < suffixed_ratio else ""
+                with open(__media_type_dir / f"Game {file_index:05d} (USA){__suffix}.{__extension}", "wb") as __file:
+                    if sparse:
+                        __file.truncate(file_size)
+                    else:
+                        __file.write(os.urandom(file_size))
+                __file_count += 1
+
+    return {
+        "consoles": consoles,
+        "media_types": len(__media_types),
+        "files_per_media_type": files,
+        "total_files": __file_count,
+        "file_size": file_size,
+        "sparse": sparse,
+        "suffixed_ratio": suffixed_ratio,
+    }
+
+
+def write_config(root: Path, output_dir: Path | None=None, **tool_settings) -> Path:
+    '''
+    Writes a settings.json for the generated library into `<root>/config` and returns its path
+    '''
+    __config = {
+        "validate_config": True,
+        "target_directories": {
+            "consoles_dir": str(Path(root) / "consoles"),
+            "output_dir": str(output_dir or Path(root) / "output"),
+            "missing_output_dir_policy": "create",
+        },
+        "console_settings": {
+            "scan_all_consoles": True,
+            "target_consoles": [],
+            "media_dir_identifier": MEDIA_DIR_IDENTIFIER,
+        },
+        "log_settings": {
+            "aggregate_logging": True,
+            "log_file_details": False,
+            "count_bytes": False,
+            "progress_interval_seconds": 3600,
+        },
+        "tool_settings": {
+            "suffix_action": "add",
+            "export_to_output_dir": False,
+            "target_media_file_types": ["png", "mp4"],
+            "suffixes_by_media_type": SUFFIXES_BY_MEDIA_TYPE,
+            **tool_settings,
+        },
+    }
+
+    __config_path = Path(root) / "config" / "settings.json"
+    __config_path.parent.mkdir(parents=True, exist_ok=True)
+    __config_path.write_text(json.dumps(__config, indent=4))
+    return __config_path
+
+
+@contextmanager
+def inject_latency(seconds: float) -> Iterator[None]:
+    '''
+    Adds `seconds` of delay to each `os` file system call in `LATENCY_CALLS`, to simulate network storage
+
+    Calls made by C code (e.g. `os.DirEntry.stat()`) are not delayed
+    '''
+    if seconds <= 0:
+        yield
+        return
+
+    def __delayed(call):
+        @functools.wraps(call)
+        def __wrapper(*args, **kwargs):
+            time.sleep(seconds)
+            return call(*args, **kwargs)
+        return __wrapper
+
+    __originals = {name: getattr(os, name) for name in LATENCY_CALLS if hasattr(os, name)}
+    try:
+        for name, call in __originals.items():
+            setattr(os, name, __delayed(call))
+        yield
+    finally:
+        for name, call in __originals.items():
+            setattr(os, name, call)
+
+
+@contextmanager
+def inject_contention(service_seconds: float, capacity: int, timeout_seconds: float | None=None) -> Iterator[dict]:
+    '''
+    Serves each `os` file system call in `LATENCY_CALLS` like a loaded network share: at most `capacity` calls are served at once, each taking `service_seconds`
+
+    Calls beyond `capacity` queue, so latency grows with concurrency; a call that queues longer than `timeout_seconds` fails with `TimeoutError` (ETIMEDOUT)
+    Yields a dict of counters ("calls", "timeouts", "max_waiting") that is updated while the context is active
+    '''
+    __slots = threading.BoundedSemaphore(capacity)
+    __lock = threading.Lock()
+    __counters = {"calls": 0, "timeouts": 0, "max_waiting": 0}
+    __waiting = [0]
+
+    def __served(call):
+        @functools.wraps(call)
+        def __wrapper(*args, **kwargs):
+            with __lock:
+                __counters["calls"] += 1
+                __waiting[0] += 1
+                __counters["max_waiting"] = max(__counters["max_waiting"], __waiting[0])
+            __acquired = __slots.acquire(timeout=timeout_seconds)
+            with __lock:
+                __waiting[0] -= 1
+                if not __acquired:
+                    __counters["timeouts"] += 1
+            if not __acquired:
+                raise TimeoutError(errno.ETIMEDOUT, os.strerror(errno.ETIMEDOUT), args[0] if args else None)
+            try:
+                time.sleep(service_seconds)
+            finally:
+                __slots.release()
+            return call(*args, **kwargs)
+        return __wrapper
+
+    __originals = {name: getattr(os, name) for name in LATENCY_CALLS if hasattr(os, name)}
+    try:
+        for name, call in __originals.items():
+            setattr(os, name, __served(call))
+        yield __counters
+    finally:
+        for name, call in __originals.items():
+            setattr(os, name, call)
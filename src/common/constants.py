@@ -1,5 +1,49 @@
-UNIT_TESTS = True
 CONFIG_FILE = "settings.json"
 CONFIG_TARGET_DIR_KEY = "target_directories"
 CONFIG_CONSOLE_SETTINGS_KEY = "console_settings"
-CONFIG_TOOL_SETTINGS_KEY = "tool_settings"
\ No newline at end of file
+CONFIG_TOOL_SETTINGS_KEY = "tool_settings"
+CONFIG_LOG_SETTINGS_KEY = "log_settings"
+SCAN_MAX_WORKERS = 16
+RENAME_MAX_WORKERS = 8
+FILE_INDEX_FILE = "media_index.sqlite3"
+FILE_INDEX_COMMIT_BATCH = 1000
+EXPORT_MAX_WORKERS = 8
+EXPORT_CHUNK_SIZE = 1_048_576
+LOG_QUEUE_SIZE = 10_000
+PROGRESS_INTERVAL_SECONDS = 10
+VALIDATION_CACHE_FILE = "validation_cache.json"
+RENAME_PLAN_FILE = "rename_plan.csv"
+PNG_COMPRESSION_LEVEL = 9
+PNG_READ_BLOCK_SIZE = 65_536
+PNG_INFLATE_LIMIT = 1_048_576
+PNG_IDAT_CHUNK_SIZE = 262_144
+HASH_MAX_WORKERS = 8
+HASH_PARTIAL_BLOCK_SIZE = 65_536
+RENAME_JOURNAL_FILE = "rename_journal.jsonl"
+JOURNAL_FSYNC_BATCH = 500
+WATCH_DEBOUNCE_SECONDS = 2.0
+WATCH_POLL_INTERVAL_SECONDS = 5.0
+WATCH_MAX_BATCH = 1000
+SPAN_LIMIT = 100_000
+SPAN_TRACE_FILE = "run_trace.json"
+PROFILE_STATS_FILE = "run_profile.prof"
+PROFILE_TOP_FUNCTIONS = 25
+GAMELIST_FILE = "gamelist.xml"
+MAX_WORKERS_PER_ROOT = 2
+MEDIA_REPORT_FILE = "media_report.jsonl"
+REPORT_IGNORED_ROM_FILE_TYPES = frozenset(("xml", "txt", "cfg", "json", "csv", "sqlite3"))
+MAX_IO_WORKERS = 32
+ADAPTIVE_MIN_WINDOW = 8
+ADAPTIVE_LATENCY_TOLERANCE = 1.5
+ADAPTIVE_LATENCY_DECREASE_FACTOR = 0.75
+ADAPTIVE_ERROR_DECREASE_FACTOR = 0.5
+ADAPTIVE_BASELINE_DRIFT = 1.02
+IO_RETRY_ATTEMPTS = 4
+IO_RETRY_BASE_DELAY_SECONDS = 0.05
+IO_RETRY_MAX_DELAY_SECONDS = 2.0
+EXPORT_DIFF_FILE = "export_diff.txt"
+VERIFY_DIFF_PREVIEW = 20
+METADATA_MAX_WORKERS = 16
+METADATA_BATCH_SIZE = 512
+MEDIA_METADATA_FILE = "media_metadata.jsonl"
+PROCESS_START_METHOD = "spawn"
\ No newline at end of file
@@ -0,0 +1,103 @@
+from pathlib import Path
+from types import MappingProxyType
+
+from common import constants
+from core.MediaRules import MediaRule
+from core.SuffixMatcher import SuffixMatcher
+
+
+class CompiledConfig:
+    '''
+    Immutable, typed view of the JSON config, compiled once when the config file is loaded
+
+    File types are normalized to lowercase extensions without a leading "." and media types with an empty suffix are dropped from `suffix_map`
+    '''
+    __slots__ = (
+        "source_hash",
+        "validate_config",
+        "consoles_dirs",
+        "consoles_dir",
+        "output_dir",
+        "missing_output_dir_policy",
+        "gamelists_dir",
+        "scan_all_consoles",
+        "target_consoles",
+        "media_dir_identifier",
+        "suffix_action",
+        "export_to_output_dir",
+        "recompress_png",
+        "dedupe_output",
+        "worker_processes",
+        "max_workers_per_root",
+        "adaptive_io",
+        "max_io_workers",
+        "update_gamelists",
+        "png_compression_level",
+        "target_media_file_types",
+        "suffixes_by_media_type",
+        "suffix_map",
+        "suffix_matcher",
+        "target_media_suffix_pairs",
+        "media_rules",
+        "aggregate_logging",
+        "log_file_details",
+        "count_bytes",
+        "progress_interval",
+        "profile_run",
+        "async_logging",
+    )
+
+    def __init__(self, config_data: dict, source_hash: str=""):
+        __target_dirs = config_data[constants.CONFIG_TARGET_DIR_KEY]
+        __console_settings = config_data[constants.CONFIG_CONSOLE_SETTINGS_KEY]
+        __tool_settings = config_data[constants.CONFIG_TOOL_SETTINGS_KEY]
+        __log_settings = config_data.get(constants.CONFIG_LOG_SETTINGS_KEY, {})
+        __suffixes = dict(__tool_settings["suffixes_by_media_type"])
+
+        __set = super().__setattr__
+        __set("source_hash", source_hash)
+        __set("validate_config", bool(config_data["validate_config"]))
+        # "consoles_dir" is a single root or a list of roots (e.g. one per disk) -- `consoles_dir` keeps the first one
+        __consoles_dirs = __target_dirs["consoles_dir"]
+        if isinstance(__consoles_dirs, str):
+            __consoles_dirs = [__consoles_dirs]
+        __set("consoles_dirs", tuple(Path(consoles_dir) for consoles_dir in __consoles_dirs))
+        __set("consoles_dir", self.consoles_dirs[0] if self.consoles_dirs else Path(""))
+        # keep "" for an unconfigured output dir, so callers can fall back to the default output folder
+        __set("output_dir", Path(__target_dirs["output_dir"]) if __target_dirs["output_dir"] else "")
+        __set("missing_output_dir_policy", str(__target_dirs.get("missing_output_dir_policy", "prompt")).lower())
+        # "" if gamelists only live in the console dirs
+        __set("gamelists_dir", Path(__target_dirs["gamelists_dir"]) if __target_dirs.get("gamelists_dir") else "")
+        __set("scan_all_consoles", bool(__console_settings["scan_all_consoles"]))
+        __set("target_consoles", tuple(__console_settings["target_consoles"]))
+        __set("media_dir_identifier", str(__console_settings["media_dir_identifier"]))
+        __set("suffix_action", str(__tool_settings["suffix_action"]))
+        __set("export_to_output_dir", bool(__tool_settings.get("export_to_output_dir", False)))
+        __set("recompress_png", bool(__tool_settings.get("recompress_png", False)))
+        __set("dedupe_output", bool(__tool_settings.get("dedupe_output", False)))
+        __set("worker_processes", max(1, int(__tool_settings.get("worker_processes", 1))))
+        __set("max_workers_per_root", max(1, int(__tool_settings.get("max_workers_per_root", constants.MAX_WORKERS_PER_ROOT))))
+        __set("adaptive_io", bool(__tool_settings.get("adaptive_io", False)))
+        __set("max_io_workers", max(1, int(__tool_settings.get("max_io_workers", constants.MAX_IO_WORKERS))))
+        __set("update_gamelists", bool(__tool_settings.get("update_gamelists", False)))
+        # kept as configured, so config validation can report a level that is not a whole number from 0 to 9
+        __set("png_compression_level", __tool_settings.get("png_compression_level", constants.PNG_COMPRESSION_LEVEL))
+        __set("target_media_file_types", frozenset(file_type.lower().lstrip(".") for file_type in __tool_settings["target_media_file_types"]))
+        __set("suffixes_by_media_type", MappingProxyType(__suffixes))
+        __set("suffix_map", MappingProxyType({media_type: suffix for media_type, suffix in __suffixes.items() if suffix}))
+        __set("suffix_matcher", SuffixMatcher(__suffixes, self.target_media_file_types))
+        __set("target_media_suffix_pairs", tuple((media_type, suffix) for media_type, suffix in __suffixes.items() if suffix))
+        # rule problems are collected on each rule and reported by config validation
+        __set("media_rules", tuple(MediaRule(rule, index) for index, rule in enumerate(__tool_settings.get("media_rules") or [])))
+        __set("aggregate_logging", bool(__log_settings.get("aggregate_logging", True)))
+        __set("log_file_details", bool(__log_settings.get("log_file_details", False)))
+        __set("count_bytes", bool(__log_settings.get("count_bytes", False)))
+        __set("progress_interval", float(__log_settings.get("progress_interval_seconds", constants.PROGRESS_INTERVAL_SECONDS)))
+        __set("profile_run", bool(__log_settings.get("profile_run", False)))
+        __set("async_logging", bool(__log_settings.get("async_logging", False)))
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"CompiledConfig is immutable -- cannot set '{name}'")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"CompiledConfig is immutable -- cannot delete '{name}'")
@@ -1,166 +1,298 @@
+import hashlib
 import json
 import os
 from pathlib import Path
 import sys
+from types import MappingProxyType
 
 from common import constants
 from common.Singleton import Singleton
-from core.DirectoryHandler import DirectoryHandler
+from config_loaders.CompiledConfig import CompiledConfig
+from config_loaders.ValidationReport import ValidationReport
+from core.MediaRules import MediaRule
+from core.MediaWalker import MediaWalker
+from core.SuffixMatcher import SuffixMatcher
 from utils.Formatter import Formatter
 from utils.Logger import Logger
 from utils.TestTime import TestTime
 from utils.TextColor import TextColor as tc
 
 class ToolConfig(metaclass=Singleton):
+    MISSING_OUTPUT_DIR_POLICIES = ("prompt", "create", "fail")
+
     config_data = None
     target_media_dirs = []
     output_dir = ""
+    validation_report = None
 
-    try:
-        # init logging
-        Logger()
-        Logger.log_message("info", "Logging successfully initialized")
-        Logger.log_message("info", f"ROMMediaTool initialized at {TestTime.get_fstart()}")
-
-        # load in JSON dict from config file
-        with open(f'.\\config\\{constants.CONFIG_FILE}') as config_file:
-            config_data = json.load(config_file)
-            config_file.close()
-
-    except json.JSONDecodeError as jde:
-        Logger.log_message('critical', f'JSONDecodeError during Config init, {jde}')
-        Logger.log_message('info', f'Please verify that the "{constants.CONFIG_FILE}" file is formatted correctly and try again.')
-        Logger.log_message('info', 'Program closing...')
-        sys.exit()
-        
-    except Exception as e:
-        Logger.log_message('critical', f'Unexpected Exception encountered during TestConfig init, {e}')
-        Logger.log_message('info', f'Please verify that the "{constants.CONFIG_FILE}" file is formatted correctly and try again.')
-        Logger.log_message('info', 'Program closing...')
-        sys.exit()
+    __config_path = None
+    __overrides = None
+    __compiled = None
+    __interactive = True            # off for the command line interface, see set_interactive()
+
+    def __init__(self):
+        # keep `ToolConfig()` working as the explicit init entry point
+        ToolConfig.init()
+
+    def init(config_path: Path | str | None=None, overrides: dict | None=None) -> None:
+        '''
+        Initializes logging and loads the JSON config file -- called on first use of any getter, so importing this module has no side effects
+
+        `overrides` ({section: {setting: value}}, e.g. from command line options) replace the matching settings of the file
+        Calling `init()` again with a different `config_path` or `overrides` reloads the configuration
+        '''
+        if config_path is None:
+            config_path = ToolConfig.__config_path or Path("config") / constants.CONFIG_FILE
+
+        if ToolConfig.__compiled is not None and str(config_path) == str(ToolConfig.__config_path) and overrides == ToolConfig.__overrides:
+            return
+
+        try:
+            # init logging
+            Logger.init()
+            Logger.log_message("info", f"ROMMediaTool initialized at {TestTime.get_fstart()}")
+
+            # load in JSON dict from config file and compile it once into a typed config object
+            with TestTime.span("config load"):
+                with open(config_path, 'rb') as config_file:
+                    __raw_config = config_file.read()
+                ToolConfig.config_data = json.loads(__raw_config)
+                for section, settings in (overrides or {}).items():
+                    ToolConfig.config_data.setdefault(section, {}).update(settings)
+                # overrides are part of the hash, so the validation cache is not reused across different overrides
+                __source_hash = hashlib.sha256(__raw_config + (json.dumps(overrides, sort_keys=True).encode() if overrides else b"")).hexdigest()
+                ToolConfig.__compiled = CompiledConfig(ToolConfig.config_data, source_hash=__source_hash)
+            ToolConfig.__config_path = config_path
+            ToolConfig.__overrides = overrides
+
+        except json.JSONDecodeError as jde:
+            Logger.log_message('critical', f'JSONDecodeError during Config init, {jde}')
+            Logger.log_message('info', f'Please verify that the "{constants.CONFIG_FILE}" file is formatted correctly and try again.')
+            Logger.log_message('info', 'Program closing...')
+            sys.exit(1)
+            
+        except Exception as e:
+            Logger.log_message('critical', f'Unexpected Exception encountered during TestConfig init, {e}')
+            Logger.log_message('info', f'Please verify that the "{constants.CONFIG_FILE}" file is formatted correctly and try again.')
+            Logger.log_message('info', 'Program closing...')
+            sys.exit(1)
+
+    def get_config() -> CompiledConfig:
+        if ToolConfig.__compiled is None:
+            ToolConfig.init()
+        return ToolConfig.__compiled
+
+    def get_config_data() -> dict:
+        if ToolConfig.config_data is None:
+            ToolConfig.init()
+        return ToolConfig.config_data
 
     def is_config_validation_enabled() -> bool:
-        return ToolConfig.config_data["validate_config"]
+        return ToolConfig.get_config().validate_config
 
     def get_consoles_dir() -> Path:
-        return Path(ToolConfig.config_data[constants.CONFIG_TARGET_DIR_KEY]["consoles_dir"])
+        return ToolConfig.get_config().consoles_dir
+
+    def get_consoles_dirs() -> tuple[Path, ...]:
+        return ToolConfig.get_config().consoles_dirs
     
     def get_output_dir() -> Path:
-        __output_path = ToolConfig.config_data[constants.CONFIG_TARGET_DIR_KEY]["output_dir"]
-        # if no configured output path
-        if not __output_path:
-            return ""
-        
-        else:
-            return Path(__output_path)
+        # "" if no configured output path
+        return ToolConfig.get_config().output_dir
     
     def is_scan_all_consoles_enabled() -> bool:
-        return ToolConfig.config_data[constants.CONFIG_CONSOLE_SETTINGS_KEY]["scan_all_consoles"]
+        return ToolConfig.get_config().scan_all_consoles
     
-    def get_target_consoles() -> list[str]:
-        return ToolConfig.config_data[constants.CONFIG_CONSOLE_SETTINGS_KEY]["target_consoles"]
+    def get_target_consoles() -> tuple[str, ...]:
+        return ToolConfig.get_config().target_consoles
     
     def get_media_dir_identifier() -> str:
-        return str(ToolConfig.config_data[constants.CONFIG_CONSOLE_SETTINGS_KEY]["media_dir_identifier"])
+        return ToolConfig.get_config().media_dir_identifier
 
     def get_suffix_action() -> str:
-        return str(ToolConfig.config_data[constants.CONFIG_TOOL_SETTINGS_KEY]["suffix_action"])
+        return ToolConfig.get_config().suffix_action
     
-    def get_target_media_file_types() -> list[str]:
-        return ToolConfig.config_data[constants.CONFIG_TOOL_SETTINGS_KEY]["target_media_file_types"]
+    def is_export_to_output_dir_enabled() -> bool:
+        return ToolConfig.get_config().export_to_output_dir
+
+    def get_gamelists_dir() -> Path | str:
+        return ToolConfig.get_config().gamelists_dir
+
+    def is_gamelist_update_enabled() -> bool:
+        return ToolConfig.get_config().update_gamelists
+
+    def get_worker_processes() -> int:
+        return ToolConfig.get_config().worker_processes
+
+    def get_max_workers_per_root() -> int:
+        return ToolConfig.get_config().max_workers_per_root
+
+    def get_adaptive_io_max_workers() -> int | None:
+        # upper limit of the adaptive I/O pools, None if "adaptive_io" is disabled and pools keep a fixed size
+        return ToolConfig.get_config().max_io_workers if ToolConfig.get_config().adaptive_io else None
+
+    def is_png_recompression_enabled() -> bool:
+        return ToolConfig.get_config().recompress_png
+
+    def is_output_dedupe_enabled() -> bool:
+        return ToolConfig.get_config().dedupe_output
+
+    def get_png_compression_level() -> int:
+        return ToolConfig.get_config().png_compression_level
+
+    def get_target_media_file_types() -> frozenset[str]:
+        # normalized -- lowercase, no leading "."
+        return ToolConfig.get_config().target_media_file_types
     
-    def get_suffixes_by_media_type_dict() -> dict:
-        return ToolConfig.config_data[constants.CONFIG_TOOL_SETTINGS_KEY]["suffixes_by_media_type"]
-
-    # TODO - delete method? unnecessary?
-    def get_target_media_suffix_pairs() -> list[list[str]]:
-        target_media_suffix_pairs = []
-        for media_type, suffix in ToolConfig.config_data[constants.CONFIG_TOOL_SETTINGS_KEY]["suffixes_by_media_type"].items():
-            if suffix:
-                target_media_suffix_pairs.append((media_type, suffix))
-        return target_media_suffix_pairs
+    def get_suffixes_by_media_type_dict() -> MappingProxyType:
+        return ToolConfig.get_config().suffixes_by_media_type
+
+    def get_suffix_map() -> MappingProxyType:
+        # only media types with a configured suffix
+        return ToolConfig.get_config().suffix_map
+
+    def get_suffix_matcher() -> SuffixMatcher:
+        # compiled once with the config
+        return ToolConfig.get_config().suffix_matcher
+
+    def is_aggregate_logging_enabled() -> bool:
+        return ToolConfig.get_config().aggregate_logging
+
+    def is_file_detail_logging_enabled() -> bool:
+        return ToolConfig.get_config().log_file_details
+
+    def is_byte_counting_enabled() -> bool:
+        return ToolConfig.get_config().count_bytes
+
+    def get_progress_interval() -> float:
+        return ToolConfig.get_config().progress_interval
+
+    def is_run_profiling_enabled() -> bool:
+        return ToolConfig.get_config().profile_run
+
+    def is_async_logging_enabled() -> bool:
+        return ToolConfig.get_config().async_logging
+
+    def set_interactive(enabled: bool) -> None:
+        '''
+        Turns prompting on or off -- when off, a "prompt" missing output dir policy falls back to "fail" so stdin is never read and stdout never written
+        '''
+        ToolConfig.__interactive = enabled
+
+    def get_missing_output_dir_policy() -> str:
+        # "prompt", "create" or "fail"
+        return ToolConfig.get_config().missing_output_dir_policy
+
+    def get_target_media_suffix_pairs() -> tuple[tuple[str, str], ...]:
+        return ToolConfig.get_config().target_media_suffix_pairs
+
+    def get_media_rules() -> tuple[MediaRule, ...]:
+        return ToolConfig.get_config().media_rules
     
-    def is_config_valid() -> bool:
+    @TestTime.timed("validation")
+    def is_config_valid(exit_on_error: bool=True) -> bool:
+        '''
+        Validates every setting and collects all problems into `ToolConfig.validation_report` before reporting them at once
+
+        Target consoles are checked concurrently; if any errors are found the program exits, unless `exit_on_error` is False, in which case False is returned
+        '''
         Logger.log_message("info", f"Validating '{constants.CONFIG_FILE}' configuration...")
+        ToolConfig.target_media_dirs.clear()
+        ToolConfig.validation_report = ValidationReport()
+        __report = ToolConfig.validation_report
         try:
-            # identify target consoles directory
-            __consoles_dir = ToolConfig.__identify_console_dir_path()
-            Logger.log_message("info", f"Console directory path identified as '{__consoles_dir}'", print_to_console=False)
-            Logger.log_message("info", f"Console directory path identified as {tc.CYAN}'{__consoles_dir}'{tc.END}", write_to_log=False)
+            # identify target consoles directories
+            __consoles_dirs = ToolConfig.__identify_console_dir_paths(__report)
+            for consoles_dir in __consoles_dirs:
+                Logger.log_message("info", f"Console directory path identified as '{consoles_dir}'", print_to_console=False)
+                Logger.log_message("info", f"Console directory path identified as {tc.CYAN}'{consoles_dir}'{tc.END}", write_to_log=False)
 
             # identify output consoles directory
-            ToolConfig.output_dir = ToolConfig.__identify_output_dir_path()
-            Logger.log_message("info", f"Output directory path identified as '{ToolConfig.output_dir}'", print_to_console=False)
-            Logger.log_message("info", f"Output directory path identified as {tc.CYAN}'{ToolConfig.output_dir}'{tc.END}", write_to_log=False)
-
-            # verify directories for configured "target_consoles" exist in "consoles_dir" and contain subdirectory named with "media_dir_identifier"
-            __target_consoles = []
+            ToolConfig.output_dir = ToolConfig.__identify_output_dir_path(__report)
+            if ToolConfig.output_dir:
+                Logger.log_message("info", f"Output directory path identified as '{ToolConfig.output_dir}'", print_to_console=False)
+                Logger.log_message("info", f"Output directory path identified as {tc.CYAN}'{ToolConfig.output_dir}'{tc.END}", write_to_log=False)
+
+            # skip revalidation if config file and consoles directories are unchanged since the last successful validation
+            __fingerprint = None
+            if __consoles_dirs and ToolConfig.output_dir:
+                __fingerprint = ToolConfig.__compute_validation_fingerprint(__consoles_dirs)
+                __cached_media_dirs = ToolConfig.__load_cached_validation(__fingerprint)
+                if __cached_media_dirs is not None:
+                    ToolConfig.target_media_dirs[:] = __cached_media_dirs
+                    Logger.log_message("result", f"All configurations in '{constants.CONFIG_FILE}' are valid (unchanged since last validation, {len(__cached_media_dirs)} media directories)")
+                    return True
+
+            # verify directories for configured "target_consoles" exist in a "consoles_dir" root and contain subdirectory named with "media_dir_identifier"
+            __target_consoles = None
             __media_dir_identifier = ToolConfig.get_media_dir_identifier()
 
             # if 'scan_all_consoles' disabled, get configured 'target_consoles' as list
+            # otherwise leave as None so every subdirectory of configured consoles directory is scanned
             __scan_all_consoles = ToolConfig.is_scan_all_consoles_enabled()
             if not __scan_all_consoles:
                 __target_consoles = ToolConfig.get_target_consoles()
-            else:
-                # get all subdirectories of configured consoles directory
-                __target_consoles = DirectoryHandler.get_subdirectories(__consoles_dir)
             
-            # if 'scan_all_consoles' disabled and no other target consoles configured
-            if not __scan_all_consoles and not __target_consoles:
-                Logger.log_message("error", f"'scan_all_consoles' setting is disabled in '{constants.CONFIG_FILE}'")
-                Logger.log_message("error", f"No target consoles specified in '{constants.CONFIG_FILE}'")
-                ToolConfig.__invalid_config_response('Console settings')
-
-            # check that each console dir contains subdir named with the "media_dir_identifier"
-            for console in __target_consoles:
-                __current_console_dir_path = DirectoryHandler.add_to_path(__consoles_dir, console)
-
-                try:
-                    __current_console_subdirs_list = DirectoryHandler.get_subdirectories(__current_console_dir_path)
-
-                except FileNotFoundError:
-                    Logger.log_message("error", f"Configured target console '{console}' has no corresponding folder in consoles directory")
-                    ToolConfig.__invalid_config_response("Target consoles")
-
-                # if "media_dir_identifier" subdir not found, skip to next console dir
-                if __media_dir_identifier not in __current_console_subdirs_list:
-                    Logger.log_message("warning", f"Skipped '\\{console}' directory -- does not contain a '\\{__media_dir_identifier}' subdirectory")
-                else:
-                    # append `media_dir_identifier` to current console path and append new path to class-global list of target directory paths
-                    ToolConfig.target_media_dirs.append(DirectoryHandler.add_to_path(__current_console_dir_path, __media_dir_identifier))
-                    Logger.log_message("info", f"Media subdirectory identified in '\\{console}' directory ", print_to_console=False)
-                    Logger.log_message("info", f"Media subdirectory identified in {tc.YELLOW}'\\{console}'{tc.END} directory ", write_to_log=False)
+                # if 'scan_all_consoles' disabled and no other target consoles configured
+                if not __target_consoles:
+                    __report.add_error("Console settings", f"'scan_all_consoles' setting is disabled and no target consoles are specified in '{constants.CONFIG_FILE}'")
+
+            # in aggregate logging mode, per-console lines are only written when file details are requested
+            __log_console_details = not ToolConfig.is_aggregate_logging_enabled() or ToolConfig.is_file_detail_logging_enabled()
+
+            # check that each console dir contains subdir named with the "media_dir_identifier" -- every console of a root is scanned concurrently and every problem is collected
+            if __consoles_dirs and (__scan_all_consoles or __target_consoles):
+                # a target console only has to exist in one of the roots
+                __missing_consoles = {}
+                for console_media in (console_media for consoles_dir in __consoles_dirs for console_media in MediaWalker.walk_consoles(consoles_dir, __media_dir_identifier, consoles=__target_consoles)):
+                    console = console_media.console
+
+                    if console_media.error is not None:
+                        if isinstance(console_media.error, FileNotFoundError):
+                            __missing_consoles[console] = __missing_consoles.get(console, 0) + 1
+                        else:
+                            __report.add_error("Target consoles", f"Unable to scan console directory '{console_media.console_path}': {console_media.error}")
+
+                    # if "media_dir_identifier" subdir not found, skip to next console dir
+                    elif console_media.media_path is None:
+                        __report.add_warning("Target consoles", f"Skipped '\\{console}' directory -- does not contain a '\\{__media_dir_identifier}' subdirectory")
+                    else:
+                        # append media dir path to class-global list of target directory paths
+                        ToolConfig.target_media_dirs.append(console_media.media_path)
+                        if __log_console_details:
+                            Logger.log_message("info", f"Media subdirectory identified in '\\{console}' directory ", print_to_console=False)
+                            Logger.log_message("info", f"Media subdirectory identified in {tc.YELLOW}'\\{console}'{tc.END} directory ", write_to_log=False)
+
+                for console, missing_count in __missing_consoles.items():
+                    if missing_count == len(__consoles_dirs):
+                        __report.add_error("Target consoles", f"Configured target console '{console}' has no corresponding folder in any consoles directory")
+
+                # keep target media dirs in a stable order regardless of scan completion order
+                ToolConfig.target_media_dirs.sort()
+                if not __log_console_details:
+                    Logger.log_message("info", f"Media subdirectories identified in {len(ToolConfig.target_media_dirs)} console directories", print_to_console=False)
+                    Logger.log_message("info", f"Media subdirectories identified in {tc.YELLOW}{len(ToolConfig.target_media_dirs)}{tc.END} console directories", write_to_log=False)
 
             # verify "suffix_action" has valid configuration
             if ToolConfig.get_suffix_action() not in ["add", "remove"]:
-                ToolConfig.__invalid_config_response("Suffix action")    
+                __report.add_error("Suffix action", f"'{ToolConfig.get_suffix_action()}' is not a valid suffix action -- expected 'add' or 'remove'")
 
             # verify at least one valid file type specified in configuration
             __target_media_file_types = ToolConfig.get_target_media_file_types()
             if not __target_media_file_types:
-                Logger.log_message("error", f"At least one media file type must be specified as a target in '{constants.CONFIG_FILE}'")
-                ToolConfig.__invalid_config_response("Target media file types")
+                __report.add_error("Target media file types", f"At least one media file type must be specified as a target in '{constants.CONFIG_FILE}'")
             else:
-                for file_type in __target_media_file_types:
-                    if file_type[:1] == ".":
-                        Logger.log_message("info", f"'{file_type}' files identified as target for name modification", print_to_console=False)
-                        Logger.log_message("info", f"{tc.YELLOW}'{file_type}'{tc.END} files identified as target for name modification", write_to_log=False)
-                    else:
-                        Logger.log_message("info", f"'.{file_type}' files identified as target for name modification", print_to_console=False)
-                        Logger.log_message("info", f"{tc.YELLOW}'.{file_type}'{tc.END} files identified as target for name modification", write_to_log=False)
+                # file types are normalized without a leading "." when the config is compiled
+                for file_type in sorted(__target_media_file_types):
+                    Logger.log_message("info", f"'.{file_type}' files identified as target for name modification", print_to_console=False)
+                    Logger.log_message("info", f"{tc.YELLOW}'.{file_type}'{tc.END} files identified as target for name modification", write_to_log=False)
 
             # verify at least one suffix has been specified in configuration
-            __suffix_dict = ToolConfig.get_suffixes_by_media_type_dict()
-            __media_type_suffix_pairs = []
-
-            for media_type, suffix in __suffix_dict.items():
-                if suffix:
-                    __media_type_suffix_pairs.append((media_type, suffix))
+            __media_type_suffix_pairs = ToolConfig.get_target_media_suffix_pairs()
             
             # if no suffixes configured
             if not __media_type_suffix_pairs:
-                Logger.log_message("error", f"At least one (media type : suffix) pair must be specified in '{constants.CONFIG_FILE}'")
-                ToolConfig.__invalid_config_response("Suffixes by media types")
+                __report.add_error("Suffixes by media types", f"At least one (media type : suffix) pair must be specified in '{constants.CONFIG_FILE}'")
             else:
                 for pair in __media_type_suffix_pairs:
                     # unpack pair tuples
@@ -168,31 +300,112 @@ class ToolConfig(metaclass=Singleton):
                     Logger.log_message("info", f"'{suffix}' will be added to filenames in '{media_type}' folders", print_to_console=False)
                     Logger.log_message("info", f"{tc.YELLOW}'{suffix}'{tc.END} will be added to filenames in {tc.CYAN}'{media_type}'{tc.END} folders", write_to_log=False)
 
+            # verify "png_compression_level" is a zlib level, so a bad value is reported here instead of failing every PNG in the worker pool
+            __png_compression_level = ToolConfig.get_png_compression_level()
+            if isinstance(__png_compression_level, bool) or not isinstance(__png_compression_level, int) or not 0 <= __png_compression_level <= 9:
+                __report.add_error("PNG compression level", f"'{__png_compression_level}' is not a valid PNG compression level -- expected a whole number from 0 to 9")
+
+            # verify every "media_rules" entry compiled without problems
+            for rule in ToolConfig.get_media_rules():
+                for error in rule.errors:
+                    __report.add_error("Media rules", f"Rule '{rule.name}' -- {error}")
+                for file_type in sorted(rule.file_types or ()):
+                    if file_type not in __target_media_file_types:
+                        __report.add_warning("Media rules", f"Rule '{rule.name}' matches '.{file_type}' files, which are not a target media file type")
+
+            # report every problem found at once
+            __report.log()
+            if __report.has_errors():
+                for config_key in __report.get_invalid_config_keys():
+                    ToolConfig.__invalid_config_response(config_key, log_level="error", exit_program=False)
+                if exit_on_error:
+                    ToolConfig.__invalid_config_response("", invalid_messaging=False)
+                return False
+
             # all fields validated in config file
             Logger.log_message("result", f"All configurations in '{constants.CONFIG_FILE}' are valid")
+            ToolConfig.__save_validation_cache(__fingerprint)
             return True
 
 
         except Exception as e:
             Logger.log_message("critical", f"'{constants.CONFIG_FILE}' validation failed: {e}")
+            return False
+
+    def __compute_validation_fingerprint(consoles_dirs: list[Path]) -> str | None:
+        '''
+        Hashes the config file contents with the mtimes of each consoles directory and their target console directories
+
+        A console dir's mtime changes when a subdirectory (e.g. the `media_dir_identifier` dir) is added, removed or renamed in it
+        '''
+        try:
+            __config = ToolConfig.get_config()
+            __root_mtimes = []
+            for consoles_dir in consoles_dirs:
+                with os.scandir(consoles_dir) as __entries:
+                    __console_mtimes = sorted((entry.name, entry.stat().st_mtime_ns) for entry in __entries if entry.is_dir() and (__config.scan_all_consoles or entry.name in __config.target_consoles))
+                __root_mtimes.append([str(consoles_dir), os.stat(consoles_dir).st_mtime_ns, __console_mtimes])
+
+            __fingerprint_source = json.dumps([__config.source_hash, str(ToolConfig.output_dir), __root_mtimes])
+            return hashlib.sha256(__fingerprint_source.encode()).hexdigest()
+
+        except OSError:
+            # e.g. missing target console -- run full validation to report it
+            return None
+
+    def __load_cached_validation(fingerprint: str | None) -> list[Path] | None:
+        if fingerprint is None:
+            return None
+        try:
+            with open(Path(ToolConfig.output_dir) / constants.VALIDATION_CACHE_FILE) as __cache_file:
+                __cache = json.load(__cache_file)
+            if __cache.get("fingerprint") != fingerprint:
+                return None
+            return [Path(media_dir) for media_dir in __cache["target_media_dirs"]]
+
+        except (OSError, ValueError, KeyError):
+            return None
 
-    def __identify_console_dir_path() -> Path:
-        __consoles_dir = ToolConfig.get_consoles_dir()
+    def __save_validation_cache(fingerprint: str | None) -> None:
+        if fingerprint is None:
+            return
+        try:
+            with open(Path(ToolConfig.output_dir) / constants.VALIDATION_CACHE_FILE, "w") as __cache_file:
+                json.dump({"fingerprint": fingerprint, "target_media_dirs": [str(media_dir) for media_dir in ToolConfig.target_media_dirs]}, __cache_file)
 
-        # verify target consoles directory exists in system
-        if not os.path.exists(__consoles_dir):
-            Logger.log_message("critical", f"The configured consoles directory filepath '{__consoles_dir}' does not exist")
-            ToolConfig.__invalid_config_response("Consoles directory")     
+        except OSError as oe:
+            Logger.log_message("warning", f"Unable to write validation cache: {oe}", print_to_console=False)
 
-        return Path(__consoles_dir)
+    def __identify_console_dir_paths(report: ValidationReport) -> list[Path]:
+        __consoles_dirs = []
+        if not ToolConfig.get_consoles_dirs():
+            report.add_error("Consoles directory", f"No consoles directory is configured in '{constants.CONFIG_FILE}'")
+
+        # verify every target consoles directory exists in system
+        for consoles_dir in ToolConfig.get_consoles_dirs():
+            if not os.path.exists(consoles_dir):
+                report.add_error("Consoles directory", f"The configured consoles directory filepath '{consoles_dir}' does not exist")
+            elif Path(consoles_dir) not in __consoles_dirs:
+                __consoles_dirs.append(Path(consoles_dir))
+
+        return __consoles_dirs
     
-    def __identify_output_dir_path() -> Path:
-        # verify target output directory exists in system; if not, prompt dir creation
+    def __identify_output_dir_path(report: ValidationReport) -> Path | str:
+        '''
+        Verifies target output directory exists in system; if not, handles it according to the configured "missing_output_dir_policy"
+
+        "create" creates it, "fail" reports an error, and "prompt" asks the user -- "prompt" falls back to "fail" when stdin is not interactive or prompting is turned off by `set_interactive()`, so unattended runs never hang
+        '''
         __output_dir = ToolConfig.get_output_dir()
 
+        # verify "missing_output_dir_policy" has valid configuration -- checked even if the output dir exists, so a typo is caught before it matters
+        __policy = ToolConfig.get_missing_output_dir_policy()
+        if __policy not in ToolConfig.MISSING_OUTPUT_DIR_POLICIES:
+            report.add_error("Missing output dir policy", f"'{__policy}' is not a valid missing output dir policy -- expected 'prompt', 'create' or 'fail'")
+
         # if no output dir configured, use default output folder (local "output")
         if not __output_dir:
-            __output_dir = ".\\output"
+            __output_dir = Path("output")
 
             # if default local "output" folder not yet created
             if not os.path.exists(__output_dir):
@@ -200,29 +413,48 @@ class ToolConfig(metaclass=Singleton):
                     ToolConfig.__create_path(__output_dir)
 
                 except Exception:
-                    ToolConfig.__invalid_config_response("Output directory", invalid_messaging=False)
+                    report.add_error("Output directory", f"Unable to create default output directory '{__output_dir}'")
+                    return ""
 
         # if output dir configured, verify path exists in system
         if not os.path.exists(__output_dir):
-            Logger.log_message("warning", f"The configured output directory filepath '{__output_dir}' does not exist")
-            ToolConfig.__invalid_config_response("Output directory", log_level="error", exit_program=False)
-            
-            while True:
-                __create_dir_reply = input(f"Would you like to create a path to {tc.CYAN}'{__output_dir}'{tc.END} now? [y/n]\n>> ")
-                match __create_dir_reply:
-                    case "y" | "yes":
-                        try:
-                            ToolConfig.__create_path(__output_dir)
-                            break
-
-                        except Exception:
-                            ToolConfig.__invalid_config_response("Output directory")
-                    
-                    case "n" | "no":
-                        ToolConfig.__invalid_config_response("Output directory")
-
-                    case _:
-                        print("ERROR | Invalid reponse - enter 'y' or 'n'\n")
+            if __policy == "prompt" and not (ToolConfig.__interactive and sys.stdin and sys.stdin.isatty()):
+                Logger.log_message("warning", "Non-interactive session -- not prompting to create the output directory")
+                __policy = "fail"
+
+            match __policy:
+                case "create":
+                    try:
+                        ToolConfig.__create_path(__output_dir)
+
+                    except Exception:
+                        report.add_error("Output directory", f"Unable to create configured output directory '{__output_dir}'")
+                        return ""
+
+                case "prompt":
+                    Logger.log_message("warning", f"The configured output directory filepath '{__output_dir}' does not exist")
+                    while True:
+                        __create_dir_reply = input(f"Would you like to create a path to {tc.CYAN}'{__output_dir}'{tc.END} now? [y/n]\n>> ")
+                        match __create_dir_reply:
+                            case "y" | "yes":
+                                try:
+                                    ToolConfig.__create_path(__output_dir)
+                                    break
+
+                                except Exception:
+                                    report.add_error("Output directory", f"Unable to create configured output directory '{__output_dir}'")
+                                    return ""
+                            
+                            case "n" | "no":
+                                report.add_error("Output directory", f"The configured output directory filepath '{__output_dir}' does not exist")
+                                return ""
+
+                            case _:
+                                Logger.log_message("error", "Invalid response -- enter 'y' or 'n'")
+
+                case _:
+                    report.add_error("Output directory", f"The configured output directory filepath '{__output_dir}' does not exist")
+                    return ""
                     
         return Path(__output_dir)
 
@@ -0,0 +1,55 @@
+from typing import NamedTuple
+
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+
+
+class ValidationIssue(NamedTuple):
+    level: str          # "error" or "warning"
+    config_key: str     # config setting the issue relates to, e.g. "Target consoles"
+    message: str
+
+
+class ValidationReport:
+    '''
+    Collects every problem found while validating the config, so all of them can be reported at once instead of exiting on the first one
+    '''
+    def __init__(self):
+        self.issues: list[ValidationIssue] = []
+
+    def add_error(self, config_key: str, message: str) -> None:
+        self.issues.append(ValidationIssue("error", config_key, message))
+
+    def add_warning(self, config_key: str, message: str) -> None:
+        self.issues.append(ValidationIssue("warning", config_key, message))
+
+    def has_errors(self) -> bool:
+        return any(issue.level == "error" for issue in self.issues)
+
+    def get_errors(self) -> list[ValidationIssue]:
+        return [issue for issue in self.issues if issue.level == "error"]
+
+    def get_warnings(self) -> list[ValidationIssue]:
+        return [issue for issue in self.issues if issue.level == "warning"]
+
+    def get_invalid_config_keys(self) -> list[str]:
+        # unique keys with errors, in the order they were found
+        return list(dict.fromkeys(issue.config_key for issue in self.issues if issue.level == "error"))
+
+    def to_dict(self) -> dict:
+        return {
+            "valid": not self.has_errors(),
+            "errors": [issue._asdict() for issue in self.get_errors()],
+            "warnings": [issue._asdict() for issue in self.get_warnings()],
+        }
+
+    def log(self) -> None:
+        if not self.issues:
+            return
+
+        Logger.log_message("info", Formatter.generate_header("Validation report"))
+        __longest_key = max(len(issue.config_key) for issue in self.issues)
+        # errors first, then warnings
+        for issue in self.get_errors() + self.get_warnings():
+            Logger.log_message(issue.level, f"{Formatter.pad_field_label(issue.config_key, __longest_key)} {issue.message}")
+        Logger.log_message("info", f"{len(self.get_errors())} error(s), {len(self.get_warnings())} warning(s)")
@@ -0,0 +1,254 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import errno
+import random
+import statistics
+import threading
+import time
+from typing import Any, Callable
+
+from common import constants
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+
+# errors a network share returns when it is overloaded or briefly unreachable -- worth retrying, and a sign to back off
+TRANSIENT_ERRNOS = frozenset(getattr(errno, name) for name in (
+    "ETIMEDOUT", "EAGAIN", "EBUSY", "ESTALE", "ECONNRESET", "ECONNABORTED", "ENETDOWN", "ENETUNREACH", "EHOSTDOWN", "EHOSTUNREACH",
+) if hasattr(errno, name))
+# Windows SMB errors: network path not found, network name no longer available, semaphore timeout, network location unreachable
+TRANSIENT_WINERRORS = frozenset((53, 64, 121, 1231))
+
+class AimdController:
+    '''
+    Additive-increase / multiplicative-decrease concurrency limit, driven by operation latency
+
+    Latencies are collected in windows of at least `limit` samples; after each window, the limit
+    - grows by 1 while the window's median latency stays within `ADAPTIVE_LATENCY_TOLERANCE` of the best median seen (more workers are still served as fast)
+    - shrinks by `ADAPTIVE_LATENCY_DECREASE_FACTOR` once latency rises past it (the share is queueing requests)
+    - shrinks by `ADAPTIVE_ERROR_DECREASE_FACTOR` if any operation in the window hit a transient error (e.g. a timeout)
+
+    The best median slowly drifts up by `ADAPTIVE_BASELINE_DRIFT` per window, so a share that got permanently slower is not chased down to 1 worker
+    '''
+    __slots__ = ("__limit", "__min_limit", "__max_limit", "__samples", "__congested", "__baseline", "__lock", "__history")
+
+    def __init__(self, initial_limit: int, min_limit: int=1, max_limit: int=constants.MAX_IO_WORKERS):
+        self.__min_limit = max(1, min_limit)
+        self.__max_limit = max(self.__min_limit, max_limit)
+        self.__limit = min(max(initial_limit, self.__min_limit), self.__max_limit)
+        self.__samples = []
+        self.__congested = False
+        self.__baseline = None
+        self.__lock = threading.Lock()
+        self.__history = [self.__limit]         # limit after every window, for reports and tests
+
+    def observe(self, latency: float, congested: bool=False) -> int:
+        '''
+        Records one operation's latency in seconds (`congested` if it hit a transient error) and returns the current limit
+        '''
+        with self.__lock:
+            self.__samples.append(latency)
+            self.__congested = self.__congested or congested
+            if len(self.__samples) >= max(self.__limit, constants.ADAPTIVE_MIN_WINDOW):
+                self.__adjust()
+            return self.__limit
+
+    def get_limit(self) -> int:
+        return self.__limit
+
+    def get_history(self) -> list[int]:
+        with self.__lock:
+            return list(self.__history)
+
+    def __adjust(self) -> None:
+        __median = statistics.median(self.__samples)
+        self.__baseline = __median if self.__baseline is None else min(self.__baseline * constants.ADAPTIVE_BASELINE_DRIFT, __median)
+
+        if self.__congested:
+            self.__limit = max(self.__min_limit, int(self.__limit * constants.ADAPTIVE_ERROR_DECREASE_FACTOR))
+        elif __median > self.__baseline * constants.ADAPTIVE_LATENCY_TOLERANCE:
+            self.__limit = max(self.__min_limit, int(self.__limit * constants.ADAPTIVE_LATENCY_DECREASE_FACTOR))
+        else:
+            self.__limit = min(self.__max_limit, self.__limit + 1)
+
+        self.__samples = []
+        self.__congested = False
+        self.__history.append(self.__limit)
+
+    def run_unit_test() -> None:
+        Logger.log_message("info", f"{Formatter.generate_header("Testing AimdController methods", capitalize=False)}")
+        try:
+            __controller = AimdController(4, min_limit=1, max_limit=6)
+            __observe_window = lambda latency, congested=False: [__controller.observe(latency, congested and index == 0) for index in range(constants.ADAPTIVE_MIN_WINDOW)][-1]
+
+            # steady latency grows the limit by 1 per window, up to max_limit
+            for _ in range(3):
+                __observe_window(0.01)
+            Logger.log_message("info", f"get_limit() returned {__controller.get_limit()} after 3 steady windows")
+            assert __controller.get_limit() == 6, f"limit is {__controller.get_limit()} after 3 steady windows, expected 6"
+
+            # a latency rise past the tolerance shrinks it by the latency factor
+            __observe_window(0.05)
+            __expected = int(6 * constants.ADAPTIVE_LATENCY_DECREASE_FACTOR)
+            Logger.log_message("info", f"get_limit() returned {__controller.get_limit()} after a slow window")
+            assert __controller.get_limit() == __expected, f"limit is {__controller.get_limit()} after a slow window, expected {__expected}"
+
+            # a single transient error in a window shrinks it by the error factor, down to min_limit
+            for _ in range(3):
+                __expected = max(1, int(__expected * constants.ADAPTIVE_ERROR_DECREASE_FACTOR))
+                __observe_window(0.01, congested=True)
+                assert __controller.get_limit() == __expected, f"limit is {__controller.get_limit()} after a congested window, expected {__expected}"
+            Logger.log_message("info", f"get_history() returned {__controller.get_history()}")
+            assert __controller.get_history()[:4] == [4, 5, 6, 6] and __controller.get_history()[-1] == 1, f"history is {__controller.get_history()}"
+
+        except Exception as e:
+            Logger.log_message("critical", f"AimdController unit test has failed: {e}")
+
+class AdaptiveExecutor:
+    '''
+    Thread pool whose number of concurrently running tasks follows an `AimdController`, for file operations on network shares
+
+    With `adaptive_max_workers` None, the pool behaves like a plain pool of `max_workers` threads; otherwise `max_workers` is only the starting limit,
+    and the limit moves between 1 and `adaptive_max_workers` with the latency of each task (divided by `get_units(result)` if given, e.g. files scanned)
+
+    `submit()` blocks once twice the current limit of tasks are queued or running, so a lazily built plan is never loaded into memory
+    Tasks can wrap their own file operations in `retry()`, which retries transient errors with exponential backoff and reports them to the controller
+    '''
+    __slots__ = ("__name", "__controller", "__max_workers", "__pool", "__condition", "__queued", "__running", "__get_units", "__retries", "__transient_errors", "__started")
+
+    # per worker thread: whether the running task has hit a transient error, None outside a task
+    __thread_state = threading.local()
+
+    def __init__(self, max_workers: int, name: str, adaptive_max_workers: int | None=None, get_units: Callable[[Any], int] | None=None):
+        if adaptive_max_workers is None:
+            self.__controller = None
+            __threads = max_workers
+        else:
+            self.__controller = AimdController(max_workers, max_limit=adaptive_max_workers)
+            __threads = max(max_workers, adaptive_max_workers)
+
+        self.__name = name
+        self.__max_workers = max_workers
+        self.__pool = ThreadPoolExecutor(max_workers=__threads, thread_name_prefix=name)
+        self.__condition = threading.Condition()
+        self.__queued = 0
+        self.__running = 0
+        self.__get_units = get_units
+        self.__retries = 0
+        self.__transient_errors = 0
+        self.__started = time.perf_counter()
+
+    def __enter__(self) -> "AdaptiveExecutor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown(wait=exc_info[0] is None, cancel_futures=exc_info[0] is not None)
+
+    def submit(self, task: Callable, *args) -> Future:
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__queued < self.get_limit() * 2)
+            self.__queued += 1
+        try:
+            return self.__pool.submit(self.__run, task, args)
+        except BaseException:
+            self.__release(running=False)
+            raise
+
+    def shutdown(self, wait: bool=True, cancel_futures: bool=False) -> None:
+        self.__pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def get_limit(self) -> int:
+        return self.__controller.get_limit() if self.__controller is not None else self.__max_workers
+
+    def retry(self, operation: Callable, *args, attempts: int=constants.IO_RETRY_ATTEMPTS, applied: Callable[[], bool] | None=None) -> Any:
+        '''
+        Calls `operation(*args)`, retrying transient errors up to `attempts` times in total with exponential backoff and full jitter
+
+        For operations that are not idempotent (e.g. a rename), `applied()` tells whether an attempt took effect even though it failed -- a share can apply
+        the operation and then lose the reply -- and is checked after every transient error, and before any later attempt: once it returns True, the operation
+        counts as done and None is returned instead of retrying (or raising)
+
+        The last transient error, and any other error after a transient one that was not applied, is raised to the caller
+        '''
+        __had_transient_error = False
+        for attempt in range(attempts):
+            try:
+                return operation(*args)
+
+            except OSError as e:
+                if not AdaptiveExecutor.is_transient_error(e):
+                    # e.g. FileNotFoundError from a retried rename whose first attempt was applied
+                    if __had_transient_error and applied is not None and applied():
+                        return None
+                    raise
+                __had_transient_error = True
+                with self.__condition:
+                    self.__transient_errors += 1
+                if getattr(AdaptiveExecutor.__thread_state, "congested", None) is not None:
+                    AdaptiveExecutor.__thread_state.congested = True
+                if applied is not None and applied():
+                    return None
+                if attempt + 1 == attempts:
+                    raise
+                with self.__condition:
+                    self.__retries += 1
+                time.sleep(random.uniform(0, min(constants.IO_RETRY_MAX_DELAY_SECONDS, constants.IO_RETRY_BASE_DELAY_SECONDS * 2 ** attempt)))
+
+    @staticmethod
+    def is_transient_error(error: BaseException) -> bool:
+        if not isinstance(error, OSError):
+            return False
+        return error.errno in TRANSIENT_ERRNOS or getattr(error, "winerror", None) in TRANSIENT_WINERRORS
+
+    def get_stats(self) -> dict:
+        return {
+            "name": self.__name,
+            "adaptive": self.__controller is not None,
+            "limit": self.get_limit(),
+            "limit_history": self.__controller.get_history() if self.__controller is not None else [self.get_limit()],
+            "retries": self.__retries,
+            "transient_errors": self.__transient_errors,
+            "seconds": time.perf_counter() - self.__started,
+        }
+
+    def log_summary(self) -> None:
+        '''
+        Logs how the limit moved over the run, and how many transient errors were seen and retried
+        '''
+        __stats = self.get_stats()
+        if not __stats["adaptive"] and not __stats["transient_errors"]:
+            return
+
+        __history = __stats["limit_history"]
+        __label = Formatter.pad_field_label(f"{self.__name} workers", len(self.__name) + 8)
+        Logger.log_message("info", f"{__label} {__history[0]} -> {__history[-1]} (min {min(__history)}, max {max(__history)}, {len(__history) - 1} adjustment(s)) | {__stats['transient_errors']} transient error(s), {__stats['retries']} retried", print_to_console=False)
+
+    def __run(self, task: Callable, args: tuple) -> Any:
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__running < self.get_limit())
+            self.__running += 1
+
+        __state = AdaptiveExecutor.__thread_state
+        __state.congested = False
+        __result = None
+        __start = time.perf_counter()
+        try:
+            __result = task(*args)
+            return __result
+
+        except OSError as e:
+            __state.congested = __state.congested or AdaptiveExecutor.is_transient_error(e)
+            raise
+
+        finally:
+            __congested = __state.congested
+            __state.congested = None
+            if self.__controller is not None:
+                __units = max(1, self.__get_units(__result)) if self.__get_units is not None and __result is not None else 1
+                self.__controller.observe((time.perf_counter() - __start) / __units, __congested)
+            self.__release()
+
+    def __release(self, running: bool=True) -> None:
+        with self.__condition:
+            self.__queued -= 1
+            if running:
+                self.__running -= 1
+            self.__condition.notify_all()
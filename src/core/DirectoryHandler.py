@@ -1,12 +1,13 @@
 from pathlib import Path
 
 from common.Singleton import Singleton
+from core.MediaWalker import MediaWalker
 from utils.Logger import Logger
 
 class DirectoryHandler(metaclass=Singleton):
     def get_subdirectories(directory: Path) -> list[str]:
         try:
-            __target_subdirectories = [folder.name for folder in Path(directory).iterdir() if folder.is_dir()]
+            __target_subdirectories = [entry.name for entry in MediaWalker.scan_subdirectories(directory)]
             return __target_subdirectories
         
         except FileNotFoundError:
@@ -17,4 +18,4 @@ class DirectoryHandler(metaclass=Singleton):
             Logger.log_message("critical", f"Unexpected exception encountered in DirectoryHandler.get_subdirectories(): {e}")
     
     def add_to_path(directory: Path, subdirectory: str) -> Path:
-        return Path(str(directory) + f"\\{subdirectory}")
\ No newline at end of file
+        return Path(directory) / subdirectory
\ No newline at end of file
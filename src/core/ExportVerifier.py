@@ -0,0 +1,294 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import mmap
+import os
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+from common import constants
+from common.Singleton import Singleton
+from config_loaders.ToolConfig import ToolConfig
+from core.MediaExporter import MediaExporter
+from core.MediaRules import MediaRules
+from core.MediaWalker import MediaWalker
+from core.PngRecompressor import PngRecompressor
+from core.SuffixTool import SuffixTool
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+from utils.RunStats import RunStats
+from utils.TestTime import TestTime
+
+class ExportMismatch(NamedTuple):
+    status: str
+    console: str
+    media_type: str
+    src: Path | None                # None for extra output files with no source
+    dst: Path
+    detail: str = ""                # e.g. "1,024 -> 1,000 bytes"
+
+class ExportVerifier(metaclass=Singleton):
+    '''
+    Verify mode -- checks that the output dir holds an up to date copy of every source media file, under its exported (suffixed) name
+
+    The source tree is planned exactly as an export would name it, while the output tree is walked on another thread, then files are compared by size and mtime
+    With `deep`, files that match on size and mtime are also compared by a blake2b hash of their content, read through mmap on a thread pool
+
+    Hardlinked copies (same inode as the source) always match; recompressed PNGs only need the source mtime and a size no larger than the source,
+    and deduplicated outputs (hardlinked to another source's copy) are not compared by mtime
+    Mismatched files can be re-exported on their own, without re-exporting the whole library
+    '''
+    MISSING = "missing"
+    SIZE = "size"
+    MTIME = "mtime"
+    CONTENT = "content"
+    EXTRA = "extra"                 # in the output dir, but not exported from any source file
+
+    # one character per status in the compact diff
+    DIFF_SYMBOLS = {MISSING: "-", EXTRA: "+", SIZE: "~", MTIME: "~", CONTENT: "!"}
+
+    __DIGEST_SIZE = 32
+
+    def run(output_dir: Path | None=None, deep: bool=False, recopy: bool=False, diff_path: Path | None=None, max_workers: int=constants.HASH_MAX_WORKERS) -> list[ExportMismatch] | None:
+        '''
+        Verifies the output dir (defaults to the configured one), writes the compact diff to `diff_path` (defaults to the output dir) and, with `recopy`, re-exports mismatched files
+
+        Returns the mismatches left after any recopy, or None if verification failed
+        '''
+        if output_dir is None:
+            output_dir = ToolConfig.output_dir
+        if not output_dir:
+            Logger.log_message("error", "No output directory configured -- nothing to verify")
+            return None
+        if diff_path is None:
+            diff_path = Path(output_dir) / constants.EXPORT_DIFF_FILE
+
+        Logger.log_message("info", f"Verifying '{output_dir}' against source media{' (deep)' if deep else ''}...")
+        RunStats.reset(aggregate=ToolConfig.is_aggregate_logging_enabled(), file_details=ToolConfig.is_file_detail_logging_enabled(), progress_interval=ToolConfig.get_progress_interval())
+        try:
+            if not ToolConfig.target_media_dirs:
+                Logger.log_message("error", "No target media directories identified -- run config validation before verifying the output")
+                return None
+
+            with TestTime.span("verify export"):
+                __checked, __mismatches = ExportVerifier.verify(output_dir, deep=deep, max_workers=max_workers)
+            ExportVerifier.write(__mismatches, diff_path, output_dir)
+            ExportVerifier.log_summary(__checked, __mismatches, output_dir)
+            Logger.log_message("result", f"Export diff saved to '{diff_path}'")
+
+            if recopy and __mismatches:
+                with TestTime.span("recopy"):
+                    __mismatches = ExportVerifier.recopy(__mismatches, max_workers=max_workers)
+                RunStats.log_summary("Recopy summary")
+                Logger.log_message("result" if not __mismatches else "warning", f"{len(__mismatches):,} mismatch(es) left after recopy")
+            return __mismatches
+
+        except Exception as e:
+            Logger.log_message("critical", f"ExportVerifier.run() has failed: {e}")
+            return None
+
+        finally:
+            RunStats.stop_progress()
+
+    def verify(output_dir: Path, action: str | None=None, deep: bool=False, max_workers: int=constants.HASH_MAX_WORKERS) -> tuple[int, list[ExportMismatch]]:
+        '''
+        Compares the export of every target media file against `output_dir`, and returns (number of source files checked, mismatches sorted by output path)
+        '''
+        if action is None:
+            action = ToolConfig.get_suffix_action()
+        __recompressed_types = frozenset(("png",)) if ToolConfig.is_png_recompression_enabled() else frozenset()
+        __deduplicated = ToolConfig.is_output_dedupe_enabled()
+        __media_dir_identifier = ToolConfig.get_media_dir_identifier()
+        __consoles = {Path(media_dir).parent.name for media_dir in ToolConfig.target_media_dirs}
+
+        __mismatches = []
+        __to_hash = []
+        __checked = 0
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ExportVerifier") as __executor:
+            # the output tree is walked while the source tree is planned
+            __output_future = __executor.submit(ExportVerifier.__walk_output, Path(output_dir), __media_dir_identifier, __consoles)
+
+            __pairs = SuffixTool.build_export_plan(action, output_dir)
+            # files a "skip" media rule leaves out of an export are not expected in the output either
+            if ToolConfig.get_media_rules():
+                __pairs = MediaRules.filter_pairs(__pairs, ToolConfig.get_media_rules(), {})
+            __pairs = list(__pairs)
+            __src_stats = list(__executor.map(ExportVerifier.__stat, (src for src, _ in __pairs)))
+            __output_files = __output_future.result()
+
+            for (src, dst), src_stat in zip(__pairs, __src_stats):
+                __checked += 1
+                __console, __media_type = dst.parents[2].name, dst.parent.name
+                __dst_stat = __output_files.pop(ExportVerifier.__get_key(__console, __media_type, dst.name), None)
+                if src_stat is None:
+                    # source vanished since it was planned -- nothing to compare it with
+                    continue
+                if __dst_stat is None:
+                    __mismatches.append(ExportMismatch(ExportVerifier.MISSING, __console, __media_type, src, dst))
+                    continue
+
+                __recompressed = MediaWalker.has_file_type(dst.name, __recompressed_types)
+                __mismatch = ExportVerifier.__compare(src, dst, src_stat, __dst_stat, __recompressed, __deduplicated)
+                if __mismatch is not None:
+                    __mismatches.append(__mismatch)
+                elif deep and not __recompressed and (src_stat.st_dev, src_stat.st_ino) != __dst_stat[3:]:
+                    __to_hash.append((src, dst))
+
+            # deep mode -- only files that already match on size and mtime need their content hashed
+            for (src, dst), (src_hash, dst_hash) in zip(__to_hash, __executor.map(lambda pair: (ExportVerifier.__hash_file(pair[0]), ExportVerifier.__hash_file(pair[1])), __to_hash)):
+                if src_hash is None or src_hash != dst_hash:
+                    __mismatches.append(ExportMismatch(ExportVerifier.CONTENT, dst.parents[2].name, dst.parent.name, src, dst, "unreadable" if src_hash is None or dst_hash is None else ""))
+
+        for (console, media_type, _), (path, _, _, _, _) in __output_files.items():
+            __mismatches.append(ExportMismatch(ExportVerifier.EXTRA, console, media_type, None, path))
+
+        return __checked, sorted(__mismatches, key=lambda mismatch: str(mismatch.dst))
+
+    def recopy(mismatches: Iterable[ExportMismatch], max_workers: int=constants.EXPORT_MAX_WORKERS) -> list[ExportMismatch]:
+        '''
+        Re-exports every mismatched file that has a source, then checks those files again and returns the mismatches left (extra files, failed copies)
+
+        Copies are replaced even if their size and mtime match (their content differed); recompressed PNGs are written by `PngRecompressor` as in a normal export
+        '''
+        mismatches = list(mismatches)
+        __recompressed_types = frozenset(("png",)) if ToolConfig.is_png_recompression_enabled() else frozenset()
+        __remaining = []
+        __pairs = []
+        __png_pairs = []
+        for mismatch in mismatches:
+            if mismatch.src is None:
+                __remaining.append(mismatch)
+            elif MediaWalker.has_file_type(mismatch.dst.name, __recompressed_types):
+                __png_pairs.append((mismatch.src, mismatch.dst))
+            else:
+                __pairs.append((mismatch.src, mismatch.dst))
+
+        Logger.log_message("info", f"Re-exporting {len(__pairs) + len(__png_pairs):,} mismatched file(s)...")
+        MediaExporter.log_summary(MediaExporter.export_files(__pairs, max_workers=max_workers, adaptive_max_workers=ToolConfig.get_adaptive_io_max_workers(), force=True))
+        if __png_pairs:
+            PngRecompressor.log_summary(PngRecompressor.recompress_files(__png_pairs, level=ToolConfig.get_png_compression_level()))
+
+        # a recopy only counts as fixed once the output checks out again
+        __recopied = [mismatch for mismatch in mismatches if mismatch.src is not None]
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ExportVerifier") as __executor:
+            __rechecked = __executor.map(lambda mismatch: ExportVerifier.__recheck(mismatch, MediaWalker.has_file_type(mismatch.dst.name, __recompressed_types)), __recopied)
+            __remaining.extend(mismatch for mismatch in __rechecked if mismatch is not None)
+        if len(__remaining) > sum(mismatch.src is None for mismatch in mismatches):
+            Logger.log_message("warning", "Some files could not be re-exported -- see the event log for details")
+        return sorted(__remaining, key=lambda mismatch: str(mismatch.dst))
+
+    def write(mismatches: Iterable[ExportMismatch], diff_path: Path, output_dir: Path) -> None:
+        '''
+        Writes a compact diff of the output dir, one line per mismatch: "<symbol> <path relative to the output dir>[  <detail>]"
+
+        "-" missing, "+" extra, "~" size or mtime differs, "!" content differs
+        '''
+        __diff_path = Path(diff_path)
+        __diff_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(__diff_path, "w", encoding="utf-8") as __diff_file:
+            for mismatch in mismatches:
+                __diff_file.write(ExportVerifier.format_mismatch(mismatch, output_dir) + "\n")
+
+    def format_mismatch(mismatch: ExportMismatch, output_dir: Path) -> str:
+        try:
+            __path = Path(mismatch.dst).relative_to(output_dir).as_posix()
+        except ValueError:
+            __path = str(mismatch.dst)
+        __detail = f"  {mismatch.status}: {mismatch.detail}" if mismatch.detail else f"  {mismatch.status}" if mismatch.status in (ExportVerifier.SIZE, ExportVerifier.MTIME, ExportVerifier.CONTENT) else ""
+        return f"{ExportVerifier.DIFF_SYMBOLS[mismatch.status]} {__path}{__detail}"
+
+    def log_summary(checked: int, mismatches: list[ExportMismatch], output_dir: Path, title: str="Export verification summary") -> None:
+        __counts = {}
+        for mismatch in mismatches:
+            __console_counts = __counts.setdefault(mismatch.console, {})
+            __console_counts[mismatch.status] = __console_counts.get(mismatch.status, 0) + 1
+
+        Logger.log_message("info", Formatter.generate_header(title))
+        __longest_label = max((len(console) for console in __counts), default=0)
+        for console, counts in sorted(__counts.items()):
+            __label = Formatter.pad_field_label(console, __longest_label)
+            Logger.log_message("warning", f"{__label} {ExportVerifier.__format_counts(counts)}")
+
+        # a short preview of the diff -- the full diff is in the diff file
+        for mismatch in mismatches[:constants.VERIFY_DIFF_PREVIEW]:
+            Logger.log_message("info", ExportVerifier.format_mismatch(mismatch, output_dir))
+        if len(mismatches) > constants.VERIFY_DIFF_PREVIEW:
+            Logger.log_message("info", f"... and {len(mismatches) - constants.VERIFY_DIFF_PREVIEW:,} more")
+
+        if mismatches:
+            __totals = {}
+            for mismatch in mismatches:
+                __totals[mismatch.status] = __totals.get(mismatch.status, 0) + 1
+            Logger.log_message("error", f"{checked:,} source file(s) checked | {len(mismatches):,} mismatch(es): {ExportVerifier.__format_counts(__totals)}")
+        else:
+            Logger.log_message("result", f"{checked:,} source file(s) checked | output matches the source")
+
+    def __walk_output(output_dir: Path, media_dir_identifier: str, consoles: set[str]) -> dict[tuple[str, str, str], tuple[Path, int, int, int, int]]:
+        # {(console, media type, name key): (path, size, mtime_ns, st_dev, st_ino)} for every target media file exported for a target console
+        __media_dirs = [output_dir / console / media_dir_identifier for console in sorted(consoles) if (output_dir / console / media_dir_identifier).is_dir()]
+        __files = {}
+        for console_media in MediaWalker.walk_media_dirs(__media_dirs, file_types=ToolConfig.get_target_media_file_types()):
+            if console_media.error is not None:
+                raise OSError(f"Unable to scan '{console_media.media_path}': {console_media.error}")
+            for media_type, entries in console_media.media_files.items():
+                for entry in entries:
+                    __stat = entry.stat()
+                    __files[ExportVerifier.__get_key(console_media.console, media_type, entry.name)] = (Path(entry.path), __stat.st_size, __stat.st_mtime_ns, __stat.st_dev, entry.inode())
+        return __files
+
+    def __compare(src: Path, dst: Path, src_stat: os.stat_result, dst_stat: tuple[Path, int, int, int, int], recompressed: bool, deduplicated: bool) -> ExportMismatch | None:
+        __path, __size, __mtime_ns, __dev, __ino = dst_stat
+        __console, __media_type = dst.parents[2].name, dst.parent.name
+
+        # hardlinked export -- the output is the source
+        if (__dev, __ino) == (src_stat.st_dev, src_stat.st_ino):
+            return None
+
+        if __size != src_stat.st_size and not (recompressed and __size < src_stat.st_size):
+            return ExportMismatch(ExportVerifier.SIZE, __console, __media_type, src, dst, f"{src_stat.st_size:,} -> {__size:,} bytes")
+
+        # a deduplicated output is linked to the copy of another, identical source and carries that file's mtime
+        if __mtime_ns != src_stat.st_mtime_ns and not (deduplicated and __size == src_stat.st_size):
+            return ExportMismatch(ExportVerifier.MTIME, __console, __media_type, src, dst, f"{(__mtime_ns - src_stat.st_mtime_ns) / 1e9:+,.3f} s")
+        return None
+
+    def __recheck(mismatch: ExportMismatch, recompressed: bool) -> ExportMismatch | None:
+        # compares a re-exported file again; content is rehashed only for files whose content differed
+        __src_stat = ExportVerifier.__stat(mismatch.src)
+        __dst_stat = ExportVerifier.__stat(mismatch.dst)
+        if __src_stat is None:
+            return None
+        if __dst_stat is None:
+            return mismatch._replace(status=ExportVerifier.MISSING, detail="")
+
+        __mismatch = ExportVerifier.__compare(mismatch.src, mismatch.dst, __src_stat, (mismatch.dst, __dst_stat.st_size, __dst_stat.st_mtime_ns, __dst_stat.st_dev, __dst_stat.st_ino), recompressed, ToolConfig.is_output_dedupe_enabled())
+        if __mismatch is None and mismatch.status == ExportVerifier.CONTENT and not recompressed:
+            __src_hash = ExportVerifier.__hash_file(mismatch.src)
+            if __src_hash is None or __src_hash != ExportVerifier.__hash_file(mismatch.dst):
+                return mismatch
+        return __mismatch
+
+    def __stat(path: Path) -> os.stat_result | None:
+        try:
+            return os.stat(path)
+        except OSError:
+            return None
+
+    def __get_key(console: str, media_type: str, name: str) -> tuple[str, str, str]:
+        return console, media_type, os.path.normcase(name)
+
+    def __hash_file(path: Path) -> bytes | None:
+        try:
+            with open(path, "rb") as __file:
+                if os.fstat(__file.fileno()).st_size == 0:
+                    return hashlib.blake2b(b"", digest_size=ExportVerifier.__DIGEST_SIZE).digest()
+
+                # hashing the mapped file avoids copying it through read buffers, and hashlib releases the GIL for large inputs
+                with mmap.mmap(__file.fileno(), 0, access=mmap.ACCESS_READ) as __mapped:
+                    return hashlib.blake2b(__mapped, digest_size=ExportVerifier.__DIGEST_SIZE).digest()
+
+        except Exception as e:
+            Logger.log_message("error", f"Unable to hash '{path}': {e}")
+            return None
+
+    def __format_counts(counts: dict[str, int]) -> str:
+        return ", ".join(f"{status} {count:,}" for status, count in sorted(counts.items()))
@@ -0,0 +1,266 @@
+import hashlib
+import os
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Iterable
+
+from common import constants
+from common.Singleton import Singleton
+from utils.Logger import Logger
+
+class FileIndex(metaclass=Singleton):
+    '''
+    Persistent SQLite index of processed media, stored in the output directory
+
+    Files are keyed by (media type dir path, filename) -- so consoles of the same name under different roots never share rows -- and store size, mtime and the suffix state last applied to them
+    The suffix state (see `get_suffix_state()`) is the suffix action plus a hash of the suffixes and file types it was applied with, so changing either in the config rescans everything
+    Media type directories store the mtime recorded after they were last fully processed, so unchanged directories can be skipped on reruns
+    Content hashes and header metadata are cached by path, size and mtime, so unchanged files are never read again
+    '''
+    __connection = None
+    __lock = threading.Lock()
+    __pending_writes = 0
+    __tracked_dirs = {}         # media type dir path -> [mtime_ns before it was listed, True if every file in it was processed successfully, True if the tool renamed files in it]
+
+    def open(index_dir: Path) -> bool:
+        '''
+        Opens (creating if needed) the index database in `index_dir`; returns False if the index cannot be used
+        '''
+        if FileIndex.__connection is not None:
+            return True
+
+        try:
+            __index_path = Path(index_dir) / constants.FILE_INDEX_FILE
+            FileIndex.__connection = sqlite3.connect(__index_path, check_same_thread=False)
+            FileIndex.__connection.execute("PRAGMA journal_mode=WAL")
+            FileIndex.__connection.execute("PRAGMA synchronous=NORMAL")
+            # indexes written before files were keyed by their media type dir are dropped and rebuilt by the next run
+            if "console" in {row[1] for row in FileIndex.__connection.execute("PRAGMA table_info(files)")}:
+                FileIndex.__connection.execute("DROP TABLE files")
+            FileIndex.__connection.executescript('''
+                CREATE TABLE IF NOT EXISTS files (
+                    dir TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    suffix_state TEXT NOT NULL,
+                    PRIMARY KEY (dir, filename)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS directories (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    suffix_state TEXT NOT NULL
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS hashes (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    partial_hash BLOB,
+                    full_hash BLOB
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS metadata (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    width INTEGER,
+                    height INTEGER,
+                    duration REAL,
+                    codec TEXT
+                ) WITHOUT ROWID;
+            ''')
+            FileIndex.__tracked_dirs = {}
+            Logger.log_message("info", f"File index opened at '{__index_path}'", print_to_console=False)
+            return True
+
+        except Exception as e:
+            Logger.log_message("warning", f"Unable to open file index in '{index_dir}' -- running without incremental index: {e}")
+            FileIndex.__connection = None
+            return False
+
+    def is_open() -> bool:
+        return FileIndex.__connection is not None
+
+    def close() -> None:
+        with FileIndex.__lock:
+            if FileIndex.__connection is None:
+                return
+            FileIndex.__connection.commit()
+            FileIndex.__connection.close()
+            FileIndex.__connection = None
+            FileIndex.__pending_writes = 0
+
+    def get_suffix_state(action: str, suffix_pairs: Iterable[tuple[str, str]], file_types: Iterable[str]) -> str:
+        '''
+        Returns the state files and directories are indexed with, e.g. "add:3f2a9c01d4e5" -- it changes with the configured suffixes and file types
+        '''
+        __config = repr((sorted(suffix_pairs), sorted(file_types)))
+        return f"{action}:{hashlib.sha1(__config.encode('utf-8')).hexdigest()[:12]}"
+
+    def get_dir_mtimes(suffix_state: str) -> dict[str, int]:
+        '''
+        Returns {media type dir path: mtime_ns} for directories last fully processed with `suffix_state`
+        '''
+        with FileIndex.__lock:
+            __rows = FileIndex.__connection.execute("SELECT path, mtime_ns FROM directories WHERE suffix_state = ?", (suffix_state,))
+            return {path: mtime_ns for path, mtime_ns in __rows}
+
+    def get_file_states(media_type_dir: Path | str) -> dict[str, tuple[int, int, str]]:
+        '''
+        Returns {filename: (size, mtime_ns, suffix_state)} for every indexed file of a media type dir
+        '''
+        with FileIndex.__lock:
+            return FileIndex.__get_file_states(FileIndex.__get_dir_key(media_type_dir))
+
+    def is_file_current(entry: os.DirEntry, indexed_state: tuple[int, int, str] | None, suffix_state: str) -> bool:
+        '''
+        Returns True if `entry` is indexed with the same size, mtime and `suffix_state`, i.e. it does not need processing
+        '''
+        if indexed_state is None:
+            return False
+
+        __size, __mtime_ns, __suffix_state = indexed_state
+        if __suffix_state != suffix_state:
+            return False
+
+        __stat = entry.stat()
+        return __stat.st_size == __size and __stat.st_mtime_ns == __mtime_ns
+
+    def record_file(path: Path, suffix_state: str, stat_result: os.stat_result | None=None) -> None:
+        '''
+        Records `path` as processed with `suffix_state`
+        '''
+        __path = Path(path)
+        if stat_result is None:
+            stat_result = os.stat(__path)
+
+        with FileIndex.__lock:
+            FileIndex.__connection.execute(
+                "INSERT OR REPLACE INTO files (dir, filename, size, mtime_ns, suffix_state) VALUES (?, ?, ?, ?, ?)",
+                (FileIndex.__get_dir_key(__path.parent), __path.name, stat_result.st_size, stat_result.st_mtime_ns, suffix_state)
+            )
+            FileIndex.__count_write()
+
+    def record_rename(src: Path, dst: Path, suffix_state: str) -> None:
+        __src = Path(src)
+        with FileIndex.__lock:
+            FileIndex.__connection.execute("DELETE FROM files WHERE dir = ? AND filename = ?", (FileIndex.__get_dir_key(__src.parent), __src.name))
+            # the rename changes the directory's mtime, which `commit_directories()` must not mistake for an outside change
+            __tracked = FileIndex.__tracked_dirs.get(FileIndex.__get_dir_key(__src.parent))
+            if __tracked is not None:
+                __tracked[2] = True
+        FileIndex.record_file(dst, suffix_state)
+
+    def get_cached_hashes() -> dict[str, tuple[int, int, bytes | None, bytes | None]]:
+        '''
+        Returns {path: (size, mtime_ns, partial hash, full hash)} for every file with a cached content hash
+        '''
+        with FileIndex.__lock:
+            __rows = FileIndex.__connection.execute("SELECT path, size, mtime_ns, partial_hash, full_hash FROM hashes")
+            return {path: (size, mtime_ns, partial_hash, full_hash) for path, size, mtime_ns, partial_hash, full_hash in __rows}
+
+    def record_hashes(path: Path, size: int, mtime_ns: int, partial_hash: bytes | None, full_hash: bytes | None) -> None:
+        with FileIndex.__lock:
+            FileIndex.__connection.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, partial_hash, full_hash) VALUES (?, ?, ?, ?, ?)",
+                (str(path), size, mtime_ns, partial_hash, full_hash)
+            )
+            FileIndex.__count_write()
+
+    def get_cached_metadata() -> dict[str, tuple[int, int, str, int | None, int | None, float | None, str | None]]:
+        '''
+        Returns {path: (size, mtime_ns, status, width, height, duration, codec)} for every file with cached header metadata
+        '''
+        with FileIndex.__lock:
+            __rows = FileIndex.__connection.execute("SELECT path, size, mtime_ns, status, width, height, duration, codec FROM metadata")
+            return {row[0]: row[1:] for row in __rows}
+
+    def record_metadata(path: Path, size: int, mtime_ns: int, status: str, width: int | None, height: int | None, duration: float | None, codec: str | None) -> None:
+        with FileIndex.__lock:
+            FileIndex.__connection.execute(
+                "INSERT OR REPLACE INTO metadata (path, size, mtime_ns, status, width, height, duration, codec) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(path), size, mtime_ns, status, width, height, duration, codec)
+            )
+            FileIndex.__count_write()
+
+    def track_directory(path: str, mtime_ns: int | None=None) -> None:
+        '''
+        Marks a media type directory as scanned this run; its mtime is recorded by `commit_directories()` unless it is marked dirty
+
+        `mtime_ns` must be taken before the directory is listed (it is stat'ed now if not given, so call this before listing it) --
+        a file added while the run lists or processes the directory then changes its mtime, and the directory is not recorded as up to date
+        '''
+        if mtime_ns is None:
+            mtime_ns = os.stat(path).st_mtime_ns
+        with FileIndex.__lock:
+            FileIndex.__tracked_dirs.setdefault(FileIndex.__get_dir_key(path), [mtime_ns, True, False])
+
+    def mark_directory_dirty(path: str) -> None:
+        '''
+        Prevents a scanned directory from being skipped next run (e.g. a rename in it failed or collided)
+        '''
+        with FileIndex.__lock:
+            FileIndex.__tracked_dirs.setdefault(FileIndex.__get_dir_key(path), [None, False, False])[1] = False
+
+    def commit_directories(suffix_state: str, file_types: frozenset[str] | None=None) -> int:
+        '''
+        Records the current mtime of every tracked directory that was fully processed, and returns how many were recorded
+
+        A directory is only recorded if its mtime is the one taken before it was listed, or if the change is explained by the tool's own renames --
+        i.e. it was renamed in, and every file in it with one of `file_types` (normalized, all files if None) is indexed as processed with `suffix_state`
+        Otherwise something else changed it during the run, so it is left to be checked again next run
+        '''
+        __recorded = 0
+        with FileIndex.__lock:
+            for path, (tracked_mtime_ns, complete, renamed) in FileIndex.__tracked_dirs.items():
+                if not complete:
+                    FileIndex.__connection.execute("DELETE FROM directories WHERE path = ?", (path,))
+                    continue
+                try:
+                    __mtime_ns = os.stat(path).st_mtime_ns
+                    __current = __mtime_ns == tracked_mtime_ns or (renamed and FileIndex.__is_directory_current(path, suffix_state, file_types))
+                except OSError:
+                    continue
+                if not __current:
+                    Logger.log_message("info", f"'{path}' changed during the run -- it is checked again next run", print_to_console=False)
+                    FileIndex.__connection.execute("DELETE FROM directories WHERE path = ?", (path,))
+                    continue
+                FileIndex.__connection.execute("INSERT OR REPLACE INTO directories (path, mtime_ns, suffix_state) VALUES (?, ?, ?)", (path, __mtime_ns, suffix_state))
+                __recorded += 1
+
+            FileIndex.__tracked_dirs = {}
+            FileIndex.__connection.commit()
+            FileIndex.__pending_writes = 0
+
+        return __recorded
+
+    def __is_directory_current(path: str, suffix_state: str, file_types: frozenset[str] | None) -> bool:
+        # relists a directory the tool renamed in -- caller must hold the index lock
+        __indexed = FileIndex.__get_file_states(path)
+        with os.scandir(path) as __entries:
+            for entry in __entries:
+                if not entry.is_file():
+                    continue
+                __stem, __dot, __extension = entry.name.rpartition(".")
+                if file_types is not None and not (__dot and __extension.lower() in file_types):
+                    continue
+                if not FileIndex.is_file_current(entry, __indexed.get(entry.name), suffix_state):
+                    return False
+        return True
+
+    def __get_file_states(dir_key: str) -> dict[str, tuple[int, int, str]]:
+        # caller must hold the index lock
+        __rows = FileIndex.__connection.execute("SELECT filename, size, mtime_ns, suffix_state FROM files WHERE dir = ?", (dir_key,))
+        return {filename: (size, mtime_ns, suffix_state) for filename, size, mtime_ns, suffix_state in __rows}
+
+    def __get_dir_key(path: Path | str) -> str:
+        # one spelling per dir for the files table and tracked dirs, however the caller built the path
+        return str(Path(path))
+
+    def __count_write() -> None:
+        # commit in batches instead of once per file -- caller must hold the index lock
+        FileIndex.__pending_writes += 1
+        if FileIndex.__pending_writes >= constants.FILE_INDEX_COMMIT_BATCH:
+            FileIndex.__connection.commit()
+            FileIndex.__pending_writes = 0
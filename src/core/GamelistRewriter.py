@@ -0,0 +1,189 @@
+import os
+from pathlib import Path
+import re
+import shutil
+from typing import Iterable
+from xml.etree import ElementTree
+from xml.sax.saxutils import quoteattr
+
+from common import constants
+from common.Singleton import Singleton
+from config_loaders.ToolConfig import ToolConfig
+from core.RenameJournal import RenameJournal
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+from utils.TestTime import TestTime
+
+class GamelistRewriter(metaclass=Singleton):
+    '''
+    Keeps frontend gamelist.xml files in sync with renamed media
+
+    Gamelists are looked up in each console dir, and in `<gamelists_dir>/<console>` if "gamelists_dir" is configured
+    Only gamelists of consoles with renamed media are read, and each is streamed with `iterparse` one top-level entry at a time, so tens of MB of XML never sit in memory
+
+    Paths in a gamelist may be relative to the console dir (e.g. "./downloaded_media/covers/Game.png"), "~/" or absolute -- only the filename of a matching path is replaced, so its style is kept
+    A gamelist is written to a temp file and swapped in atomically, and only if at least one path changed
+    '''
+    REWRITTEN = "rewritten"
+    UNCHANGED = "unchanged"
+    FAILED = "failed"
+
+    def update_from_last_run() -> dict[Path, tuple[str, int]]:
+        '''
+        Rewrites gamelists for the renames recorded as done in the rename journal's last run, if "update_gamelists" is enabled
+        '''
+        if not ToolConfig.is_gamelist_update_enabled():
+            return {}
+
+        __run = RenameJournal.read_last_run()
+        if __run is None or not __run.done:
+            return {}
+
+        with TestTime.span("gamelists"):
+            __results = GamelistRewriter.rewrite_gamelists(__run.done)
+        GamelistRewriter.log_summary(__results)
+        return __results
+
+    def rewrite_gamelists(renames: Iterable[tuple[Path, Path]], gamelists_dir: Path | str | None=None) -> dict[Path, tuple[str, int]]:
+        '''
+        Rewrites every gamelist that references a renamed file ((old path, new path) pairs laid out as `<console>/<media_dir>/<media_type>/<file>`)
+
+        Returns {gamelist path: (outcome, number of updated paths)}
+        '''
+        if gamelists_dir is None:
+            gamelists_dir = ToolConfig.get_gamelists_dir()
+
+        # group renames by console dir, keyed by normalized old path
+        __renames_by_console = {}
+        for src, dst in renames:
+            __console_dir = Path(src).parents[2]
+            __renames_by_console.setdefault(__console_dir, {})[GamelistRewriter.__normalize(src)] = Path(dst).name
+
+        __results = {}
+        for console_dir, rename_map in __renames_by_console.items():
+            for gamelist_path in GamelistRewriter.get_gamelist_paths(console_dir, gamelists_dir):
+                __results[gamelist_path] = GamelistRewriter.rewrite_gamelist(gamelist_path, console_dir, rename_map)
+        return __results
+
+    def get_gamelist_paths(console_dir: Path, gamelists_dir: Path | str | None=None) -> list[Path]:
+        __candidates = [Path(console_dir) / constants.GAMELIST_FILE]
+        if gamelists_dir:
+            __candidates.append(Path(gamelists_dir) / Path(console_dir).name / constants.GAMELIST_FILE)
+        return [path for path in __candidates if path.is_file()]
+
+    def rewrite_gamelist(gamelist_path: Path, console_dir: Path, rename_map: dict[str, str]) -> tuple[str, int]:
+        '''
+        Streams `gamelist_path` into a temp file, replacing paths found in `rename_map` ({normalized old path: new filename}), and swaps it in if anything changed
+
+        Returns (outcome, number of updated paths)
+        '''
+        __tmp_path = Path(gamelist_path).with_name(Path(gamelist_path).name + ".tmp")
+        try:
+            __old_names = {os.path.basename(path) for path in rename_map}
+            __updated = GamelistRewriter.__write_rewritten(gamelist_path, __tmp_path, str(console_dir), rename_map, __old_names)
+            if not __updated:
+                os.remove(__tmp_path)
+                return GamelistRewriter.UNCHANGED, 0
+
+            shutil.copymode(gamelist_path, __tmp_path)
+            os.replace(__tmp_path, gamelist_path)
+            return GamelistRewriter.REWRITTEN, __updated
+
+        except Exception as e:
+            Logger.log_message("error", f"Unable to update gamelist '{gamelist_path}': {e}")
+            if os.path.exists(__tmp_path):
+                os.remove(__tmp_path)
+            return GamelistRewriter.FAILED, 0
+
+    def log_summary(results: dict[Path, tuple[str, int]]) -> None:
+        if not results:
+            return
+
+        __longest_label = max(len(str(path)) for path in results)
+        Logger.log_message("info", Formatter.generate_header("Gamelist summary"))
+        for path, (outcome, updated) in sorted(results.items()):
+            __label = Formatter.pad_field_label(str(path), __longest_label, symbol=":")
+            Logger.log_message("error" if outcome == GamelistRewriter.FAILED else "result", f"{__label} {outcome}, {updated} path(s) updated")
+
+    def __write_rewritten(gamelist_path: Path, tmp_path: Path, console_dir: str, rename_map: dict[str, str], old_names: set[str]) -> int:
+        __updated = 0
+        __depth = 0
+        __root = None
+        __wrote_root_text = False
+
+        # iterparse drops the XML declaration, so copy the original one through
+        with open(gamelist_path, "rb") as __source:
+            __head = __source.read(256)
+        __declaration = __head[:__head.find(b"?>") + 2].decode("ascii", errors="replace") if __head.startswith(b"<?xml") and b"?>" in __head else ""
+        __encoding = re.search(r"""encoding=["']([\w.:-]+)["']""", __declaration)
+
+        # write in the declared encoding, so the copied declaration stays true
+        with open(tmp_path, "w", encoding=__encoding.group(1) if __encoding else "utf-8", errors="xmlcharrefreplace", newline="") as __out:
+            if __declaration:
+                __out.write(__declaration + "\n")
+
+            # keep comments in the tree so they are written back out with the entries around them
+            __parser = ElementTree.XMLParser(target=ElementTree.TreeBuilder(insert_comments=True, insert_pis=True))
+            for event, elem in ElementTree.iterparse(gamelist_path, events=("start", "end"), parser=__parser):
+                if event == "start":
+                    __depth += 1
+                    if __depth == 1:
+                        __root = elem
+                        __attrs = "".join(f" {name}={quoteattr(value)}" for name, value in elem.attrib.items())
+                        __out.write(f"<{elem.tag}{__attrs}>")
+                    continue
+
+                __depth -= 1
+                if __depth > 1:
+                    continue
+
+                # the root's leading whitespace is only known once its first child has been parsed
+                if not __wrote_root_text:
+                    __out.write(__root.text or "")
+                    __wrote_root_text = True
+
+                # entries before the one that just ended are complete, tail whitespace included -- rewrite, write and drop them so memory use does not grow with the gamelist
+                # iterparse reports events in batches, so the tail of the entry that just ended and any later entries may still be only partly parsed
+                __complete = 0
+                for entry in __root:
+                    if entry is elem:
+                        break
+                    __complete += 1
+                    for child in entry.iter():
+                        if child is not entry and isinstance(child.tag, str):
+                            __new_text = GamelistRewriter.__rewrite_path(child.text, console_dir, rename_map, old_names)
+                            if __new_text is not None:
+                                child.text = __new_text
+                                __updated += 1
+                    __out.write(ElementTree.tostring(entry, encoding="unicode"))
+                del __root[:__complete]
+
+                if __depth == 0:
+                    __out.write(f"</{elem.tag}>\n")
+
+            # unchanged gamelists are discarded, so only pay for fsync when the temp file will be swapped in
+            if __updated:
+                __out.flush()
+                os.fsync(__out.fileno())
+
+        return __updated
+
+    def __rewrite_path(text: str | None, console_dir: str, rename_map: dict[str, str], old_names: set[str]) -> str | None:
+        # returns the updated path text, or None if `text` is not a renamed file
+        if not text:
+            return None
+
+        # cheap filename check first, so names, descriptions etc. are never resolved as paths
+        __stripped = text.strip()
+        if os.path.normcase(os.path.basename(__stripped)) not in old_names:
+            return None
+
+        __new_name = rename_map.get(GamelistRewriter.__normalize(os.path.join(console_dir, os.path.expanduser(__stripped))))
+        if __new_name is None:
+            return None
+
+        __old_name = os.path.basename(__stripped)
+        return text.replace(__stripped, __stripped[:len(__stripped) - len(__old_name)] + __new_name)
+
+    def __normalize(path: Path | str) -> str:
+        return os.path.normcase(os.path.normpath(path))
@@ -0,0 +1,221 @@
+from concurrent.futures import ThreadPoolExecutor
+import errno
+import hashlib
+import mmap
+import os
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from common import constants
+from common.Singleton import Singleton
+from core.FileIndex import FileIndex
+from core.MediaExporter import MediaExporter
+from core.MediaInventory import MediaInventory
+from core.MediaWalker import MediaWalker
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+from utils.RunStats import RunStats
+
+class MediaDeduplicator(metaclass=Singleton):
+    '''
+    Finds byte-identical media across consoles and media types, and hardlinks exported duplicates to a single copy in the output directory
+
+    Candidates are narrowed in three stages so most files are never fully read:
+    files are grouped by size, then by a hash of their first block, and only then by a full blake2b hash read through mmap
+
+    Hashes are cached in the open `FileIndex` by path, size and mtime, so unchanged files are never rehashed
+    '''
+    LINKED = "linked"
+    UP_TO_DATE = "up to date"
+    COPIED = "copied"               # hardlinks not supported here -- exported as a normal file instead
+    FAILED = "failed"
+
+    __DIGEST_SIZE = 32
+
+    def find_duplicates(media_dirs: Iterable[Path], file_types: Iterable[str] | None=None, max_workers: int=constants.HASH_MAX_WORKERS, inventory: MediaInventory | None=None) -> list[list[Path]]:
+        '''
+        Returns groups of byte-identical files in `media_dirs`, each sorted by path
+
+        If an `inventory` built with stats is given, its size and mtime columns are used instead of scanning `media_dirs`
+        '''
+        __by_size = {}
+        if inventory is not None:
+            # only files that share their size with another file are ever turned into paths
+            __indices_by_size = {}
+            for index, size in enumerate(inventory.get_sizes()):
+                if size:
+                    __indices_by_size.setdefault(size, []).append(index)
+            __mtimes = inventory.get_mtimes_ns()
+            for size, indices in __indices_by_size.items():
+                if len(indices) > 1:
+                    __by_size[size] = [(inventory.get_path(index), size, __mtimes[index]) for index in indices]
+
+        else:
+            for console_media in MediaWalker.walk_media_dirs(media_dirs, file_types=file_types):
+                if console_media.error is not None:
+                    Logger.log_message("error", f"Unable to scan '{console_media.media_path}': {console_media.error}")
+                    continue
+                for entries in console_media.media_files.values():
+                    for entry in entries:
+                        __stat = entry.stat()
+                        # empty files are trivially identical and not worth linking
+                        if __stat.st_size:
+                            __by_size.setdefault(__stat.st_size, []).append((Path(entry.path), __stat.st_size, __stat.st_mtime_ns))
+
+        __candidates = [files for files in __by_size.values() if len(files) > 1]
+        __cached = FileIndex.get_cached_hashes() if FileIndex.is_open() else {}
+        __hashes = {}               # path -> [partial hash, full hash]
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="MediaDeduplicator") as __executor:
+            # stage 2 -- hash the first block of every file that shares its size with another file
+            __files = [file for files in __candidates for file in files]
+            for file, partial_hash in zip(__files, __executor.map(lambda file: MediaDeduplicator.__get_hash(file, __cached, full=False), __files)):
+                __hashes[file[0]] = [partial_hash, None]
+
+            __partial_groups = MediaDeduplicator.__group_by(__candidates, lambda file: __hashes[file[0]][0])
+
+            # stage 3 -- full hash, only needed when the file is bigger than the block already hashed
+            __files = [file for files in __partial_groups for file in files if file[1] > constants.HASH_PARTIAL_BLOCK_SIZE]
+            for file, full_hash in zip(__files, __executor.map(lambda file: MediaDeduplicator.__get_hash(file, __cached, full=True), __files)):
+                __hashes[file[0]][1] = full_hash
+
+        # the partial hash already covers the whole content of files no bigger than one block
+        __full_groups = MediaDeduplicator.__group_by(__partial_groups, lambda file: __hashes[file[0]][1] if file[1] > constants.HASH_PARTIAL_BLOCK_SIZE else __hashes[file[0]][0])
+
+        if FileIndex.is_open():
+            for path, size, mtime_ns in (file for files in __candidates for file in files):
+                __partial_hash, __full_hash = __hashes[path]
+                __cached_hashes = __cached.get(str(path))
+                # keep a cached full hash for files that did not need one this run
+                if __full_hash is None and __cached_hashes is not None and __cached_hashes[:2] == (size, mtime_ns):
+                    __full_hash = __cached_hashes[3]
+                if __partial_hash is not None and __cached_hashes != (size, mtime_ns, __partial_hash, __full_hash):
+                    FileIndex.record_hashes(path, size, mtime_ns, __partial_hash, __full_hash)
+
+        return sorted(sorted(path for path, _, _ in files) for files in __full_groups)
+
+    def map_groups(groups: Iterable[list[Path]]) -> dict[Path, int]:
+        '''
+        Returns {path: index of its duplicate group} for every file in `groups`
+        '''
+        return {path: group_index for group_index, group in enumerate(groups) for path in group}
+
+    def split_duplicate_pairs(pairs: Iterable[tuple[Path, Path]], group_ids: dict[Path, int], duplicate_pairs: list[tuple[Path, Path]], canonical_dsts: dict[int, Path]) -> Iterator[tuple[Path, Path]]:
+        '''
+        Yields export pairs, except for files whose group already has an exported copy -- those are collected into `duplicate_pairs` to be linked after the export
+
+        The first exported file of each group is recorded in `canonical_dsts` ({group index: dst}), so files that are not exported (e.g. collisions or media types without a suffix) never become the link target
+        '''
+        for src, dst in pairs:
+            __group_id = group_ids.get(src)
+            if __group_id is None:
+                yield src, dst
+            elif __group_id in canonical_dsts:
+                duplicate_pairs.append((src, dst))
+            else:
+                canonical_dsts[__group_id] = dst
+                yield src, dst
+
+    def link_duplicates(duplicate_pairs: Iterable[tuple[Path, Path]], group_ids: dict[Path, int], canonical_dsts: dict[int, Path]) -> dict[str, list[int]]:
+        '''
+        Hardlinks each duplicate to the exported copy of its group, and returns {outcome: [file count, bytes]}
+        '''
+        __summary = {}
+        for src, dst in duplicate_pairs:
+            __canonical_dst = canonical_dsts.get(group_ids[src])
+            __outcome, __bytes = MediaDeduplicator.__link_duplicate(src, dst, __canonical_dst)
+            __totals = __summary.setdefault(__outcome, [0, 0])
+            __totals[0] += 1
+            __totals[1] += __bytes
+
+            match __outcome:
+                case MediaDeduplicator.LINKED:
+                    RunStats.record_path(src, RunStats.LINKED)
+                case MediaDeduplicator.UP_TO_DATE:
+                    RunStats.record_path(src, RunStats.SKIPPED)
+                case MediaDeduplicator.FAILED:
+                    RunStats.record_path(src, RunStats.FAILED)
+                case _:
+                    RunStats.record_path(src, RunStats.EXPORTED, __bytes)
+
+        return __summary
+
+    def log_groups(groups: list[list[Path]]) -> None:
+        __duplicates = sum(len(group) - 1 for group in groups)
+        __reclaimable = sum((len(group) - 1) * os.path.getsize(group[0]) for group in groups)
+        Logger.log_message("result", f"{__duplicates} duplicate file(s) in {len(groups)} group(s) -- {__reclaimable / 1_048_576:.1f} MiB can be shared")
+
+    def log_summary(summary: dict[str, list[int]]) -> None:
+        __longest_label = max((len(outcome) for outcome in summary), default=0)
+        Logger.log_message("info", Formatter.generate_header("Deduplication summary"))
+        for outcome, (count, total_bytes) in sorted(summary.items()):
+            __label = Formatter.pad_field_label(outcome, __longest_label, symbol=":")
+            __detail = f"{total_bytes / 1_048_576:.1f} MiB saved" if outcome == MediaDeduplicator.LINKED else f"{total_bytes / 1_048_576:.1f} MiB"
+            Logger.log_message("result" if outcome != MediaDeduplicator.FAILED else "error", f"{__label} {count} file(s), {__detail}")
+
+    def __link_duplicate(src: Path, dst: Path, canonical_dst: Path | None) -> tuple[str, int]:
+        # exported copy of the group is missing (e.g. its export failed) -- export the duplicate on its own
+        if canonical_dst is None or not os.path.exists(canonical_dst):
+            return MediaDeduplicator.__export_alone(src, dst)
+
+        __tmp = Path(dst).with_name(Path(dst).name + ".part")
+        try:
+            if os.path.exists(dst) and os.path.samefile(dst, canonical_dst):
+                return MediaDeduplicator.UP_TO_DATE, 0
+
+            Path(dst).parent.mkdir(parents=True, exist_ok=True)
+            if os.path.exists(__tmp):
+                os.remove(__tmp)
+            os.link(canonical_dst, __tmp)
+            os.replace(__tmp, dst)
+            return MediaDeduplicator.LINKED, os.path.getsize(dst)
+
+        except OSError as oe:
+            if oe.errno in (errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EMLINK):
+                return MediaDeduplicator.__export_alone(src, dst)
+
+            Logger.log_message("error", f"Unable to link '{dst}' to '{canonical_dst}': {oe}")
+            return MediaDeduplicator.FAILED, 0
+
+    def __export_alone(src: Path, dst: Path) -> tuple[str, int]:
+        __method, __bytes = MediaExporter.export_file(src, dst)
+        match __method:
+            case MediaExporter.FAILED:
+                return MediaDeduplicator.FAILED, 0
+            case MediaExporter.UP_TO_DATE:
+                return MediaDeduplicator.UP_TO_DATE, 0
+            case _:
+                return MediaDeduplicator.COPIED, __bytes
+
+    def __group_by(groups: Iterable[list], key) -> list[list]:
+        # splits each group by `key`, keeping only sub-groups with more than one file -- files that could not be hashed are dropped
+        __result = []
+        for files in groups:
+            __by_key = {}
+            for file in files:
+                __key = key(file)
+                if __key is not None:
+                    __by_key.setdefault(__key, []).append(file)
+            __result.extend(group for group in __by_key.values() if len(group) > 1)
+        return __result
+
+    def __get_hash(file: tuple[Path, int, int], cached: dict, full: bool) -> bytes | None:
+        __path, __size, __mtime_ns = file
+        __cached = cached.get(str(__path))
+        if __cached is not None and __cached[:2] == (__size, __mtime_ns):
+            __hash = __cached[3] if full else __cached[2]
+            if __hash is not None:
+                return __hash
+
+        try:
+            with open(__path, "rb") as __file:
+                if not full:
+                    return hashlib.blake2b(__file.read(constants.HASH_PARTIAL_BLOCK_SIZE), digest_size=MediaDeduplicator.__DIGEST_SIZE).digest()
+
+                # hashing the mapped file avoids copying it through read buffers, and hashlib releases the GIL for large inputs
+                with mmap.mmap(__file.fileno(), 0, access=mmap.ACCESS_READ) as __mapped:
+                    return hashlib.blake2b(__mapped, digest_size=MediaDeduplicator.__DIGEST_SIZE).digest()
+
+        except Exception as e:
+            Logger.log_message("error", f"Unable to hash '{__path}': {e}")
+            return None
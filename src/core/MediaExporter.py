@@ -0,0 +1,231 @@
+import errno
+import os
+from pathlib import Path
+import shutil
+import threading
+from typing import Callable, Iterable
+
+from common import constants
+from common.Singleton import Singleton
+from core.AdaptiveExecutor import AdaptiveExecutor
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+from utils.RunStats import RunStats
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class MediaExporter(metaclass=Singleton):
+    '''
+    Exports media into the output directory without a full byte copy wherever the filesystem allows it
+
+    Methods are tried in order: hardlink, reflink, copy_file_range, sendfile, then a chunked copy as the last fallback
+    The first method the filesystems of a (source device, destination device) pair support is remembered and tried first for later files --
+    a method is only ruled out for the pair by a filesystem level error (e.g. EXDEV), while a per-file error (e.g. EMLINK, EPERM) only falls back for that file
+    '''
+    HARDLINK = "hardlink"
+    REFLINK = "reflink"
+    COPY_FILE_RANGE = "copy_file_range"
+    SENDFILE = "sendfile"
+    CHUNKED_COPY = "chunked copy"
+    UP_TO_DATE = "up to date"
+    FAILED = "failed"
+
+    METHODS = (HARDLINK, REFLINK, COPY_FILE_RANGE, SENDFILE, CHUNKED_COPY)
+
+    # a method failing with one of these can never work between the two filesystems
+    FILESYSTEM_ERRNOS = frozenset((errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOSYS, errno.ENOTTY))
+    # a method failing with one of these only fails for this file (e.g. its hardlink count is at the limit, or it is not owned by the user)
+    FILE_ERRNOS = frozenset((errno.EPERM, errno.EINVAL, errno.EMLINK, errno.EBADF))
+    # ...except EINVAL from a kernel copy primitive, which means the filesystem pair cannot do it at all (e.g. FICLONE on ext4, or across mounts)
+    COPY_PRIMITIVES = frozenset((REFLINK, COPY_FILE_RANGE, SENDFILE))
+
+    # linux ioctl request code to clone a file's extents (btrfs, XFS, bcachefs, ...)
+    __FICLONE = 0x40049409
+
+    __lock = threading.Lock()
+    __methods_by_filesystem = {}        # (src st_dev, dst st_dev) -> index into METHODS of first method not ruled out by a filesystem level error
+
+    def export_files(pairs: Iterable[tuple[Path, Path]], max_workers: int=constants.EXPORT_MAX_WORKERS, adaptive_max_workers: int | None=None, force: bool=False) -> dict[str, list[int]]:
+        '''
+        Exports (src, dst) pairs on a bounded thread pool and returns {method: [file count, bytes]} for the run summary
+
+        With `adaptive_max_workers`, the number of concurrent exports adapts between 1 and that limit to the export time per MiB (see `AdaptiveExecutor`)
+        With `force`, existing copies are replaced even if their size and mtime match the source (e.g. their content was found to differ)
+        '''
+        __summary = {}
+
+        def __export_task(src: Path, dst: Path) -> tuple[str, int]:
+            __method, __bytes = MediaExporter.export_file(src, dst, __executor.retry, force)
+            with MediaExporter.__lock:
+                __totals = __summary.setdefault(__method, [0, 0])
+                __totals[0] += 1
+                __totals[1] += __bytes
+
+            match __method:
+                case MediaExporter.UP_TO_DATE:
+                    RunStats.record_path(src, RunStats.SKIPPED)
+                case MediaExporter.FAILED:
+                    RunStats.record_path(src, RunStats.FAILED)
+                case _:
+                    RunStats.record_path(src, RunStats.EXPORTED, __bytes)
+            return __method, __bytes
+
+        # copies are paced per MiB, so large videos do not read as congestion
+        with AdaptiveExecutor(max_workers, "MediaExporter", adaptive_max_workers, get_units=lambda result: result[1] // 1_048_576) as __executor:
+            for src, dst in pairs:
+                __executor.submit(__export_task, src, dst)
+        __executor.log_summary()
+
+        return __summary
+
+    def export_file(src: Path, dst: Path, retry: Callable | None=None, force: bool=False) -> tuple[str, int]:
+        '''
+        Exports a single file to `dst`, creating parent directories as needed, and returns (method used, bytes exported)
+
+        If given, `retry` wraps the whole export (e.g. `AdaptiveExecutor.retry`) -- a retried export starts over, which is safe as copies are written to a temp file first
+        '''
+        try:
+            if retry is not None:
+                return retry(MediaExporter.__export, src, dst, force)
+            return MediaExporter.__export(src, dst, force)
+
+        except Exception as e:
+            Logger.log_message("error", f"Unable to export '{src}' to '{dst}': {e}")
+            return MediaExporter.FAILED, 0
+
+    def get_methods_by_filesystem() -> dict[tuple[int, int], str]:
+        return {fs_key: MediaExporter.METHODS[method_index] for fs_key, method_index in MediaExporter.__methods_by_filesystem.items()}
+
+    def log_summary(summary: dict[str, list[int]]) -> None:
+        __longest_label = max((len(method) for method in summary), default=0)
+        Logger.log_message("info", Formatter.generate_header("Export summary"))
+        for method, (count, total_bytes) in sorted(summary.items()):
+            __label = Formatter.pad_field_label(method, __longest_label, symbol=":")
+            Logger.log_message("result" if method != MediaExporter.FAILED else "error", f"{__label} {count} file(s), {total_bytes / 1_048_576:.1f} MiB")
+
+        for (src_dev, dst_dev), method in MediaExporter.get_methods_by_filesystem().items():
+            Logger.log_message("info", f"Export method for device {src_dev} -> device {dst_dev}: {method}")
+
+    def __export(src: Path, dst: Path, force: bool=False) -> tuple[str, int]:
+        __src_stat = os.stat(src)
+        __dst = Path(dst)
+        __dst.parent.mkdir(parents=True, exist_ok=True)
+
+        if not force and MediaExporter.__is_up_to_date(__src_stat, __dst):
+            return MediaExporter.UP_TO_DATE, 0
+
+        __fs_key = (__src_stat.st_dev, os.stat(__dst.parent).st_dev)
+        __first_method = MediaExporter.__methods_by_filesystem.get(__fs_key, 0)
+
+        # advances past methods the filesystem pair does not support, but not past ones that only failed for this file
+        __supported_method = __first_method
+        for method_index in range(__first_method, len(MediaExporter.METHODS)):
+            __method = MediaExporter.METHODS[method_index]
+            __worked, __unsupported = MediaExporter.__try_method(__method, Path(src), __dst, __src_stat)
+            if __unsupported and __supported_method == method_index:
+                __supported_method = method_index + 1
+            if __worked:
+                if __supported_method != __first_method or __fs_key not in MediaExporter.__methods_by_filesystem:
+                    with MediaExporter.__lock:
+                        MediaExporter.__methods_by_filesystem[__fs_key] = __supported_method
+                return __method, __src_stat.st_size
+
+        return MediaExporter.FAILED, 0
+
+    def __is_up_to_date(src_stat: os.stat_result, dst: Path) -> bool:
+        try:
+            __dst_stat = os.stat(dst)
+        except FileNotFoundError:
+            return False
+
+        # already hardlinked, or a previous copy with preserved size and mtime
+        if (__dst_stat.st_dev, __dst_stat.st_ino) == (src_stat.st_dev, src_stat.st_ino):
+            return True
+        return __dst_stat.st_size == src_stat.st_size and __dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+
+    def __try_method(method: str, src: Path, dst: Path, src_stat: os.stat_result) -> tuple[bool, bool]:
+        # (worked, unsupported by the filesystem pair) -- a method that did not work falls through to the next one
+        try:
+            if method == MediaExporter.HARDLINK:
+                __tmp = dst.with_name(dst.name + ".part")
+                MediaExporter.__remove_if_exists(__tmp)
+                os.link(src, __tmp)
+                os.replace(__tmp, dst)
+                return True, False
+
+            return MediaExporter.__copy_to(method, src, dst, src_stat), False
+
+        except OSError as oe:
+            if oe.errno in MediaExporter.FILESYSTEM_ERRNOS or (oe.errno == errno.EINVAL and method in MediaExporter.COPY_PRIMITIVES):
+                return False, True
+            if oe.errno in MediaExporter.FILE_ERRNOS:
+                return False, False
+            raise
+
+    def __copy_to(method: str, src: Path, dst: Path, src_stat: os.stat_result) -> bool:
+        # copy into a temporary file and move it into place, so an interrupted export never leaves a truncated file at `dst`
+        __tmp = dst.with_name(dst.name + ".part")
+        try:
+            with open(src, "rb") as __src_file, open(__tmp, "wb") as __dst_file:
+                __copied = MediaExporter.__copy_data(method, __src_file, __dst_file, src_stat.st_size)
+
+            if not __copied:
+                MediaExporter.__remove_if_exists(__tmp)
+                return False
+
+            # preserve timestamps so reruns can detect up to date copies
+            os.utime(__tmp, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+            os.replace(__tmp, dst)
+            return True
+
+        except Exception:
+            MediaExporter.__remove_if_exists(__tmp)
+            raise
+
+    def __copy_data(method: str, src_file, dst_file, size: int) -> bool:
+        __src_fd = src_file.fileno()
+        __dst_fd = dst_file.fileno()
+
+        match method:
+            case MediaExporter.REFLINK:
+                if fcntl is None:
+                    raise OSError(errno.ENOSYS, "reflink is not available on this platform")
+                fcntl.ioctl(__dst_fd, MediaExporter.__FICLONE, __src_fd)
+                return True
+
+            case MediaExporter.COPY_FILE_RANGE:
+                if not hasattr(os, "copy_file_range"):
+                    raise OSError(errno.ENOSYS, "copy_file_range is not available on this platform")
+                __offset = 0
+                while __offset < size:
+                    __sent = os.copy_file_range(__src_fd, __dst_fd, size - __offset)
+                    if __sent == 0:
+                        break
+                    __offset += __sent
+                return __offset == size
+
+            case MediaExporter.SENDFILE:
+                if not hasattr(os, "sendfile"):
+                    raise OSError(errno.ENOSYS, "sendfile is not available on this platform")
+                __offset = 0
+                while __offset < size:
+                    __sent = os.sendfile(__dst_fd, __src_fd, __offset, size - __offset)
+                    if __sent == 0:
+                        break
+                    __offset += __sent
+                return __offset == size
+
+            case MediaExporter.CHUNKED_COPY:
+                shutil.copyfileobj(src_file, dst_file, constants.EXPORT_CHUNK_SIZE)
+                return True
+
+        return False
+
+    def __remove_if_exists(path: Path) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
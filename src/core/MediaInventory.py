@@ -0,0 +1,193 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import sys
+from typing import Iterable, Iterator, NamedTuple
+
+from common import constants
+from core.MediaWalker import MediaWalker
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+
+class InventoryDirectory(NamedTuple):
+    console: str
+    media_dir: str
+    media_type: str
+    start: int                  # first entry index of the media type dir
+    end: int                    # one past its last entry index
+
+class MediaInventory:
+    '''
+    Compact column store of every target media file, for libraries with millions of files
+
+    Instead of a `Path` (and stat result) per file, each entry costs a few array slots and its UTF-8 stem:
+    media dirs, media types and extensions are interned into small integer ids, stems are packed into one byte table addressed by offsets, and sizes and mtimes live in `array` columns
+
+    Entries of one media type dir are always stored contiguously, so a directory's names can be handed to `SuffixMatcher` in one batch
+    '''
+    __slots__ = (
+        "__media_dirs", "__media_dir_ids",
+        "__media_types", "__media_type_ids",
+        "__extensions", "__extension_ids",
+        "__dir_ids", "__type_ids", "__ext_ids",
+        "__stems", "__stem_offsets",
+        "__sizes", "__mtimes",
+        "__directories",
+    )
+
+    def __init__(self):
+        self.__media_dirs = []              # media dir id -> media dir path
+        self.__media_dir_ids = {}
+        self.__media_types = []             # media type id -> name
+        self.__media_type_ids = {}
+        self.__extensions = []              # extension id -> extension without ".", None for names without one
+        self.__extension_ids = {}
+
+        self.__dir_ids = array("I")
+        self.__type_ids = array("H")
+        self.__ext_ids = array("H")
+        self.__stems = bytearray()          # every stem, UTF-8 encoded back to back
+        self.__stem_offsets = array("Q", [0])
+        self.__sizes = array("Q")
+        self.__mtimes = array("q")
+
+        self.__directories = []             # (media dir id, media type id, start) of each contiguous media type dir
+
+    @classmethod
+    def scan(cls, media_dirs: Iterable[Path], file_types: Iterable[str] | None=None, include_stats: bool=True, max_workers: int=constants.SCAN_MAX_WORKERS) -> "MediaInventory":
+        '''
+        Builds an inventory of every target media file in `media_dirs`, scanned concurrently
+
+        With `include_stats`, each file's size and mtime are recorded (one stat per file); otherwise both columns are left at 0
+        '''
+        __inventory = cls()
+        # DirEntry.stat() releases the GIL, so files are stat'ed on a pool
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="MediaInventory") as __executor:
+            for console_media in MediaWalker.walk_media_dirs(media_dirs, file_types=file_types, max_workers=max_workers):
+                if console_media.error is not None:
+                    Logger.log_message("error", f"Unable to scan '{console_media.media_path}': {console_media.error}")
+                    continue
+
+                for media_type, entries in console_media.media_files.items():
+                    if include_stats:
+                        __stats = list(__executor.map(lambda entry: entry.stat(), entries))
+                        __inventory.add_directory(console_media.media_path, media_type, [entry.name for entry in entries], [stat.st_size for stat in __stats], [stat.st_mtime_ns for stat in __stats])
+                    else:
+                        __inventory.add_directory(console_media.media_path, media_type, [entry.name for entry in entries])
+        return __inventory
+
+    def add_directory(self, media_dir: Path | str, media_type: str, names: Iterable[str], sizes: Iterable[int] | None=None, mtimes_ns: Iterable[int] | None=None) -> None:
+        '''
+        Appends every file of one media type dir -- a directory must be added in a single call so its entries stay contiguous
+        '''
+        __names = list(names)
+        __count = len(__names)
+        __sizes = array("Q", sizes) if sizes is not None else array("Q", [0]) * __count
+        __mtimes = array("q", mtimes_ns) if mtimes_ns is not None else array("q", [0]) * __count
+        if len(__sizes) != __count or len(__mtimes) != __count:
+            raise ValueError(f"'{media_dir}/{media_type}' has {__count} names but a different number of sizes or mtimes")
+
+        __dir_id = self.__intern(str(media_dir), self.__media_dirs, self.__media_dir_ids)
+        __type_id = self.__intern(media_type, self.__media_types, self.__media_type_ids)
+        __start = len(self.__dir_ids)
+
+        for name in __names:
+            __stem, __dot, __extension = name.rpartition(".")
+            if not __dot:
+                __stem, __extension = name, None
+            self.__ext_ids.append(self.__intern(__extension, self.__extensions, self.__extension_ids))
+            # surrogateescape round-trips names that are not valid UTF-8
+            self.__stems += __stem.encode("utf-8", "surrogateescape")
+            self.__stem_offsets.append(len(self.__stems))
+
+        self.__dir_ids.extend(array("I", [__dir_id]) * __count)
+        self.__type_ids.extend(array("H", [__type_id]) * __count)
+        self.__sizes.extend(__sizes)
+        self.__mtimes.extend(__mtimes)
+
+        if __count:
+            self.__directories.append((__dir_id, __type_id, __start))
+
+    def __len__(self) -> int:
+        return len(self.__dir_ids)
+
+    def get_name(self, index: int) -> str:
+        __stem = self.__stems[self.__stem_offsets[index]:self.__stem_offsets[index + 1]].decode("utf-8", "surrogateescape")
+        __extension = self.__extensions[self.__ext_ids[index]]
+        return __stem if __extension is None else f"{__stem}.{__extension}"
+
+    def get_names(self, start: int, end: int) -> list[str]:
+        return [self.get_name(index) for index in range(start, end)]
+
+    def get_path(self, index: int) -> Path:
+        return Path(self.get_media_dir(index)) / self.get_media_type(index) / self.get_name(index)
+
+    def get_media_dir(self, index: int) -> str:
+        return self.__media_dirs[self.__dir_ids[index]]
+
+    def get_console(self, index: int) -> str:
+        return os.path.basename(os.path.dirname(self.get_media_dir(index)))
+
+    def get_media_type(self, index: int) -> str:
+        return self.__media_types[self.__type_ids[index]]
+
+    def get_size(self, index: int) -> int:
+        return self.__sizes[index]
+
+    def get_mtime_ns(self, index: int) -> int:
+        return self.__mtimes[index]
+
+    def get_sizes(self) -> array:
+        # read-only by convention -- the column itself, not a copy
+        return self.__sizes
+
+    def get_mtimes_ns(self) -> array:
+        return self.__mtimes
+
+    def iter_directories(self) -> Iterator[InventoryDirectory]:
+        for position, (dir_id, type_id, start) in enumerate(self.__directories):
+            __end = self.__directories[position + 1][2] if position + 1 < len(self.__directories) else len(self)
+            __media_dir = self.__media_dirs[dir_id]
+            yield InventoryDirectory(os.path.basename(os.path.dirname(__media_dir)), __media_dir, self.__media_types[type_id], start, __end)
+
+    def summarize(self) -> dict[tuple[str, str], list[int]]:
+        '''
+        Returns {(console, media type): [files, bytes]}
+        '''
+        __summary = {}
+        for directory in self.iter_directories():
+            __counter = __summary.setdefault((directory.console, directory.media_type), [0, 0])
+            __counter[0] += directory.end - directory.start
+            __counter[1] += sum(self.__sizes[directory.start:directory.end])
+        return __summary
+
+    def log_summary(self, title: str="Media inventory") -> None:
+        __rows = sorted(self.summarize().items())
+        __labels = [f"{console}/{media_type}" for (console, media_type), _ in __rows] + ["TOTAL"]
+        __longest_label = max(len(label) for label in __labels)
+
+        Logger.log_message("info", Formatter.generate_header(title))
+        for label, (_, (files, total_bytes)) in zip(__labels, __rows):
+            Logger.log_message("info", f"{Formatter.pad_field_label(label, __longest_label)} {files:,} files | {total_bytes / 1_048_576:,.1f} MiB")
+        Logger.log_message("result", f"{Formatter.pad_field_label('TOTAL', __longest_label)} {len(self):,} files | {sum(self.__sizes) / 1_048_576:,.1f} MiB | {self.get_nbytes() / 1_048_576:,.1f} MiB in memory")
+
+    def get_nbytes(self) -> int:
+        '''
+        Approximate memory used by the inventory, including its interned name tables
+        '''
+        __columns = (self.__dir_ids, self.__type_ids, self.__ext_ids, self.__stem_offsets, self.__sizes, self.__mtimes)
+        __tables = (self.__media_dirs, self.__media_types, self.__extensions)
+        return (
+            sum(sys.getsizeof(column) for column in __columns)
+            + sys.getsizeof(self.__stems)
+            + sum(sys.getsizeof(table) + sum(sys.getsizeof(name) for name in table) for table in __tables)
+            + sys.getsizeof(self.__directories) + len(self.__directories) * sys.getsizeof((0, 0, 0))
+        )
+
+    def __intern(self, name: str | None, names: list, ids: dict) -> int:
+        __id = ids.get(name)
+        if __id is None:
+            __id = ids[name] = len(names)
+            names.append(name)
+        return __id
@@ -0,0 +1,268 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import mmap
+import os
+from pathlib import Path
+import struct
+import tempfile
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
+import zlib
+
+from common import constants
+from common.Singleton import Singleton
+from core.FileIndex import FileIndex
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+
+class MediaInfo(NamedTuple):
+    status: str
+    size: int
+    width: int | None = None
+    height: int | None = None
+    duration: float | None = None           # seconds, videos only
+    codec: str | None = None                # e.g. "png", "avc1", "hvc1" -- the video track's sample entry for MP4
+
+class MediaMetadata(metaclass=Singleton):
+    '''
+    Reads media properties from file headers only, so a file's payload is never read
+
+    PNG: the 33 bytes of signature and IHDR chunk (width, height), plus the last 12 bytes to check the file ends with an IEND chunk
+    MP4: the file is mapped with mmap and its boxes ("atoms") are walked by their headers -- `moov` gives duration (mvhd), resolution (tkhd) and codec (stsd),
+    and the `mdat` payload is stepped over, so only the pages holding box headers and `moov` are ever read from disk
+
+    Results are cached in the open `FileIndex` by path, size and mtime, so unchanged files are never read again
+    '''
+    OK = "ok"
+    EMPTY = "empty"                 # zero-byte file
+    TRUNCATED = "truncated"         # header is valid, but the file ends early
+    INVALID = "invalid"             # not a PNG / MP4 file, or a corrupt header
+    UNSUPPORTED = "unsupported"     # no header reader for this file type
+    UNREADABLE = "unreadable"       # the file could not be opened -- never cached
+
+    STATUSES = (OK, EMPTY, TRUNCATED, INVALID, UNSUPPORTED, UNREADABLE)
+
+    PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+    MP4_FILE_TYPES = frozenset(("mp4", "m4v", "mov"))
+
+    __PNG_HEADER_SIZE = 33          # signature, IHDR length and type, 13 data bytes, CRC
+    __PNG_IEND = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+    # boxes an MP4 / QuickTime file can start with -- anything else is not an MP4
+    __MP4_FIRST_BOXES = frozenset((b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot"))
+
+    def extract(items: Iterable[Any], get_path: Callable[[Any], Path | None] | None=None, max_workers: int=constants.METADATA_MAX_WORKERS) -> Iterator[tuple[Any, MediaInfo | None]]:
+        '''
+        Yields (item, `MediaInfo`) for each of `items` in order, reading headers on a thread pool
+
+        `get_path(item)` returns the file to read for an item (the item itself by default), or None to yield it without metadata
+        Items are consumed in batches of `METADATA_BATCH_SIZE`, so a lazily built plan is never loaded into memory
+        '''
+        __cached = FileIndex.get_cached_metadata() if FileIndex.is_open() else {}
+        __items = iter(items)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="MediaMetadata") as __executor:
+            while __batch := list(islice(__items, constants.METADATA_BATCH_SIZE)):
+                __paths = [get_path(item) if get_path is not None else item for item in __batch]
+                __results = __executor.map(lambda path: MediaMetadata.__read_cached(path, __cached) if path is not None else None, __paths)
+
+                for item, path, result in zip(__batch, __paths, __results):
+                    if result is None:
+                        yield item, None
+                        continue
+
+                    __info, __mtime_ns, __was_cached = result
+                    if not __was_cached and FileIndex.is_open() and __info.status != MediaMetadata.UNREADABLE:
+                        FileIndex.record_metadata(path, __info.size, __mtime_ns, __info.status, __info.width, __info.height, __info.duration, __info.codec)
+                    yield item, __info
+
+    def read(path: Path, size: int | None=None) -> MediaInfo:
+        '''
+        Reads the header of one file; errors are returned as a status instead of being raised
+        '''
+        __file_type = os.path.splitext(path)[1].lower().lstrip(".")
+        try:
+            if size is None:
+                size = os.stat(path).st_size
+            if size == 0:
+                return MediaInfo(MediaMetadata.EMPTY, 0)
+
+            if __file_type == "png":
+                return MediaMetadata.read_png(path, size)
+            if __file_type in MediaMetadata.MP4_FILE_TYPES:
+                return MediaMetadata.read_mp4(path, size)
+            return MediaInfo(MediaMetadata.UNSUPPORTED, size)
+
+        except OSError as e:
+            Logger.log_message("error", f"Unable to read the header of '{path}': {e}", print_to_console=False)
+            return MediaInfo(MediaMetadata.UNREADABLE, size or 0)
+
+    def read_png(path: Path, size: int) -> MediaInfo:
+        with open(path, "rb") as __file:
+            __header = __file.read(MediaMetadata.__PNG_HEADER_SIZE)
+            if not __header.startswith(MediaMetadata.PNG_SIGNATURE[:len(__header)]):
+                return MediaInfo(MediaMetadata.INVALID, size)
+            if len(__header) < MediaMetadata.__PNG_HEADER_SIZE:
+                return MediaInfo(MediaMetadata.TRUNCATED, size)
+            if __header[:8] != MediaMetadata.PNG_SIGNATURE or __header[12:16] != b"IHDR":
+                return MediaInfo(MediaMetadata.INVALID, size)
+
+            __width, __height = struct.unpack(">II", __header[16:24])
+            # a complete PNG ends with an IEND chunk, so a cut off download is caught without reading the image data
+            __status = MediaMetadata.TRUNCATED
+            if size >= MediaMetadata.__PNG_HEADER_SIZE + len(MediaMetadata.__PNG_IEND):
+                __file.seek(-len(MediaMetadata.__PNG_IEND), os.SEEK_END)
+                if __file.read() == MediaMetadata.__PNG_IEND:
+                    __status = MediaMetadata.OK
+            return MediaInfo(__status, size, __width, __height, None, "png")
+
+    def read_mp4(path: Path, size: int) -> MediaInfo:
+        with open(path, "rb") as __file, mmap.mmap(__file.fileno(), 0, access=mmap.ACCESS_READ) as __mapped:
+            try:
+                __moov = None
+                __truncated = False
+                for index, (box_type, start, end, complete) in enumerate(MediaMetadata.__iter_boxes(__mapped, 0, len(__mapped))):
+                    if index == 0 and box_type not in MediaMetadata.__MP4_FIRST_BOXES:
+                        return MediaInfo(MediaMetadata.INVALID, size)
+                    __truncated = __truncated or not complete
+                    if box_type == b"moov":
+                        __moov = (start, end)
+
+                if __moov is None:
+                    return MediaInfo(MediaMetadata.TRUNCATED if __truncated else MediaMetadata.INVALID, size)
+                return MediaInfo(MediaMetadata.TRUNCATED if __truncated else MediaMetadata.OK, size, *MediaMetadata.__read_moov(__mapped, *__moov))
+
+            except (ValueError, IndexError, struct.error):
+                return MediaInfo(MediaMetadata.INVALID, size)
+
+    def __read_cached(path: Path, cached: dict) -> tuple[MediaInfo, int, bool]:
+        # (info, mtime_ns, True if it came from the cache)
+        try:
+            __stat = os.stat(path)
+        except OSError as e:
+            Logger.log_message("error", f"Unable to read the header of '{path}': {e}", print_to_console=False)
+            return MediaInfo(MediaMetadata.UNREADABLE, 0), 0, False
+
+        __cached = cached.get(str(path))
+        if __cached is not None and __cached[:2] == (__stat.st_size, __stat.st_mtime_ns):
+            return MediaInfo(__cached[2], __stat.st_size, *__cached[3:]), __stat.st_mtime_ns, True
+        return MediaMetadata.read(path, __stat.st_size), __stat.st_mtime_ns, False
+
+    def __iter_boxes(data: mmap.mmap, start: int, end: int) -> Iterator[tuple[bytes, int, int, bool]]:
+        # yields (type, payload start, payload end, complete) for each box between `start` and `end` -- a box running past `end` is clipped and yielded as incomplete
+        __offset = start
+        while __offset + 8 <= end:
+            __size, __type = struct.unpack(">I4s", data[__offset:__offset + 8])
+            __header_size = 8
+            if __size == 1:
+                __size = struct.unpack(">Q", data[__offset + 8:__offset + 16])[0]
+                __header_size = 16
+            elif __size == 0:
+                # the last box runs to the end of the file
+                __size = end - __offset
+            if __size < __header_size:
+                raise ValueError(f"invalid box size {__size} at offset {__offset}")
+
+            yield __type, __offset + __header_size, min(__offset + __size, end), __offset + __size <= end
+            __offset += __size
+
+    def __read_moov(data: mmap.mmap, start: int, end: int) -> tuple[int | None, int | None, float | None, str | None]:
+        # (width, height, duration, codec) of the first video track, or the codec of the first track if there is no video
+        __duration = None
+        __tracks = []
+        for box_type, box_start, box_end, _ in MediaMetadata.__iter_boxes(data, start, end):
+            if box_type == b"mvhd":
+                if data[box_start] == 1:
+                    __timescale, __units = struct.unpack(">IQ", data[box_start + 20:box_start + 32])
+                else:
+                    __timescale, __units = struct.unpack(">II", data[box_start + 12:box_start + 20])
+                __duration = round(__units / __timescale, 3) if __timescale else None
+            elif box_type == b"trak":
+                __tracks.append(MediaMetadata.__read_track(data, box_start, box_end))
+
+        for handler, width, height, codec in __tracks:
+            if handler == b"vide":
+                return width, height, __duration, codec
+        return None, None, __duration, __tracks[0][3] if __tracks else None
+
+    def __read_track(data: mmap.mmap, start: int, end: int) -> tuple[bytes | None, int | None, int | None, str | None]:
+        # (handler type, width, height, codec) from trak/tkhd, trak/mdia/hdlr and trak/mdia/minf/stbl/stsd
+        __handler = __width = __height = __codec = None
+        for box_type, box_start, box_end, _ in MediaMetadata.__iter_boxes(data, start, end):
+            if box_type == b"tkhd":
+                # width and height are 16.16 fixed point, after the version 0 / 1 sized times and the matrix
+                __offset = box_start + (88 if data[box_start] == 1 else 76)
+                __width, __height = (value >> 16 for value in struct.unpack(">II", data[__offset:__offset + 8]))
+            elif box_type == b"mdia":
+                for mdia_type, mdia_start, mdia_end, _ in MediaMetadata.__iter_boxes(data, box_start, box_end):
+                    if mdia_type == b"hdlr":
+                        __handler = data[mdia_start + 8:mdia_start + 12]
+                    elif mdia_type == b"minf":
+                        __codec = MediaMetadata.__read_codec(data, mdia_start, mdia_end)
+        return __handler, __width, __height, __codec
+
+    def __read_codec(data: mmap.mmap, start: int, end: int) -> str | None:
+        # sample entry type of the first stsd entry, from minf/stbl/stsd
+        for minf_type, minf_start, minf_end, _ in MediaMetadata.__iter_boxes(data, start, end):
+            if minf_type != b"stbl":
+                continue
+            for stbl_type, stbl_start, _, _ in MediaMetadata.__iter_boxes(data, minf_start, minf_end):
+                if stbl_type == b"stsd":
+                    return data[stbl_start + 12:stbl_start + 16].decode("latin-1").strip() or None
+        return None
+
+    def run_unit_test() -> None:
+        Logger.log_message("info", f"{Formatter.generate_header("Testing MediaMetadata methods", capitalize=False)}")
+        try:
+            def __box(box_type: bytes, payload: bytes) -> bytes:
+                return struct.pack(">I", 8 + len(payload)) + box_type + payload
+
+            def __full_box(box_type: bytes, version: int, payload: bytes) -> bytes:
+                return __box(box_type, bytes((version, 0, 0, 0)) + payload)
+
+            def __png(width: int, height: int) -> bytes:
+                # IHDR and IEND only -- the header reader never looks at image data
+                __chunk = lambda chunk_type, data: struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+                return MediaMetadata.PNG_SIGNATURE + __chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) + __chunk(b"IDAT", b"") + __chunk(b"IEND", b"")
+
+            def __mp4(width: int, height: int, seconds: float, codec: bytes, version: int=0, moov_first: bool=False, large_mdat: bool=False) -> bytes:
+                # ftyp, mdat and a moov with an audio track ahead of the video track, in the mvhd / tkhd layout of `version`
+                __times = struct.pack(">QQ", 0, 0) if version == 1 else struct.pack(">II", 0, 0)
+                __mvhd = __full_box(b"mvhd", version, __times + struct.pack(">IQ" if version == 1 else ">II", 1000, int(seconds * 1000)) + bytes(80))
+
+                def __trak(handler: bytes, sample_entry: bytes, track_id: int, track_width: int, track_height: int) -> bytes:
+                    __duration = struct.pack(">Q", 0) if version == 1 else struct.pack(">I", 0)
+                    __tkhd = __full_box(b"tkhd", version, __times + struct.pack(">II", track_id, 0) + __duration + bytes(52) + struct.pack(">II", track_width << 16, track_height << 16))
+                    __hdlr = __full_box(b"hdlr", 0, bytes(4) + handler + bytes(13))
+                    __stsd = __full_box(b"stsd", 0, struct.pack(">I", 1) + __box(sample_entry, bytes(70)))
+                    return __box(b"trak", __tkhd + __box(b"mdia", __full_box(b"mdhd", 0, bytes(20)) + __hdlr + __box(b"minf", __box(b"stbl", __stsd))))
+
+                __moov = __box(b"moov", __mvhd + __trak(b"soun", b"mp4a", 1, 0, 0) + __trak(b"vide", codec, 2, width, height))
+                __ftyp = __box(b"ftyp", b"isom\x00\x00\x02\x00isomiso2avc1mp41")
+                __payload = bytes(20_000)
+                __mdat = struct.pack(">I4sQ", 1, b"mdat", 16 + len(__payload)) + __payload if large_mdat else __box(b"mdat", __payload)
+                return __ftyp + (__moov + __mdat if moov_first else __mdat + __moov)
+
+            # (file name, contents, expected MediaInfo fields other than size)
+            __cases = [
+                ("ok.png", __png(2000, 1500), (MediaMetadata.OK, 2000, 1500, None, "png")),
+                ("cut.png", __png(300, 400)[:-6], (MediaMetadata.TRUNCATED, 300, 400, None, "png")),
+                ("header.png", __png(300, 400)[:20], (MediaMetadata.TRUNCATED, None, None, None, None)),
+                ("empty.png", b"", (MediaMetadata.EMPTY, None, None, None, None)),
+                ("text.png", b"not a png at all, just text......", (MediaMetadata.INVALID, None, None, None, None)),
+                ("ok.mp4", __mp4(1920, 1080, 30.5, b"avc1"), (MediaMetadata.OK, 1920, 1080, 30.5, "avc1")),
+                ("v1.mp4", __mp4(640, 480, 12.25, b"hvc1", version=1, moov_first=True, large_mdat=True), (MediaMetadata.OK, 640, 480, 12.25, "hvc1")),
+                ("cut.mp4", __mp4(640, 480, 10, b"avc1")[:5000], (MediaMetadata.TRUNCATED, None, None, None, None)),
+                ("cut_moov.mp4", __mp4(640, 480, 10, b"avc1", moov_first=True)[:5000], (MediaMetadata.TRUNCATED, 640, 480, 10.0, "avc1")),
+                ("text.mp4", b"not an mp4 at all, just some text", (MediaMetadata.INVALID, None, None, None, None)),
+                ("game.txt", b"text", (MediaMetadata.UNSUPPORTED, None, None, None, None)),
+            ]
+
+            with tempfile.TemporaryDirectory() as __temp_dir:
+                for name, contents, expected in __cases:
+                    __path = Path(__temp_dir) / name
+                    __path.write_bytes(contents)
+                    __info = MediaMetadata.read(__path)
+                    Logger.log_message("info", f"read() returned {__info} for '{name}'")
+                    assert __info.size == len(contents), f"'{name}' size is {__info.size}, expected {len(contents)}"
+                    assert tuple(__info)[:1] + tuple(__info)[2:] == expected, f"'{name}' read as {__info}, expected {expected}"
+
+        except Exception as e:
+            Logger.log_message("critical", f"MediaMetadata unit test has failed: {e}")
@@ -0,0 +1,100 @@
+import json
+from pathlib import Path
+from typing import Callable
+
+from common import constants
+from common.Singleton import Singleton
+from config_loaders.ToolConfig import ToolConfig
+from core.FileIndex import FileIndex
+from core.MediaInventory import MediaInventory
+from core.MediaMetadata import MediaInfo, MediaMetadata
+from core.MediaRules import MediaRules
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+from utils.TestTime import TestTime
+
+class MediaMetadataReport(metaclass=Singleton):
+    '''
+    Inspect mode -- reads the header metadata of every target media file and writes it, with the "media_rules" each file matches, to a JSON lines report
+
+    Files are listed into a compact `MediaInventory` first, so the report scales to large libraries; headers are read by `MediaMetadata.extract()`
+    and cached in the output dir's file index, so a rerun only reads files that changed since the last one
+    '''
+    def run(report_path: Path | None=None, on_file: Callable[[dict], None] | None=None) -> Path | None:
+        '''
+        Writes one JSON line per target media file to `report_path` (defaults to the output dir), calling `on_file(record)` for each, and logs per media type counts
+
+        Returns the saved report path, or None if the report failed
+        '''
+        if report_path is None:
+            report_path = Path(ToolConfig.output_dir or ".") / constants.MEDIA_METADATA_FILE
+
+        Logger.log_message("info", "Reading media metadata...")
+        try:
+            if not ToolConfig.target_media_dirs:
+                Logger.log_message("error", "No target media directories identified -- run config validation before inspecting media")
+                return None
+
+            if ToolConfig.output_dir:
+                FileIndex.open(ToolConfig.output_dir)
+
+            with TestTime.span("scan"):
+                __inventory = MediaInventory.scan(ToolConfig.target_media_dirs, ToolConfig.get_target_media_file_types(), include_stats=False)
+
+            # (console, media type) -> [files, bytes, {status: count}, {rule name: count}]
+            __summary = {}
+            __rules = ToolConfig.get_media_rules()
+            __report_path = Path(report_path)
+            __report_path.parent.mkdir(parents=True, exist_ok=True)
+            with TestTime.span("read metadata"), open(__report_path, "w", encoding="utf-8") as __report_file:
+                for index, info in MediaMetadata.extract(range(len(__inventory)), get_path=__inventory.get_path):
+                    __console, __media_type, __name = __inventory.get_console(index), __inventory.get_media_type(index), __inventory.get_name(index)
+                    __matches = [rule.name for rule in MediaRules.get_matches(__rules, __media_type, Path(__name).suffix.lower().lstrip("."), info)]
+                    __record = {"console": __console, "media_type": __media_type, "name": __name, **info._asdict(), "rules": __matches}
+                    __report_file.write(json.dumps(__record) + "\n")
+                    if on_file is not None:
+                        on_file(__record)
+                    MediaMetadataReport.__count(__summary.setdefault((__console, __media_type), [0, 0, {}, {}]), info, __matches)
+
+            MediaMetadataReport.log_summary(__summary)
+            Logger.log_message("result", f"Media metadata report saved to '{__report_path}'")
+            return __report_path
+
+        except Exception as e:
+            Logger.log_message("critical", f"MediaMetadataReport.run() has failed: {e}")
+            return None
+
+        finally:
+            FileIndex.close()
+
+    def log_summary(summary: dict[tuple[str, str], list], title: str="Media metadata summary") -> None:
+        if not summary:
+            return
+
+        __labels = {key: f"{key[0]}/{key[1]}" for key in summary}
+        __longest_label = max(len(label) for label in list(__labels.values()) + ["TOTAL"])
+        Logger.log_message("info", Formatter.generate_header(title))
+        __totals = [0, 0, {}, {}]
+        for key, counts in sorted(summary.items()):
+            __has_problems = any(status != MediaMetadata.OK for status in counts[2]) or counts[3]
+            Logger.log_message("warning" if __has_problems else "info", f"{Formatter.pad_field_label(__labels[key], __longest_label)} {MediaMetadataReport.__format_counts(counts)}")
+            __totals[0] += counts[0]
+            __totals[1] += counts[1]
+            for column in (2, 3):
+                for name, count in counts[column].items():
+                    __totals[column][name] = __totals[column].get(name, 0) + count
+        Logger.log_message("result", f"{Formatter.pad_field_label('TOTAL', __longest_label)} {MediaMetadataReport.__format_counts(__totals)}")
+
+    def __count(counts: list, info: MediaInfo, matches: list[str]) -> None:
+        counts[0] += 1
+        counts[1] += info.size
+        counts[2][info.status] = counts[2].get(info.status, 0) + 1
+        for name in matches:
+            counts[3][name] = counts[3].get(name, 0) + 1
+
+    def __format_counts(counts: list) -> str:
+        __files, __bytes, __statuses, __rules = counts
+        # "ok" files are the remainder, so only other statuses are listed
+        __statuses = ", ".join(f"{status} {count:,}" for status, count in sorted(__statuses.items()) if status != MediaMetadata.OK) or "all ok"
+        __rules = ", ".join(f"'{name}' {count:,}" for name, count in sorted(__rules.items())) or "none"
+        return f"{__files:,} file(s), {__bytes / 1_048_576:,.1f} MiB | {__statuses} | rules: {__rules}"
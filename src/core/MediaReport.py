@@ -0,0 +1,190 @@
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+from common import constants
+from common.Singleton import Singleton
+from config_loaders.ToolConfig import ToolConfig
+from core.MediaWalker import MediaWalker
+from core.SuffixMatcher import SuffixMatcher
+from core.WorkScheduler import WorkScheduler
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+from utils.TestTime import TestTime
+
+class ConsoleReport(NamedTuple):
+    console: str
+    rom_count: int                                  # distinct ROM stems, so "Game.cue" and "Game.bin" count once
+    media_count: int
+    orphaned: list[tuple[str, str, int]]            # (media type, filename, size) of media with no matching ROM
+    missing: dict[str, list[str]]                   # media type -> ROM names with no media of that type
+    error: str | None = None                        # set if the console could not be scanned
+
+class MediaReport(metaclass=Singleton):
+    '''
+    Report mode -- joins the ROMs of each console against its media, listing orphaned media (no matching ROM) and ROMs missing a media type
+
+    ROMs are the files directly in the console dir; media files match a ROM by stem, after their own media type's suffix is removed (e.g. "covers/Game-thumb.png" -> "Game")
+    Each console is read in a single pass: its ROM stems are hashed into a dict, then every media type dir is streamed against it once,
+    so a console costs one directory listing per media type and one stat per orphaned file, and scales linearly with its file count
+
+    Media types are the configured "suffixes_by_media_type" keys, so a console that was never scraped for a type reports every ROM as missing it
+    '''
+    ORPHANED = "orphaned"
+    MISSING = "missing"
+
+    def run(report_path: Path | None=None) -> Path | None:
+        '''
+        Builds the report for every target console, logs per-console counts and writes every orphaned and missing entry to `report_path` (defaults to the output dir)
+
+        Returns the saved report path, or None if the report failed
+        '''
+        if report_path is None:
+            report_path = Path(ToolConfig.output_dir or ".") / constants.MEDIA_REPORT_FILE
+
+        Logger.log_message("info", "Building orphaned and missing media report...")
+        try:
+            if not ToolConfig.target_media_dirs:
+                Logger.log_message("error", "No target media directories identified -- run config validation before building a media report")
+                return None
+
+            with TestTime.span("media report"):
+                __reports = sorted(MediaReport.iter_console_reports(), key=lambda report: report.console)
+                MediaReport.write(__reports, report_path)
+            MediaReport.log_summary(__reports)
+            Logger.log_message("result", f"Media report saved to '{report_path}'")
+            return Path(report_path)
+
+        except Exception as e:
+            Logger.log_message("critical", f"MediaReport.run() has failed: {e}")
+            return None
+
+    def iter_console_reports(media_dirs: Iterable[Path] | None=None) -> Iterator[ConsoleReport]:
+        '''
+        Yields a `ConsoleReport` for each of `media_dirs` (defaults to `ToolConfig.target_media_dirs`) as soon as it completes
+
+        Consoles run on `WorkScheduler` worker processes if "worker_processes" is above 1, otherwise on a thread pool
+        '''
+        if media_dirs is None:
+            media_dirs = ToolConfig.target_media_dirs
+        media_dirs = list(media_dirs)
+
+        __task_args = (dict(ToolConfig.get_suffixes_by_media_type_dict()), tuple(sorted(ToolConfig.get_target_media_file_types())))
+
+        if ToolConfig.get_worker_processes() > 1 and len(media_dirs) > 1:
+            __units = WorkScheduler.count_work_units(media_dirs, __task_args[1])
+            __completed = WorkScheduler.run(__units, MediaReport.report_console, __task_args, max_workers=ToolConfig.get_worker_processes(), max_per_device=ToolConfig.get_max_workers_per_root())
+            __results = ((unit.media_dir, future) for unit, future in __completed)
+        else:
+            __results = MediaReport.__run_on_threads(media_dirs, __task_args)
+
+        for media_dir, future in __results:
+            try:
+                yield future.result()
+            except Exception as e:
+                yield ConsoleReport(Path(media_dir).parent.name, 0, 0, [], {}, error=str(e))
+
+    def report_console(media_dir: str, suffixes_by_media_type: dict[str, str], file_types: tuple[str, ...]) -> ConsoleReport:
+        '''
+        Worker task -- joins the ROMs of one console against its media dir without using the config, and returns plain data so it can run in another process
+        '''
+        __console_dir = os.path.dirname(media_dir)
+        __console = os.path.basename(__console_dir)
+        __matcher = SuffixMatcher(suffixes_by_media_type, file_types)
+        __file_types = frozenset(file_types)
+
+        # normalized ROM stem -> ROM name
+        __roms = {}
+        with os.scandir(__console_dir) as __entries:
+            for entry in __entries:
+                if entry.name.startswith(".") or not entry.is_file() or MediaWalker.has_file_type(entry.name, constants.REPORT_IGNORED_ROM_FILE_TYPES):
+                    continue
+                __roms.setdefault(MediaReport.__get_stem_key(entry.name), entry.name)
+
+        __media_type_dirs = {entry.name: entry.path for entry in MediaWalker.scan_subdirectories(media_dir)}
+        __media_count = 0
+        __orphaned = []
+        __missing = {}
+        for media_type in suffixes_by_media_type:
+            __matched = set()
+            __media_type_dir = __media_type_dirs.get(media_type)
+            if __media_type_dir is not None:
+                __entries = MediaWalker.scan_media_files(__media_type_dir, __file_types)
+                __names = [entry.name for entry in __entries]
+                __media_count += len(__names)
+
+                # names without this media type's suffix; None means the name does not carry it
+                for entry, name, unsuffixed in zip(__entries, __names, __matcher.get_target_names(__names, media_type, "remove")):
+                    __key = MediaReport.__get_stem_key(unsuffixed or name)
+                    if __key in __roms:
+                        __matched.add(__key)
+                    else:
+                        __orphaned.append((media_type, name, entry.stat().st_size))
+
+            if len(__matched) < len(__roms):
+                __missing[media_type] = sorted(name for key, name in __roms.items() if key not in __matched)
+
+        return ConsoleReport(__console, len(__roms), __media_count, __orphaned, __missing)
+
+    def write(reports: Iterable[ConsoleReport], report_path: Path) -> None:
+        '''
+        Writes one JSON line per orphaned media file and per (ROM, missing media type)
+        '''
+        __report_path = Path(report_path)
+        __report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(__report_path, "w", encoding="utf-8") as __report_file:
+            for report in reports:
+                for media_type, name, size in report.orphaned:
+                    __report_file.write(json.dumps({"console": report.console, "status": MediaReport.ORPHANED, "media_type": media_type, "name": name, "size": size}) + "\n")
+                for media_type, rom_names in report.missing.items():
+                    for rom_name in rom_names:
+                        __report_file.write(json.dumps({"console": report.console, "status": MediaReport.MISSING, "media_type": media_type, "name": rom_name, "size": None}) + "\n")
+
+    def log_summary(reports: list[ConsoleReport], title: str="Media report summary") -> None:
+        if not reports:
+            return
+
+        __longest_label = max(len(label) for label in [report.console for report in reports] + ["TOTAL"])
+        Logger.log_message("info", Formatter.generate_header(title))
+        for report in reports:
+            __label = Formatter.pad_field_label(report.console, __longest_label)
+            if report.error is not None:
+                Logger.log_message("error", f"{__label} unable to build report: {report.error}")
+                continue
+            Logger.log_message("info", f"{__label} {MediaReport.__format_counts(report.rom_count, report.media_count, report.orphaned, report.missing)}")
+
+        __missing_totals = {}
+        for report in reports:
+            for media_type, rom_names in report.missing.items():
+                __missing_totals[media_type] = __missing_totals.get(media_type, 0) + len(rom_names)
+        __orphaned = [orphan for report in reports for orphan in report.orphaned]
+        __totals = MediaReport.__format_counts(sum(report.rom_count for report in reports), sum(report.media_count for report in reports), __orphaned, __missing_totals)
+        Logger.log_message("result", f"{Formatter.pad_field_label('TOTAL', __longest_label)} {__totals}")
+
+    def __run_on_threads(media_dirs: list[Path], task_args: tuple) -> Iterator[tuple[Path, Future]]:
+        __executor = ThreadPoolExecutor(max_workers=constants.SCAN_MAX_WORKERS, thread_name_prefix="MediaReport")
+        try:
+            __futures = {__executor.submit(MediaReport.__timed_report_console, str(media_dir), *task_args): media_dir for media_dir in media_dirs}
+            for future in as_completed(__futures):
+                yield __futures[future], future
+
+        finally:
+            # stop pending consoles if the consumer stops iterating early
+            __executor.shutdown(wait=False, cancel_futures=True)
+
+    def __timed_report_console(media_dir: str, *args) -> ConsoleReport:
+        # per-console breakdown of report time in the run's span summary
+        with TestTime.span("report", console=Path(media_dir).parent.name):
+            return MediaReport.report_console(media_dir, *args)
+
+    def __get_stem_key(name: str) -> str:
+        # ROMs and media are matched case-insensitively where the filesystem is
+        __stem, __dot, __extension = name.rpartition(".")
+        return os.path.normcase(__stem if __dot else name)
+
+    def __format_counts(rom_count: int, media_count: int, orphaned: list[tuple[str, str, int]], missing: dict[str, list[str] | int]) -> str:
+        __missing = ", ".join(f"{media_type} {rom_names if isinstance(rom_names, int) else len(rom_names):,}" for media_type, rom_names in sorted(missing.items())) or "none"
+        __reclaimable = sum(size for _, _, size in orphaned)
+        return f"{rom_count:,} ROMs | {media_count:,} media | {len(orphaned):,} orphaned ({__reclaimable / 1_048_576:,.1f} MiB reclaimable) | missing: {__missing}"
@@ -0,0 +1,162 @@
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from common.Singleton import Singleton
+from core.MediaMetadata import MediaInfo, MediaMetadata
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+from utils.RunStats import RunStats
+
+class MediaRule:
+    '''
+    One compiled "media_rules" entry of the config -- matches files whose header metadata meets every condition it sets
+
+    e.g. {"name": "heavy videos", "action": "flag", "media_types": ["videos"], "min_height": 1080, "min_bytes": 50000000}
+
+    Conditions: "media_types", "file_types", "statuses" and "codecs" lists, and "min_" / "max_" limits on "width", "height", "bytes" and "duration_seconds"
+    A file without a value for a limit (e.g. the duration of a PNG) does not match it
+    Problems are collected into `errors` instead of raised, so config validation can report them with everything else
+    '''
+    SKIP = "skip"               # leave matching files out of the run
+    FLAG = "flag"               # process matching files, but log and count them
+
+    ACTIONS = (SKIP, FLAG)
+
+    # limit key -> `MediaInfo` field
+    LIMIT_FIELDS = {"width": "width", "height": "height", "bytes": "size", "duration_seconds": "duration"}
+    LIST_KEYS = ("media_types", "file_types", "statuses", "codecs")
+
+    __slots__ = ("name", "action", "media_types", "file_types", "statuses", "codecs", "limits", "errors")
+
+    def __init__(self, settings: dict, index: int=0):
+        self.errors = []
+        if not isinstance(settings, dict):
+            self.errors.append("entry is not an object of conditions")
+            settings = {}
+
+        self.name = str(settings.get("name") or f"rule {index + 1}")
+        self.action = str(settings.get("action", MediaRule.FLAG)).lower()
+        if self.action not in MediaRule.ACTIONS:
+            self.errors.append(f"'{self.action}' is not a valid action -- expected 'skip' or 'flag'")
+
+        self.media_types = self.__get_list(settings, "media_types")
+        self.file_types = self.__get_list(settings, "file_types", lambda file_type: file_type.lower().lstrip("."))
+        self.statuses = self.__get_list(settings, "statuses", str.lower)
+        self.codecs = self.__get_list(settings, "codecs", str.lower)
+        for status in sorted(self.statuses or ()):
+            if status not in MediaMetadata.STATUSES:
+                self.errors.append(f"'{status}' is not a valid status -- expected one of {', '.join(MediaMetadata.STATUSES)}")
+
+        # (MediaInfo field, True for a minimum, limit)
+        __limits = []
+        for key, value in settings.items():
+            __bound, _, __field = key.partition("_")
+            if __bound in ("min", "max") and __field in MediaRule.LIMIT_FIELDS:
+                try:
+                    __limits.append((MediaRule.LIMIT_FIELDS[__field], __bound == "min", float(value)))
+                except (TypeError, ValueError):
+                    self.errors.append(f"'{key}' must be a number, not '{value}'")
+            elif key not in MediaRule.LIST_KEYS and key not in ("name", "action"):
+                self.errors.append(f"'{key}' is not a known condition")
+        self.limits = tuple(__limits)
+
+        # a rule without conditions would match every file -- only reported if no condition was even attempted, so a bad value is not reported twice
+        if not any(key in MediaRule.LIST_KEYS or key.startswith(("min_", "max_")) for key in settings):
+            self.errors.append("no conditions are set")
+
+    def matches(self, media_type: str, file_type: str, info: MediaInfo) -> bool:
+        if self.media_types is not None and media_type not in self.media_types:
+            return False
+        if self.file_types is not None and file_type not in self.file_types:
+            return False
+        if self.statuses is not None and info.status not in self.statuses:
+            return False
+        if self.codecs is not None and (info.codec or "").lower() not in self.codecs:
+            return False
+
+        for field, is_min, limit in self.limits:
+            __value = getattr(info, field)
+            if __value is None or (__value < limit if is_min else __value > limit):
+                return False
+        return True
+
+    def applies_to(self, media_type: str, file_type: str) -> bool:
+        # whether a file could match without reading its metadata -- files no rule applies to are never read
+        return (self.media_types is None or media_type in self.media_types) and (self.file_types is None or file_type in self.file_types)
+
+    def __get_list(self, settings: dict, key: str, normalize=str) -> frozenset[str] | None:
+        # None when the condition is not set, so it matches every file
+        __values = settings.get(key)
+        if __values is None:
+            return None
+        if isinstance(__values, str):
+            __values = [__values]
+        if not isinstance(__values, list):
+            self.errors.append(f"'{key}' must be a list")
+            return None
+        return frozenset(normalize(str(value)) for value in __values)
+
+class MediaRules(metaclass=Singleton):
+    '''
+    Applies the configured "media_rules" to a run -- files matched by a "skip" rule are left out, files matched by a "flag" rule are logged and counted
+
+    Rules are checked in order and the first "skip" rule that matches wins; a file can be flagged by several rules
+    Only files some rule applies to (by media type and file type) have their header read
+    '''
+    def filter_pairs(pairs: Iterable[tuple[Path, Path]], rules: Iterable[MediaRule], counts: dict[str, list[int]], on_skip: Callable[[Path], None] | None=None) -> Iterator[tuple[Path, Path]]:
+        '''
+        Yields the (src, dst) pairs no "skip" rule matches, and adds [skipped, flagged] per rule name to `counts`
+
+        `on_skip(src)` is called for every skipped file, e.g. so its media type dir is not recorded as fully processed
+        '''
+        rules = tuple(rules)
+
+        def __get_path(pair: tuple[Path, Path]) -> Path | None:
+            __src = pair[0]
+            __file_type = __src.suffix.lower().lstrip(".")
+            return __src if any(rule.applies_to(__src.parent.name, __file_type) for rule in rules) else None
+
+        for (src, dst), info in MediaMetadata.extract(pairs, get_path=__get_path):
+            if info is None:
+                yield src, dst
+                continue
+
+            __skipped = False
+            for rule in MediaRules.get_matches(rules, src.parent.name, src.suffix.lower().lstrip("."), info):
+                __counts = counts.setdefault(rule.name, [0, 0])
+                if rule.action == MediaRule.SKIP:
+                    __counts[0] += 1
+                    RunStats.record_path(src, RunStats.SKIPPED)
+                    Logger.log_message("info", f"Skipped '{src}' -- matches media rule '{rule.name}' ({MediaRules.format_info(info)})", print_to_console=RunStats.is_file_detail_enabled())
+                    __skipped = True
+                    if on_skip is not None:
+                        on_skip(src)
+                    break
+                __counts[1] += 1
+                Logger.log_message("warning", f"Flagged '{src}' -- matches media rule '{rule.name}' ({MediaRules.format_info(info)})", print_to_console=RunStats.is_file_detail_enabled())
+
+            if not __skipped:
+                yield src, dst
+
+    def get_matches(rules: Iterable[MediaRule], media_type: str, file_type: str, info: MediaInfo) -> list[MediaRule]:
+        return [rule for rule in rules if rule.matches(media_type, file_type, info)]
+
+    def format_info(info: MediaInfo) -> str:
+        __fields = [info.status, f"{info.size:,} bytes"]
+        if info.width is not None:
+            __fields.append(f"{info.width}x{info.height}")
+        if info.duration is not None:
+            __fields.append(f"{info.duration:,.1f} s")
+        if info.codec is not None:
+            __fields.append(info.codec)
+        return ", ".join(__fields)
+
+    def log_summary(counts: dict[str, list[int]], title: str="Media rules summary") -> None:
+        if not counts:
+            return
+
+        __longest_label = max(len(name) for name in counts)
+        Logger.log_message("info", Formatter.generate_header(title))
+        for name, (skipped, flagged) in counts.items():
+            __label = Formatter.pad_field_label(name, __longest_label)
+            Logger.log_message("warning" if flagged else "result", f"{__label} {skipped:,} skipped | {flagged:,} flagged")
@@ -0,0 +1,143 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+import os
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from common import constants
+from common.Singleton import Singleton
+from core.AdaptiveExecutor import AdaptiveExecutor
+from utils.TestTime import TestTime
+
+
+class ConsoleMedia(NamedTuple):
+    console: str
+    console_path: Path
+    media_path: Path | None                         # None if console dir has no `media_dir_identifier` subdir
+    media_files: dict[str, list[os.DirEntry]]       # media type -> file entries
+    error: Exception | None = None                  # set if console dir could not be scanned
+    media_mtimes: dict[str, int] | None = None      # media type -> mtime_ns taken before it was listed, only with `known_dir_mtimes`
+
+
+class MediaWalker(metaclass=Singleton):
+
+    def walk_consoles(consoles_dir: Path, media_dir_identifier: str, consoles: Iterable[str] | None=None, include_files: bool=False, file_types: Iterable[str] | None=None, max_workers: int=constants.SCAN_MAX_WORKERS, adaptive_max_workers: int | None=None) -> Iterator[ConsoleMedia]:
+        '''
+        Scans each console directory in `consoles_dir` concurrently and yields a `ConsoleMedia` for every console as soon as its scan completes
+
+        If `consoles` is None, every subdirectory of `consoles_dir` is scanned; otherwise only the named consoles are scanned, and missing ones are yielded with `error` set
+
+        If `include_files` is False, only the presence of the `media_dir_identifier` subdirectory is checked and `media_files` is left empty
+
+        With `adaptive_max_workers`, the number of concurrent scans adapts between 1 and that limit to the scan time per file (see `AdaptiveExecutor`)
+        '''
+        __file_types = MediaWalker.normalize_file_types(file_types)
+
+        if consoles is None:
+            consoles = (entry.name for entry in MediaWalker.scan_subdirectories(consoles_dir))
+
+        __jobs = ((console, Path(consoles_dir) / console) for console in consoles)
+        yield from MediaWalker.__run_scans(__jobs, media_dir_identifier, include_files, __file_types, max_workers, adaptive_max_workers=adaptive_max_workers)
+
+    def walk_media_dirs(media_dirs: Iterable[Path], file_types: Iterable[str] | None=None, known_dir_mtimes: dict[str, int] | None=None, max_workers: int=constants.SCAN_MAX_WORKERS, adaptive_max_workers: int | None=None) -> Iterator[ConsoleMedia]:
+        '''
+        Scans already identified media directories (e.g. `ToolConfig.target_media_dirs`) concurrently and yields a `ConsoleMedia` with `media_files` populated for each one
+
+        If `known_dir_mtimes` ({media type dir path: mtime_ns}) is given, media type dirs whose mtime is unchanged are not listed and are left out of `media_files`,
+        and the mtime of every listed one, taken before listing it, is set in `media_mtimes`
+        '''
+        __file_types = MediaWalker.normalize_file_types(file_types)
+        __jobs = ((Path(media_dir).parent.name, Path(media_dir)) for media_dir in media_dirs)
+        yield from MediaWalker.__run_scans(__jobs, None, True, __file_types, max_workers, known_dir_mtimes, adaptive_max_workers)
+
+    def scan_subdirectories(directory: Path) -> list[os.DirEntry]:
+        '''
+        Returns the `os.DirEntry` of every subdirectory of `directory`, relying on the entry type cached by `os.scandir` instead of a stat per entry
+        '''
+        with os.scandir(directory) as __entries:
+            return [entry for entry in __entries if entry.is_dir()]
+
+    def scan_media_files(media_type_dir: Path, file_types: frozenset[str] | None=None) -> list[os.DirEntry]:
+        '''
+        Returns the `os.DirEntry` of every file in `media_type_dir` whose extension is in `file_types` (all files if `file_types` is None)
+        '''
+        with os.scandir(media_type_dir) as __entries:
+            return [entry for entry in __entries if entry.is_file() and MediaWalker.has_file_type(entry.name, file_types)]
+
+    def normalize_file_types(file_types: Iterable[str] | None) -> frozenset[str] | None:
+        '''
+        Normalizes configured file types to lowercase extensions without a leading "." (e.g. ".PNG" -> "png")
+        '''
+        if file_types is None:
+            return None
+        return frozenset(file_type.lower().lstrip(".") for file_type in file_types)
+
+    def has_file_type(filename: str, file_types: frozenset[str] | None) -> bool:
+        if file_types is None:
+            return True
+        __stem, __dot, __extension = filename.rpartition(".")
+        return bool(__dot) and __extension.lower() in file_types
+
+    def __run_scans(jobs: Iterable[tuple[str, Path]], media_dir_identifier: str | None, include_files: bool, file_types: frozenset[str] | None, max_workers: int, known_dir_mtimes: dict[str, int] | None=None, adaptive_max_workers: int | None=None) -> Iterator[ConsoleMedia]:
+        # consoles differ wildly in size, so the adaptive limit follows scan time per file rather than per console
+        __executor = AdaptiveExecutor(max_workers, "MediaWalker", adaptive_max_workers, get_units=lambda console_media: sum(len(entries) for entries in console_media.media_files.values()))
+        __jobs = iter(jobs)
+        __pending = set()
+        try:
+            while True:
+                # keep up to twice the current limit of scans queued, yielding results as they complete
+                for console, path in __jobs:
+                    __pending.add(__executor.submit(MediaWalker.__timed_scan_console, console, path, media_dir_identifier, include_files, file_types, known_dir_mtimes, __executor.retry))
+                    if len(__pending) >= __executor.get_limit() * 2:
+                        break
+                if not __pending:
+                    break
+
+                __done, __pending = wait(__pending, return_when=FIRST_COMPLETED)
+                for future in __done:
+                    yield future.result()
+
+        finally:
+            # stop pending scans if consumer stops iterating early (e.g. invalid config exit)
+            __executor.shutdown(wait=False, cancel_futures=True)
+            __executor.log_summary()
+
+    def __timed_scan_console(console: str, path: Path, media_dir_identifier: str | None, include_files: bool, file_types: frozenset[str] | None, known_dir_mtimes: dict[str, int] | None, retry: Callable) -> ConsoleMedia:
+        # per-console breakdown of scan time in the run's span summary
+        with TestTime.span("scan", console=console):
+            try:
+                # transient errors (e.g. a network share timing out) rescan the console after a backoff
+                return retry(MediaWalker.__scan_console, console, path, media_dir_identifier, include_files, file_types, known_dir_mtimes)
+
+            except Exception as e:
+                return ConsoleMedia(console, Path(path), None, {}, error=e)
+
+    def __scan_console(console: str, path: Path, media_dir_identifier: str | None, include_files: bool, file_types: frozenset[str] | None, known_dir_mtimes: dict[str, int] | None=None) -> ConsoleMedia:
+        '''
+        Scans a single console; `path` is the console dir if `media_dir_identifier` is set, otherwise it is the media dir itself
+        '''
+        if media_dir_identifier is None:
+            __console_path = path.parent
+            __media_path = path
+        else:
+            __console_path = path
+            __media_path = None
+            for entry in MediaWalker.scan_subdirectories(path):
+                if entry.name == media_dir_identifier:
+                    __media_path = Path(entry.path)
+                    break
+
+        __media_files = {}
+        __media_mtimes = {} if known_dir_mtimes is not None else None
+        if include_files and __media_path is not None:
+            for media_type_entry in MediaWalker.scan_subdirectories(__media_path):
+                if known_dir_mtimes is not None:
+                    # one stat per media type dir lets unchanged dirs skip a full listing
+                    __mtime_ns = media_type_entry.stat().st_mtime_ns
+                    if known_dir_mtimes.get(media_type_entry.path) == __mtime_ns:
+                        continue
+                    __media_mtimes[media_type_entry.name] = __mtime_ns
+
+                __media_files[media_type_entry.name] = MediaWalker.scan_media_files(media_type_entry.path, file_types)
+
+        return ConsoleMedia(console, __console_path, __media_path, __media_files, media_mtimes=__media_mtimes)
+
@@ -0,0 +1,322 @@
+import ctypes
+import ctypes.util
+import os
+from pathlib import Path
+import select
+import struct
+import sys
+import threading
+import time
+
+from common import constants
+from common.Singleton import Singleton
+from config_loaders.ToolConfig import ToolConfig
+from core.GamelistRewriter import GamelistRewriter
+from core.MediaWalker import MediaWalker
+from core.RenameJournal import RenameJournal
+from core.SuffixTool import SuffixTool
+from utils.Logger import Logger
+from utils.RunStats import RunStats
+
+
+class _Inotify:
+    # minimal ctypes binding for linux inotify -- only the calls and event bits the watcher needs
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    __IN_NONBLOCK = 0o4000
+    __IN_CLOEXEC = 0o2000000
+
+    __EVENT = struct.Struct("iIII")     # wd, mask, cookie, name length
+
+    def __init__(self):
+        self.__libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.__libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = self.__libc.inotify_init1(_Inotify.__IN_NONBLOCK | _Inotify.__IN_CLOEXEC)
+        if self.fd < 0:
+            __errno = ctypes.get_errno()
+            raise OSError(__errno, os.strerror(__errno))
+        self.__paths = {}               # watch descriptor -> watched dir path
+
+    def add_watch(self, path: str, mask: int) -> None:
+        __wd = self.__libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if __wd < 0:
+            __errno = ctypes.get_errno()
+            raise OSError(__errno, os.strerror(__errno), path)
+        self.__paths[__wd] = path
+
+    def read_events(self) -> list[tuple[str | None, str, int]]:
+        '''
+        Returns every queued event as (watched dir path, name, mask) without blocking; the path is None for queue overflow events
+        '''
+        __events = []
+        while True:
+            try:
+                __data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return __events
+
+            __offset = 0
+            while __offset < len(__data):
+                __wd, __mask, __cookie, __length = _Inotify.__EVENT.unpack_from(__data, __offset)
+                __offset += _Inotify.__EVENT.size
+                __name = os.fsdecode(__data[__offset:__offset + __length].rstrip(b"\0"))
+                __offset += __length
+
+                if __mask & _Inotify.IN_IGNORED:
+                    self.__paths.pop(__wd, None)
+                    continue
+                __events.append((self.__paths.get(__wd), __name, __mask))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class MediaWatcher(metaclass=Singleton):
+    '''
+    Long-running mode that applies the suffix action only to media files added after the watcher starts
+
+    On linux, the target media type dirs are watched with inotify, so an idle watcher sleeps in a single blocking `select` call
+    Elsewhere (or if inotify is unavailable), each watched dir is polled with one `stat` per interval and only listed again when its mtime changes
+
+    New files are debounced and renamed in batches through the rename journal, so each batch can be resumed or undone like a normal run
+    '''
+    __stop_read, __stop_write = None, None
+    __stop_event = threading.Event()
+
+    def run(action: str | None=None, debounce: float=constants.WATCH_DEBOUNCE_SECONDS, poll_interval: float=constants.WATCH_POLL_INTERVAL_SECONDS, use_inotify: bool=True) -> None:
+        # default to configured "suffix_action"
+        if action is None:
+            action = ToolConfig.get_suffix_action()
+
+        if not ToolConfig.target_media_dirs:
+            Logger.log_message("error", "No target media directories identified -- run config validation before starting watch mode")
+            return
+
+        RunStats.reset(aggregate=ToolConfig.is_aggregate_logging_enabled(), file_details=ToolConfig.is_file_detail_logging_enabled(), progress_interval=ToolConfig.get_progress_interval())
+        MediaWatcher.__stop_event.clear()
+        MediaWatcher.__stop_read, MediaWatcher.__stop_write = os.pipe()
+
+        __inotify = None
+        try:
+            if use_inotify and sys.platform.startswith("linux"):
+                try:
+                    __inotify = _Inotify()
+                except (OSError, AttributeError) as e:
+                    Logger.log_message("warning", f"inotify unavailable, falling back to polling: {e}")
+
+            __watch_dirs = MediaWatcher.get_watch_dirs()
+            Logger.log_message("info", f"Watching {len(__watch_dirs)} media type directories with {'inotify' if __inotify else f'{poll_interval}s polling'} -- tool action set to: {action} target suffix")
+            Logger.log_message("info", "Only files added from now on are processed -- run the suffix tool once to catch up on existing files")
+
+            if __inotify is not None:
+                MediaWatcher.__watch_inotify(__inotify, __watch_dirs, action, debounce)
+            else:
+                MediaWatcher.__watch_polling(__watch_dirs, action, debounce, poll_interval)
+
+        except KeyboardInterrupt:
+            Logger.log_message("info", "Watch mode interrupted")
+
+        finally:
+            if __inotify is not None:
+                __inotify.close()
+            os.close(MediaWatcher.__stop_read)
+            os.close(MediaWatcher.__stop_write)
+            MediaWatcher.__stop_read, MediaWatcher.__stop_write = None, None
+            RunStats.log_summary("Watch mode summary")
+
+    def stop() -> None:
+        '''
+        Stops a running watcher from another thread
+        '''
+        MediaWatcher.__stop_event.set()
+        if MediaWatcher.__stop_write is not None:
+            os.write(MediaWatcher.__stop_write, b"x")
+
+    def get_watch_dirs() -> list[str]:
+        '''
+        Returns the media type dirs of the target media dirs that have a configured suffix
+        '''
+        __suffix_map = ToolConfig.get_suffix_map()
+        __watch_dirs = []
+        for media_dir in ToolConfig.target_media_dirs:
+            try:
+                __watch_dirs.extend(entry.path for entry in MediaWalker.scan_subdirectories(media_dir) if entry.name in __suffix_map)
+            except OSError as e:
+                Logger.log_message("error", f"Unable to scan '{media_dir}': {e}")
+        return sorted(__watch_dirs)
+
+    def apply_batch(pending: dict[str, set[str]], action: str) -> tuple[int, int]:
+        '''
+        Applies `action` to the given new files ({media type dir: filenames}) and returns (renamed, failed) counts
+        '''
+        __pairs = []
+        for media_type_dir, names in pending.items():
+            # skipped names are already in the desired state or carry another media type's suffix -- this also ignores the events caused by the watcher's own renames
+            for planned in SuffixTool.classify_new_files(media_type_dir, names, action):
+                match planned.status:
+                    case SuffixTool.RENAME:
+                        __pairs.append((planned.src, planned.dst))
+                    case SuffixTool.COLLISION:
+                        RunStats.record_path(planned.src, RunStats.COLLIDED)
+                        if RunStats.is_file_detail_enabled():
+                            Logger.log_message("warning", f"Skipped '{planned.src}' -- '{planned.dst.name}' already exists")
+
+        if not __pairs:
+            return 0, 0
+
+        # an interrupted run (e.g. a crashed batch) is finished first -- beginning a new one would rotate it out of the journal
+        SuffixTool.resume_interrupted_run()
+        RenameJournal.begin(action)
+        try:
+            __counts = SuffixTool.apply_rename_plan(RenameJournal.journal_plan(__pairs), on_result=RenameJournal.record_result)
+            RenameJournal.end()
+            GamelistRewriter.update_from_last_run()
+        finally:
+            RenameJournal.close()
+
+        Logger.log_message("info", f"Watch batch: {__counts[0]} renamed, {__counts[1]} failed")
+        return __counts
+
+    def __watch_inotify(inotify: _Inotify, watch_dirs: list[str], action: str, debounce: float) -> None:
+        __file_mask = _Inotify.IN_CLOSE_WRITE | _Inotify.IN_MOVED_TO | _Inotify.IN_DELETE_SELF
+        for watch_dir in watch_dirs:
+            inotify.add_watch(watch_dir, __file_mask)
+
+        # also watch media dirs, to pick up media type dirs created after startup
+        __suffix_map = ToolConfig.get_suffix_map()
+        __media_dirs = {str(media_dir) for media_dir in ToolConfig.target_media_dirs}
+        for media_dir in __media_dirs:
+            inotify.add_watch(media_dir, _Inotify.IN_CREATE | _Inotify.IN_MOVED_TO)
+
+        # {media type dir: filenames} present once the watches were added, plus every name queued since -- after an event queue overflow,
+        # only names missing from it are new, so files that were there before the watcher started are never processed
+        __seen = {}
+        for watch_dir in watch_dirs:
+            try:
+                __seen[watch_dir] = MediaWatcher.__list_files(watch_dir)
+            except OSError:
+                __seen[watch_dir] = set()
+
+        __pending = {}
+        __last_event = 0.0
+        while not MediaWatcher.__stop_event.is_set():
+            # block indefinitely while idle; once files are pending, only until the debounce window closes
+            __timeout = None if not __pending else max(0.0, __last_event + debounce - time.monotonic())
+            __readable, _, _ = select.select([inotify.fd, MediaWatcher.__stop_read], [], [], __timeout)
+
+            if inotify.fd in __readable:
+                for path, name, mask in inotify.read_events():
+                    if path is None:
+                        # event queue overflowed -- some files may have been missed, so re-check every watched dir for names not seen before
+                        Logger.log_message("warning", "inotify event queue overflowed -- rechecking all watched directories for new files")
+                        for watch_dir in watch_dirs:
+                            try:
+                                __names = MediaWatcher.__list_files(watch_dir)
+                            except OSError:
+                                continue
+                            __new_names = __names - __seen.get(watch_dir, set())
+                            __seen[watch_dir] = __names
+                            if __new_names:
+                                __pending.setdefault(watch_dir, set()).update(__new_names)
+                    elif path in __media_dirs:
+                        if mask & _Inotify.IN_ISDIR and name in __suffix_map:
+                            __new_dir = os.path.join(path, name)
+                            inotify.add_watch(__new_dir, __file_mask)
+                            watch_dirs.append(__new_dir)
+                            # files may have landed before the watch was added
+                            __seen[__new_dir] = MediaWatcher.__list_files(__new_dir)
+                            __pending.setdefault(__new_dir, set()).update(__seen[__new_dir])
+                    elif not mask & (_Inotify.IN_ISDIR | _Inotify.IN_DELETE_SELF):
+                        __pending.setdefault(path, set()).add(name)
+                        __seen.setdefault(path, set()).add(name)
+                __last_event = time.monotonic()
+
+            if __pending and (time.monotonic() - __last_event >= debounce or MediaWatcher.__count(__pending) >= constants.WATCH_MAX_BATCH):
+                MediaWatcher.apply_batch(__pending, action)
+                __pending = {}
+
+    def __watch_polling(watch_dirs: list[str], action: str, debounce: float, poll_interval: float) -> None:
+        # {media type dir: (mtime_ns, filenames)} -- a dir is only listed again when its mtime changes
+        __known = {}
+        for watch_dir in watch_dirs:
+            try:
+                __known[watch_dir] = (os.stat(watch_dir).st_mtime_ns, MediaWatcher.__list_files(watch_dir))
+            except OSError:
+                continue
+
+        # media dirs are polled too, to pick up media type dirs created after startup
+        __suffix_map = ToolConfig.get_suffix_map()
+        __media_dir_mtimes = {}
+        for media_dir in ToolConfig.target_media_dirs:
+            try:
+                __media_dir_mtimes[str(media_dir)] = os.stat(media_dir).st_mtime_ns
+            except OSError:
+                continue
+
+        __pending = {}
+        __last_event = 0.0
+        while not MediaWatcher.__stop_event.is_set():
+            __timeout = poll_interval if not __pending else min(poll_interval, debounce)
+            if MediaWatcher.__stop_event.wait(__timeout):
+                break
+
+            for media_dir, mtime_ns in list(__media_dir_mtimes.items()):
+                try:
+                    __mtime_ns = os.stat(media_dir).st_mtime_ns
+                    if __mtime_ns == mtime_ns:
+                        continue
+                    __media_dir_mtimes[media_dir] = __mtime_ns
+                    for entry in MediaWalker.scan_subdirectories(media_dir):
+                        # a new dir starts out empty, so every file found in it on the next pass is new
+                        if entry.name in __suffix_map and entry.path not in __known:
+                            __known[entry.path] = (0, set())
+                except OSError:
+                    continue
+
+            for watch_dir, (mtime_ns, names) in list(__known.items()):
+                try:
+                    __mtime_ns = os.stat(watch_dir).st_mtime_ns
+                    if __mtime_ns == mtime_ns:
+                        continue
+                    __names = MediaWatcher.__list_files(watch_dir)
+                except OSError:
+                    continue
+
+                __known[watch_dir] = (__mtime_ns, __names)
+                __new_names = __names - names
+                if __new_names:
+                    __pending.setdefault(watch_dir, set()).update(__new_names)
+                    __last_event = time.monotonic()
+
+            if __pending and (time.monotonic() - __last_event >= debounce or MediaWatcher.__count(__pending) >= constants.WATCH_MAX_BATCH):
+                # files that are still being written are picked up on a later poll, once their mtime has settled
+                __ready = MediaWatcher.__pop_settled(__pending, debounce)
+                if __ready:
+                    MediaWatcher.apply_batch(__ready, action)
+
+    def __pop_settled(pending: dict[str, set[str]], debounce: float) -> dict[str, set[str]]:
+        __ready = {}
+        __settled_before = time.time_ns() - int(debounce * 1e9)
+        for watch_dir, names in list(pending.items()):
+            for name in list(names):
+                try:
+                    if os.stat(os.path.join(watch_dir, name)).st_mtime_ns > __settled_before:
+                        continue
+                except FileNotFoundError:
+                    pass
+                names.discard(name)
+                __ready.setdefault(watch_dir, set()).add(name)
+            if not names:
+                del pending[watch_dir]
+        return __ready
+
+    def __list_files(directory: str) -> set[str]:
+        return {entry.name for entry in MediaWalker.scan_media_files(directory)}
+
+    def __count(pending: dict[str, set[str]]) -> int:
+        return sum(len(names) for names in pending.values())
@@ -0,0 +1,268 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+import os
+from pathlib import Path
+import struct
+import threading
+import time
+from typing import Iterable
+import zlib
+
+from common import constants
+from common.Singleton import Singleton
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+from utils.RunStats import RunStats
+
+class PngRecompressor(metaclass=Singleton):
+    '''
+    Optional output stage that writes smaller PNGs into the output directory, using only the standard library
+
+    IDAT data is re-deflated at a higher zlib level and ancillary chunks are stripped, except those needed to render the image correctly (transparency,
+    animation, colour space and gamma), so only metadata such as text, timestamps and physical size is dropped
+    Pixel data and scanline filters are left untouched, so the output decodes to exactly the same image
+
+    Each file is streamed through a fixed-size read buffer and a bounded inflate window, so memory per worker does not grow with image size
+
+    Workers are started with `PROCESS_START_METHOD` ("spawn") rather than forked, since the run already has logger, progress and I/O threads whose locks
+    a forked child could inherit mid-use
+    '''
+    RECOMPRESSED = "recompressed"
+    COPIED = "copied"               # recompressed output was not smaller, so the original bytes were kept
+    UP_TO_DATE = "up to date"
+    FAILED = "failed"
+
+    PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+    # ancillary chunks that change how the image renders -- transparency, animation (APNG), and colour space / gamma (dropping these shifts colours)
+    KEEP_ANCILLARY_CHUNKS = frozenset({
+        b"tRNS", b"acTL", b"fcTL", b"fdAT",
+        b"gAMA", b"sRGB", b"iCCP", b"cHRM", b"sBIT", b"cICP", b"mDCV", b"cLLI",
+    })
+
+    __lock = threading.Lock()
+    __executor = None
+    __in_flight = None
+    __level = constants.PNG_COMPRESSION_LEVEL
+    __workers = {}              # worker pid -> [files, bytes in, bytes out, busy seconds]
+
+    def recompress_files(pairs: Iterable[tuple[Path, Path]], max_workers: int | None=None, level: int=constants.PNG_COMPRESSION_LEVEL) -> dict[int, list[float]]:
+        '''
+        Recompresses (src, dst) PNG pairs on a process pool and returns per-worker totals as {worker pid: [files, bytes in, bytes out, busy seconds]}
+
+        At most `max_workers * 2` files are queued at once, so `pairs` is consumed lazily
+        '''
+        PngRecompressor.start(max_workers, level)
+        try:
+            for src, dst in pairs:
+                PngRecompressor.submit(src, dst)
+        finally:
+            __workers = PngRecompressor.finish()
+        return __workers
+
+    def start(max_workers: int | None=None, level: int=constants.PNG_COMPRESSION_LEVEL) -> None:
+        '''
+        Starts the process pool, so pairs can be `submit()`ted as they are planned (e.g. while the rest of an export is still running)
+        '''
+        __max_workers = max_workers or os.cpu_count() or 1
+        PngRecompressor.__in_flight = threading.BoundedSemaphore(__max_workers * 2)
+        PngRecompressor.__level = level
+        PngRecompressor.__workers = {}
+        PngRecompressor.__executor = ProcessPoolExecutor(max_workers=__max_workers, mp_context=multiprocessing.get_context(constants.PROCESS_START_METHOD))
+
+    def submit(src: Path, dst: Path) -> None:
+        '''
+        Queues one (src, dst) pair on the started pool, blocking while `max_workers * 2` files are already queued
+        '''
+        PngRecompressor.__in_flight.acquire()
+        try:
+            __future = PngRecompressor.__executor.submit(PngRecompressor.recompress_file, str(src), str(dst), PngRecompressor.__level)
+        except BaseException:
+            PngRecompressor.__in_flight.release()
+            raise
+        __future.add_done_callback(lambda future: PngRecompressor.__on_done(src, future))
+
+    def finish() -> dict[int, list[float]]:
+        '''
+        Waits for every submitted pair, shuts the pool down and returns the per-worker totals
+        '''
+        if PngRecompressor.__executor is not None:
+            PngRecompressor.__executor.shutdown(wait=True)
+            PngRecompressor.__executor = None
+        return PngRecompressor.__workers
+
+    def __on_done(src: Path, future: Future) -> None:
+        try:
+            __status, __bytes_in, __bytes_out, __pid, __seconds, __error = future.result()
+        except Exception as e:
+            __status, __bytes_in, __bytes_out, __pid, __seconds, __error = PngRecompressor.FAILED, 0, 0, 0, 0.0, str(e)
+        finally:
+            PngRecompressor.__in_flight.release()
+
+        match __status:
+            case PngRecompressor.UP_TO_DATE:
+                RunStats.record_path(src, RunStats.SKIPPED)
+            case PngRecompressor.FAILED:
+                RunStats.record_path(src, RunStats.FAILED)
+                Logger.log_message("error", f"Unable to recompress '{src}': {__error}")
+            case _:
+                with PngRecompressor.__lock:
+                    __totals = PngRecompressor.__workers.setdefault(__pid, [0, 0, 0, 0.0])
+                    __totals[0] += 1
+                    __totals[1] += __bytes_in
+                    __totals[2] += __bytes_out
+                    __totals[3] += __seconds
+                RunStats.record_path(src, RunStats.EXPORTED, __bytes_out)
+
+    def recompress_file(src: str, dst: str, level: int=constants.PNG_COMPRESSION_LEVEL) -> tuple[str, int, int, int, float, str]:
+        '''
+        Recompresses a single PNG into `dst` and returns (status, bytes in, bytes out, worker pid, busy seconds, error message)
+
+        Runs inside pool worker processes, so it reports errors through its return value rather than the logger
+        '''
+        __start = time.perf_counter()
+        __tmp = dst + ".part"
+        try:
+            __src_stat = os.stat(src)
+            if PngRecompressor.__is_up_to_date(__src_stat, dst):
+                return PngRecompressor.UP_TO_DATE, 0, 0, os.getpid(), time.perf_counter() - __start, ""
+
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            with open(src, "rb") as __src_file, open(__tmp, "wb") as __dst_file:
+                PngRecompressor.__rewrite_png(__src_file, __dst_file, level)
+
+            __status = PngRecompressor.RECOMPRESSED
+            # never make a file bigger -- fall back to the original bytes
+            if os.path.getsize(__tmp) >= __src_stat.st_size:
+                with open(src, "rb") as __src_file, open(__tmp, "wb") as __dst_file:
+                    while __block := __src_file.read(constants.PNG_READ_BLOCK_SIZE):
+                        __dst_file.write(__block)
+                __status = PngRecompressor.COPIED
+
+            # preserve source mtime so reruns can detect up to date output
+            os.utime(__tmp, ns=(__src_stat.st_atime_ns, __src_stat.st_mtime_ns))
+            os.replace(__tmp, dst)
+            return __status, __src_stat.st_size, os.path.getsize(dst), os.getpid(), time.perf_counter() - __start, ""
+
+        except Exception as e:
+            try:
+                os.remove(__tmp)
+            except OSError:
+                pass
+            return PngRecompressor.FAILED, 0, 0, os.getpid(), time.perf_counter() - __start, str(e)
+
+    def log_summary(workers: dict[int, list[float]]) -> None:
+        Logger.log_message("info", Formatter.generate_header("PNG Recompression Summary", capitalize=False))
+        if not workers:
+            Logger.log_message("result", "No PNG files recompressed")
+            return
+
+        __labels = {pid: f"Worker {pid}" for pid in workers}
+        __longest_label = max(len(label) for label in __labels.values())
+        for pid, (files, bytes_in, bytes_out, seconds) in sorted(workers.items()):
+            Logger.log_message("info", f"{Formatter.pad_field_label(__labels[pid], __longest_label, symbol=':')} {files} file(s), {PngRecompressor.__format_savings(bytes_in, bytes_out)}, {bytes_in / 1_048_576 / max(seconds, 1e-9):.1f} MiB/s")
+
+        __files, __bytes_in, __bytes_out = (sum(totals[i] for totals in workers.values()) for i in range(3))
+        Logger.log_message("result", f"Recompressed {__files} PNG file(s): {PngRecompressor.__format_savings(__bytes_in, __bytes_out)}")
+
+    def __format_savings(bytes_in: int, bytes_out: int) -> str:
+        __saved = bytes_in - bytes_out
+        return f"{bytes_in / 1_048_576:.1f} MiB -> {bytes_out / 1_048_576:.1f} MiB ({__saved / 1_048_576:.1f} MiB saved, {__saved / max(bytes_in, 1):.1%})"
+
+    def __is_up_to_date(src_stat: os.stat_result, dst: str) -> bool:
+        try:
+            __dst_stat = os.stat(dst)
+        except FileNotFoundError:
+            return False
+
+        # output carries the source mtime and is never larger than the source
+        return __dst_stat.st_mtime_ns == src_stat.st_mtime_ns and __dst_stat.st_size <= src_stat.st_size
+
+    def __rewrite_png(src_file, dst_file, level: int) -> None:
+        if src_file.read(len(PngRecompressor.PNG_SIGNATURE)) != PngRecompressor.PNG_SIGNATURE:
+            raise ValueError("not a PNG file")
+        dst_file.write(PngRecompressor.PNG_SIGNATURE)
+
+        __inflater = None
+        __deflater = None
+        __pending_idat = bytearray()
+
+        while True:
+            __header = src_file.read(8)
+            if len(__header) < 8:
+                raise ValueError("truncated PNG -- missing IEND chunk")
+            __length, __chunk_type = struct.unpack(">I4s", __header)
+
+            # the consecutive IDAT chunks form one zlib stream -- flush it once the run of IDAT chunks ends
+            if __chunk_type != b"IDAT" and __deflater is not None:
+                if not __inflater.eof:
+                    raise ValueError("truncated image data")
+                __pending_idat += __deflater.flush()
+                PngRecompressor.__write_idat(dst_file, __pending_idat, final=True)
+                __deflater = None
+
+            if __chunk_type == b"IDAT":
+                if __inflater is None:
+                    __inflater = zlib.decompressobj()
+                    __deflater = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, 9)
+                elif __deflater is None:
+                    raise ValueError("IDAT chunks are not consecutive")
+
+                __crc = zlib.crc32(__chunk_type)
+                for __block in PngRecompressor.__read_chunk_data(src_file, __length):
+                    __crc = zlib.crc32(__block, __crc)
+                    __pending_idat += PngRecompressor.__reinflate(__inflater, __deflater, __block)
+                    PngRecompressor.__write_idat(dst_file, __pending_idat)
+                PngRecompressor.__check_crc(src_file, __crc, __chunk_type)
+
+            elif __chunk_type[0] & 0x20 and __chunk_type not in PngRecompressor.KEEP_ANCILLARY_CHUNKS:
+                # ancillary chunk (lowercase first letter) -- skip over it
+                src_file.seek(__length + 4, os.SEEK_CUR)
+
+            else:
+                # critical chunk, or one of the kept ancillary chunks -- copy unchanged
+                dst_file.write(__header)
+                __crc = zlib.crc32(__chunk_type)
+                for __block in PngRecompressor.__read_chunk_data(src_file, __length):
+                    __crc = zlib.crc32(__block, __crc)
+                    dst_file.write(__block)
+                PngRecompressor.__check_crc(src_file, __crc, __chunk_type)
+                dst_file.write(struct.pack(">I", __crc))
+
+                if __chunk_type == b"IEND":
+                    return
+
+    def __read_chunk_data(src_file, length: int):
+        __remaining = length
+        while __remaining:
+            __block = src_file.read(min(__remaining, constants.PNG_READ_BLOCK_SIZE))
+            if not __block:
+                raise ValueError("truncated chunk")
+            __remaining -= len(__block)
+            yield __block
+
+    def __check_crc(src_file, crc: int, chunk_type: bytes) -> None:
+        __stored = src_file.read(4)
+        if len(__stored) < 4 or struct.unpack(">I", __stored)[0] != crc:
+            raise ValueError(f"bad CRC in {chunk_type.decode('latin-1')} chunk")
+
+    def __reinflate(inflater, deflater, data: bytes) -> bytes:
+        # inflate at most PNG_INFLATE_LIMIT bytes at a time, so a highly compressed IDAT cannot expand unbounded in memory
+        __output = bytearray()
+        __data = data
+        __limit = constants.PNG_INFLATE_LIMIT
+        while True:
+            __raw = inflater.decompress(__data, __limit)
+            __output += deflater.compress(__raw)
+            __data = inflater.unconsumed_tail
+            # a full output window may leave more data buffered in the inflater even once all input is consumed
+            if not __data and len(__raw) < __limit:
+                return bytes(__output)
+
+    def __write_idat(dst_file, pending: bytearray, final: bool=False) -> None:
+        # emit full-size IDAT chunks as compressed data accumulates; the remainder is only written with the final chunk
+        __chunk_size = constants.PNG_IDAT_CHUNK_SIZE
+        while len(pending) >= __chunk_size or (final and pending):
+            __data = bytes(pending[:__chunk_size])
+            del pending[:__chunk_size]
+            dst_file.write(struct.pack(">I", len(__data)) + b"IDAT" + __data + struct.pack(">I", zlib.crc32(__data, zlib.crc32(b"IDAT"))))
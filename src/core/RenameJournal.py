@@ -0,0 +1,170 @@
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Iterable, Iterator, NamedTuple
+
+from common import constants
+from common.Singleton import Singleton
+from utils.Logger import Logger
+
+class JournalRun(NamedTuple):
+    run_id: str
+    action: str                     # suffix action, or "undo"
+    undoes: str | None              # run id reversed by an undo run
+    planned: list[tuple[Path, Path]]
+    done: list[tuple[Path, Path]]
+    failed: list[tuple[Path, Path]]
+    complete: bool                  # False if the run was interrupted before it ended
+
+class RenameJournal(metaclass=Singleton):
+    '''
+    Append-only JSON lines journal of planned and completed renames, stored next to the event log
+
+    Planned renames are written and fsynced in batches before any of them are applied, so after a crash every rename that may have happened is in the journal
+    Completed renames are fsynced in batches too -- a planned rename without a "done" entry is resolved from the filesystem when the run is resumed
+
+    Only the latest run is kept; the journal is rotated when a new run begins
+    '''
+    BEGIN = "begin"
+    PLAN = "plan"
+    DONE = "done"
+    FAILED = "failed"
+    END = "end"
+
+    UNDO = "undo"
+
+    __lock = threading.Lock()
+    __journal_file = None
+    __unsynced = 0
+
+    def get_journal_path() -> Path:
+        __log_path = Logger.get_log_path()
+        return (__log_path.parent if __log_path is not None else Path(".")) / constants.RENAME_JOURNAL_FILE
+
+    def begin(action: str, undoes: str | None=None) -> str:
+        '''
+        Starts a new run in a fresh journal (the previous one is kept as "<journal>.prev") and returns its run id
+        '''
+        __journal_path = RenameJournal.get_journal_path()
+        RenameJournal.close()
+        if __journal_path.exists():
+            os.replace(__journal_path, __journal_path.with_name(__journal_path.name + ".prev"))
+
+        __run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        RenameJournal.__open(__journal_path)
+        RenameJournal.__write({"op": RenameJournal.BEGIN, "run": __run_id, "action": action, "undoes": undoes}, sync=True)
+        return __run_id
+
+    def reopen() -> None:
+        '''
+        Continues appending to the existing journal, e.g. to resume an interrupted run
+        '''
+        RenameJournal.close()
+        __journal_path = RenameJournal.get_journal_path()
+
+        # drop a torn final line left by a crash mid-write, so appended entries stay readable
+        with open(__journal_path, "rb+") as __journal:
+            __data = __journal.read()
+            if __data and not __data.endswith(b"\n"):
+                __journal.truncate(__data.rfind(b"\n") + 1)
+
+        RenameJournal.__open(__journal_path)
+
+    def journal_plan(plan: Iterable[tuple[Path, Path]]) -> Iterator[tuple[Path, Path]]:
+        '''
+        Passes (src, dst) pairs through, journaling and fsyncing each batch before any pair of that batch is yielded
+        '''
+        __batch = []
+        for src, dst in plan:
+            __batch.append((src, dst))
+            if len(__batch) >= constants.JOURNAL_FSYNC_BATCH:
+                yield from RenameJournal.__commit_plan_batch(__batch)
+                __batch = []
+        yield from RenameJournal.__commit_plan_batch(__batch)
+
+    def record_result(src: Path, dst: Path, renamed: bool) -> None:
+        # called from rename worker threads
+        RenameJournal.__write({"op": RenameJournal.DONE if renamed else RenameJournal.FAILED, "src": str(src), "dst": str(dst)})
+
+    def end() -> None:
+        RenameJournal.__write({"op": RenameJournal.END}, sync=True)
+        RenameJournal.close()
+
+    def close() -> None:
+        with RenameJournal.__lock:
+            if RenameJournal.__journal_file is None:
+                return
+            RenameJournal.__sync()
+            RenameJournal.__journal_file.close()
+            RenameJournal.__journal_file = None
+
+    def read_last_run() -> JournalRun | None:
+        '''
+        Returns the run recorded in the journal, or None if there is no journal
+        '''
+        __journal_path = RenameJournal.get_journal_path()
+        if not __journal_path.exists():
+            return None
+
+        __run = None
+        __planned, __done, __failed = {}, {}, {}
+        __complete = False
+        with open(__journal_path, "r", encoding="utf-8") as __journal:
+            for line in __journal:
+                try:
+                    __entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # a torn final line from a crash mid-write
+                    break
+
+                match __entry["op"]:
+                    case RenameJournal.BEGIN:
+                        __run = __entry
+                        __planned, __done, __failed = {}, {}, {}
+                        __complete = False
+                    case RenameJournal.PLAN:
+                        __planned[__entry["src"]] = __entry["dst"]
+                    case RenameJournal.DONE:
+                        __done[__entry["src"]] = __entry["dst"]
+                    case RenameJournal.FAILED:
+                        __failed[__entry["src"]] = __entry["dst"]
+                    case RenameJournal.END:
+                        __complete = True
+
+        if __run is None:
+            return None
+
+        __to_paths = lambda pairs: [(Path(src), Path(dst)) for src, dst in pairs.items()]
+        return JournalRun(__run["run"], __run["action"], __run.get("undoes"), __to_paths(__planned), __to_paths(__done), __to_paths(__failed), __complete)
+
+    def __commit_plan_batch(batch: list[tuple[Path, Path]]) -> list[tuple[Path, Path]]:
+        with RenameJournal.__lock:
+            if RenameJournal.__journal_file is None:
+                return batch
+            for src, dst in batch:
+                RenameJournal.__journal_file.write(json.dumps({"op": RenameJournal.PLAN, "src": str(src), "dst": str(dst)}) + "\n")
+            RenameJournal.__sync()
+        return batch
+
+    def __open(journal_path: Path) -> None:
+        journal_path.parent.mkdir(parents=True, exist_ok=True)
+        with RenameJournal.__lock:
+            RenameJournal.__journal_file = open(journal_path, "a", encoding="utf-8")
+            RenameJournal.__unsynced = 0
+
+    def __write(entry: dict, sync: bool=False) -> None:
+        with RenameJournal.__lock:
+            if RenameJournal.__journal_file is None:
+                return
+            RenameJournal.__journal_file.write(json.dumps(entry) + "\n")
+            RenameJournal.__unsynced += 1
+            if sync or RenameJournal.__unsynced >= constants.JOURNAL_FSYNC_BATCH:
+                RenameJournal.__sync()
+
+    def __sync() -> None:
+        # caller must hold the journal lock
+        RenameJournal.__journal_file.flush()
+        os.fsync(RenameJournal.__journal_file.fileno())
+        RenameJournal.__unsynced = 0
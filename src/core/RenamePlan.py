@@ -0,0 +1,191 @@
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from common import constants
+from common.Singleton import Singleton
+from config_loaders.ToolConfig import ToolConfig
+from core.GamelistRewriter import GamelistRewriter
+from core.RenameJournal import RenameJournal
+from core.SuffixTool import SuffixTool
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+from utils.RunStats import RunStats
+
+class RenamePlan(metaclass=Singleton):
+    '''
+    Dry-run planner for the suffix tool
+
+    A plan is built from a single directory scan and streamed to a CSV or JSON lines file row by row, so it never has to be held in memory
+    A saved plan can later be applied with `apply()`, which renames exactly the planned files without scanning the library again
+    '''
+    FIELDS = ("action", "console", "media_type", "status", "src", "dst", "size")
+    APPLY_ACTION = "apply plan"         # journal action of an applied saved plan
+
+    # summary counter columns
+    __STATUSES = (SuffixTool.RENAME, SuffixTool.SKIP, SuffixTool.COLLISION)
+    __BYTES = len(__STATUSES)
+
+    def run(action: str | None=None, plan_path: Path | None=None, include_sizes: bool | None=None, on_summary: Callable[[dict[tuple[str, str], list[int]]], None] | None=None) -> Path | None:
+        '''
+        Dry run of the suffix tool -- saves the plan (defaults to the output dir) and logs what would happen, without renaming anything
+
+        `on_summary(summary)` is called with the per (console, media type) counters of `write()` once the plan is saved
+        Returns the saved plan path, or None if planning failed
+        '''
+        # default to configured "suffix_action"
+        if action is None:
+            action = ToolConfig.get_suffix_action()
+
+        if plan_path is None:
+            plan_path = Path(ToolConfig.output_dir or ".") / constants.RENAME_PLAN_FILE
+
+        Logger.log_message("info", f"Planning suffix tool dry run -- action set to: {action} target suffix")
+        try:
+            if not ToolConfig.target_media_dirs:
+                Logger.log_message("error", "No target media directories identified -- run config validation before planning a dry run")
+                return None
+
+            __summary = RenamePlan.write(action, plan_path, include_sizes=include_sizes)
+            RenamePlan.log_summary(__summary)
+            if on_summary is not None:
+                on_summary(__summary)
+            Logger.log_message("result", f"Rename plan saved to '{plan_path}'")
+            return Path(plan_path)
+
+        except Exception as e:
+            Logger.log_message("critical", f"RenamePlan.run() has failed: {e}")
+            return None
+
+    def write(action: str, plan_path: Path, media_dirs: Iterable[Path] | None=None, include_sizes: bool | None=None) -> dict[tuple[str, str], list[int]]:
+        '''
+        Plans `action` for every target media file, streams each planned operation to `plan_path` and returns the per (console, media type) summary
+
+        File sizes cost one stat per file on most platforms, so they are only collected when `include_sizes` is True (defaults to the configured "count_bytes" setting)
+
+        The file format is taken from the `plan_path` extension: ".csv", otherwise JSON lines
+        '''
+        if include_sizes is None:
+            include_sizes = ToolConfig.is_byte_counting_enabled()
+
+        __plan_path = Path(plan_path)
+        __plan_path.parent.mkdir(parents=True, exist_ok=True)
+        __summary = {}
+
+        with open(__plan_path, "w", newline="", encoding="utf-8") as __plan_file:
+            __write_row = RenamePlan.__get_row_writer(__plan_file, RenamePlan.__get_format(__plan_path))
+
+            # dry run never reads or writes the file index, so the plan reflects the library as it is on disk
+            for planned in SuffixTool.iter_planned_renames(action, media_dirs):
+                __size = planned.entry.stat().st_size if include_sizes else 0
+
+                __counter = __summary.get((planned.console, planned.media_type))
+                if __counter is None:
+                    __counter = __summary[(planned.console, planned.media_type)] = [0] * (len(RenamePlan.__STATUSES) + 1)
+                __counter[RenamePlan.__STATUSES.index(planned.status)] += 1
+                __counter[RenamePlan.__BYTES] += __size
+
+                __write_row({
+                    "action": action,
+                    "console": planned.console,
+                    "media_type": planned.media_type,
+                    "status": planned.status,
+                    "src": str(planned.src),
+                    "dst": str(planned.dst) if planned.dst is not None else "",
+                    "size": __size if include_sizes else "",
+                })
+
+        return __summary
+
+    def read(plan_path: Path) -> Iterator[dict]:
+        '''
+        Lazily yields the rows of a saved plan
+        '''
+        __plan_path = Path(plan_path)
+        with open(__plan_path, "r", newline="", encoding="utf-8") as __plan_file:
+            if RenamePlan.__get_format(__plan_path) == "csv":
+                yield from csv.DictReader(__plan_file)
+            else:
+                for line in __plan_file:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def apply(plan_path: Path, max_workers: int=constants.RENAME_MAX_WORKERS) -> tuple[int, int] | None:
+        '''
+        Applies the "rename" rows of a saved plan and returns (renamed, failed) counts, or None if the plan could not be applied (e.g. it is unreadable)
+
+        Rows whose source has since disappeared, or whose destination now exists, are left alone and counted as failed or collided
+        '''
+        RunStats.reset(aggregate=ToolConfig.is_aggregate_logging_enabled(), file_details=ToolConfig.is_file_detail_logging_enabled(), progress_interval=ToolConfig.get_progress_interval())
+
+        try:
+            # an interrupted run is finished first -- beginning a new one would rotate it out of the journal
+            if SuffixTool.resume_interrupted_run(max_workers=max_workers) is not None:
+                RunStats.reset(aggregate=ToolConfig.is_aggregate_logging_enabled(), file_details=ToolConfig.is_file_detail_logging_enabled(), progress_interval=ToolConfig.get_progress_interval())
+
+            Logger.log_message("info", f"Applying saved rename plan '{plan_path}'...")
+            # journaled like a normal run, so an interrupted apply can be resumed and an applied plan undone
+            RenameJournal.begin(RenamePlan.APPLY_ACTION)
+            __counts = SuffixTool.apply_rename_plan(RenameJournal.journal_plan(RenamePlan.__iter_applicable(plan_path)), max_workers=max_workers, on_result=RenameJournal.record_result)
+            RenameJournal.end()
+            GamelistRewriter.update_from_last_run()
+            RunStats.log_summary("Saved plan summary")
+            return __counts
+
+        except Exception as e:
+            Logger.log_message("critical", f"RenamePlan.apply() has failed: {e}")
+            return None
+
+        finally:
+            RenameJournal.close()
+
+    def log_summary(summary: dict[tuple[str, str], list[int]], title: str="Dry run summary") -> None:
+        __rows = sorted(summary.items())
+        __totals = [sum(counter[i] for _, counter in __rows) for i in range(len(RenamePlan.__STATUSES) + 1)]
+        __labels = [f"{console}/{media_type}" for (console, media_type), _ in __rows] + ["TOTAL"]
+        __longest_label = max(len(label) for label in __labels)
+
+        Logger.log_message("info", Formatter.generate_header(title))
+        for label, (_, counter) in zip(__labels, __rows):
+            Logger.log_message("info", f"{Formatter.pad_field_label(label, __longest_label)} {RenamePlan.__format_counter(counter)}")
+        Logger.log_message("result", f"{Formatter.pad_field_label('TOTAL', __longest_label)} {RenamePlan.__format_counter(__totals)}")
+
+    def __iter_applicable(plan_path: Path) -> Iterator[tuple[Path, Path]]:
+        for row in RenamePlan.read(plan_path):
+            if row["status"] != SuffixTool.RENAME:
+                continue
+
+            __src = Path(row["src"])
+            __dst = Path(row["dst"])
+
+            # the library may have changed since the plan was saved -- never overwrite or guess
+            if not os.path.exists(__src):
+                RunStats.record(row["console"], row["media_type"], RunStats.FAILED)
+                if RunStats.is_file_detail_enabled():
+                    Logger.log_message("warning", f"Skipped '{__src}' -- file no longer exists")
+                continue
+
+            if os.path.exists(__dst):
+                RunStats.record(row["console"], row["media_type"], RunStats.COLLIDED)
+                if RunStats.is_file_detail_enabled():
+                    Logger.log_message("warning", f"Skipped '{__src}' -- '{__dst.name}' already exists")
+                continue
+
+            yield __src, __dst
+
+    def __get_format(plan_path: Path) -> str:
+        return "csv" if Path(plan_path).suffix.lower() == ".csv" else "jsonl"
+
+    def __get_row_writer(plan_file, plan_format: str):
+        if plan_format == "csv":
+            __writer = csv.DictWriter(plan_file, fieldnames=RenamePlan.FIELDS)
+            __writer.writeheader()
+            return __writer.writerow
+
+        return lambda row: plan_file.write(json.dumps(row) + "\n")
+
+    def __format_counter(counter: list[int]) -> str:
+        __statuses = " | ".join(f"{status} {count:,}" for status, count in zip(RenamePlan.__STATUSES, counter[:RenamePlan.__BYTES]))
+        return f"{__statuses} | {counter[RenamePlan.__BYTES] / 1_048_576:,.1f} MiB"
@@ -0,0 +1,111 @@
+from typing import Iterable, Mapping, NamedTuple
+
+class SuffixMatch(NamedTuple):
+    stem: str                   # filename without extension or media type suffix
+    suffix: str                 # media type suffix the name carries, "" if none
+    media_type: str | None      # media type that `suffix` belongs to, None if no suffix
+    extension: str              # extension without the leading ".", "" if the name has none
+    is_target: bool             # extension is one of the target media file types
+
+class SuffixMatcher:
+    '''
+    Classifies filenames against every configured media type suffix at once, compiled once from "suffixes_by_media_type" and "target_media_file_types"
+
+    Suffixes are bucketed by length, so finding which suffix (if any) a stem ends with costs one set lookup per distinct suffix length instead of one `endswith` per (media type, suffix) pair
+    When one suffix ends with another (e.g. "-image" and "-bgimage"), the longest one wins
+    '''
+    __slots__ = ("__media_types_by_suffix", "__suffix_lengths", "__suffixes", "__file_types")
+
+    def __init__(self, suffixes_by_media_type: Mapping[str, str], file_types: Iterable[str]):
+        # media types with an empty suffix can never be matched, so they are left out
+        self.__suffixes = {media_type: suffix for media_type, suffix in suffixes_by_media_type.items() if suffix}
+        self.__media_types_by_suffix = {}
+        for media_type, suffix in self.__suffixes.items():
+            # first media type configured with a suffix claims it
+            self.__media_types_by_suffix.setdefault(suffix, media_type)
+
+        self.__suffix_lengths = tuple(sorted({len(suffix) for suffix in self.__media_types_by_suffix}, reverse=True))
+        self.__file_types = frozenset(file_type.lower().lstrip(".") for file_type in file_types)
+
+    def classify(self, filename: str) -> SuffixMatch:
+        __stem, __dot, __extension = filename.rpartition(".")
+        if not __dot:
+            __stem, __extension = filename, ""
+
+        for length in self.__suffix_lengths:
+            if len(__stem) < length:
+                continue
+            __media_type = self.__media_types_by_suffix.get(__stem[-length:])
+            if __media_type is not None:
+                return SuffixMatch(__stem[:-length], __stem[-length:], __media_type, __extension, __extension.lower() in self.__file_types)
+
+        return SuffixMatch(__stem, "", None, __extension, __extension.lower() in self.__file_types)
+
+    def classify_batch(self, filenames: Iterable[str]) -> list[SuffixMatch]:
+        __classify = self.classify
+        return [__classify(filename) for filename in filenames]
+
+    def get_media_types(self, filenames: Iterable[str]) -> list[str | None]:
+        '''
+        Batch lookup of which media type's suffix each name carries (None if none), without building full `SuffixMatch` results
+        '''
+        __lengths = self.__suffix_lengths
+        __media_types_by_suffix = self.__media_types_by_suffix
+        __media_types = []
+        __append = __media_types.append
+
+        for filename in filenames:
+            __stem, __dot, __extension = filename.rpartition(".")
+            if not __dot:
+                __stem = filename
+            __media_type = None
+            for length in __lengths:
+                __media_type = __media_types_by_suffix.get(__stem[-length:])
+                if __media_type is not None:
+                    break
+            __append(__media_type)
+
+        return __media_types
+
+    def get_target_name(self, filename: str, media_type: str, action: str) -> str | None:
+        '''
+        Returns the name `filename` should have after applying `action` ("add" or "remove") for `media_type`, or None if it is already in that state
+
+        Safe to rerun -- "add" never stacks a second suffix onto an already suffixed name, and "remove" leaves unsuffixed names alone
+        A name carrying another media type's suffix (e.g. "Game-image.png" in covers) is left alone by both actions
+        '''
+        return self.get_target_names((filename,), media_type, action)[0]
+
+    def get_target_names(self, filenames: Iterable[str], media_type: str, action: str) -> list[str | None]:
+        '''
+        Batch form of `get_target_name` -- names are matched against every suffix in one pass with `classify_batch`, so the longest suffix wins
+        '''
+        if action not in ("add", "remove"):
+            raise ValueError(f"Invalid suffix action '{action}' -- expected 'add' or 'remove'")
+
+        __suffix = self.__suffixes.get(media_type)
+        if __suffix is None:
+            return [None for _ in filenames]
+
+        __target_names = []
+        __append = __target_names.append
+
+        for match in self.classify_batch(filenames):
+            if not match.extension or (match.suffix and match.suffix != __suffix):
+                __append(None)
+            elif action == "add":
+                __append(None if match.suffix else f"{match.stem}{__suffix}.{match.extension}")
+            # a name that is only the suffix (e.g. "-thumb.png") has no stem to keep
+            elif match.suffix and match.stem:
+                __append(f"{match.stem}.{match.extension}")
+            else:
+                __append(None)
+
+        return __target_names
+
+    def get_suffix(self, media_type: str) -> str | None:
+        return self.__suffixes.get(media_type)
+
+    def is_target_file(self, filename: str) -> bool:
+        __stem, __dot, __extension = filename.rpartition(".")
+        return bool(__dot) and __extension.lower() in self.__file_types
@@ -1,18 +1,631 @@
 import os
 from pathlib import Path
+import tempfile
+import threading
+from typing import Callable, Iterable, Iterator, NamedTuple
 
+from common import constants
 from common.Singleton import Singleton
 from config_loaders.ToolConfig import ToolConfig
+from core.AdaptiveExecutor import AdaptiveExecutor
+from core.FileIndex import FileIndex
+from core.GamelistRewriter import GamelistRewriter
+from core.MediaDeduplicator import MediaDeduplicator
+from core.MediaExporter import MediaExporter
+from core.MediaInventory import MediaInventory
+from core.MediaRules import MediaRules
+from core.MediaWalker import MediaWalker
+from core.PngRecompressor import PngRecompressor
+from core.RenameJournal import JournalRun, RenameJournal
+from core.SuffixMatcher import SuffixMatch, SuffixMatcher
+from core.WorkScheduler import WorkScheduler
+from utils.Formatter import Formatter
 from utils.Logger import Logger
+from utils.RunProfiler import RunProfiler
+from utils.RunStats import RunStats
+from utils.TestTime import TestTime
+
+class PlannedRename(NamedTuple):
+    console: str
+    media_type: str
+    status: str                 # "rename", "skip" (already in desired state) or "collision"
+    src: Path
+    dst: Path | None
+    entry: os.DirEntry | None   # None when planned from a `MediaInventory`
 
 class SuffixTool(metaclass=Singleton):
-    def run_tool(action: str="append") -> None:
+    RENAME = "rename"
+    SKIP = "skip"
+    COLLISION = "collision"
+
+    def run_tool(action: str | None=None, max_workers: int=constants.RENAME_MAX_WORKERS, incremental: bool=True) -> bool:
+        '''
+        Runs the suffix tool, then logs a timing summary of the spans recorded since the last run (including config load and validation) and writes them as a Chrome trace next to the event log
+
+        Returns False if the run could not start or failed part way (files that failed are counted in `RunStats` instead), True otherwise
+        With "profile_run" enabled, the run is also profiled with cProfile
+        '''
+        with RunProfiler.profile(ToolConfig.is_run_profiling_enabled()):
+            with TestTime.span("suffix tool", action=action or ToolConfig.get_suffix_action()):
+                __completed = SuffixTool.__run_tool(action, max_workers, incremental)
+
+        RunProfiler.log_span_summary()
+        RunProfiler.write_trace()
+        TestTime.reset_spans()
+        return __completed
+
+    def __run_tool(action: str | None, max_workers: int, incremental: bool) -> bool:
+        # default to configured "suffix_action"
+        if action is None:
+            action = ToolConfig.get_suffix_action()
+
         Logger.log_message("info", "Running suffix tool...")
         Logger.log_message("info", f"Tool action set to: {action} target suffix")
+        RunStats.reset(aggregate=ToolConfig.is_aggregate_logging_enabled(), file_details=ToolConfig.is_file_detail_logging_enabled(), progress_interval=ToolConfig.get_progress_interval())
 
         try:
-            _console_dir = ToolConfig.get_consoles_dir()
-            for console in _console_dir.glob(""):
+            if not ToolConfig.target_media_dirs:
+                Logger.log_message("error", "No target media directories identified -- run config validation before running the suffix tool")
+                return False
+
+            # per rule name: [skipped, flagged]
+            __rule_counts = {}
+
+            # write suffixed copies into the output dir instead of renaming media in place
+            if ToolConfig.is_export_to_output_dir_enabled():
+                # byte-identical sources are exported once and their other copies hardlinked to it afterwards
+                __inventory = None
+                __group_ids = {}
+                __duplicate_pairs = []
+                __canonical_dsts = {}
+                if ToolConfig.is_output_dedupe_enabled():
+                    # file index caches content hashes between runs
+                    FileIndex.open(ToolConfig.output_dir)
+                    # the duplicate search needs every size before exporting starts, so the media dirs are listed once into an inventory that also drives the export plan
+                    with TestTime.span("inventory"):
+                        __inventory = MediaInventory.scan(ToolConfig.target_media_dirs, ToolConfig.get_target_media_file_types())
+                    with TestTime.span("find duplicates"):
+                        __duplicate_groups = MediaDeduplicator.find_duplicates(ToolConfig.target_media_dirs, inventory=__inventory)
+                    MediaDeduplicator.log_groups(__duplicate_groups)
+                    __group_ids = MediaDeduplicator.map_groups(__duplicate_groups)
+
+                __export_plan = SuffixTool.__apply_media_rules(SuffixTool.build_export_plan(action, ToolConfig.output_dir, inventory=__inventory), __rule_counts)
+                if ToolConfig.is_output_dedupe_enabled():
+                    __export_plan = MediaDeduplicator.split_duplicate_pairs(__export_plan, __group_ids, __duplicate_pairs, __canonical_dsts)
+
+                # PNGs are taken out of the plain export and handed to the recompression process pool as they are planned, so both stages overlap
+                if ToolConfig.is_png_recompression_enabled():
+                    PngRecompressor.start(level=ToolConfig.get_png_compression_level())
+                    __export_plan = SuffixTool.__split_png_pairs(__export_plan)
+
+                try:
+                    # the export plan is streamed, so this span includes scanning and planning
+                    with TestTime.span("plan + export"):
+                        __export_summary = MediaExporter.export_files(__export_plan, max_workers=max_workers, adaptive_max_workers=ToolConfig.get_adaptive_io_max_workers())
+
+                finally:
+                    if ToolConfig.is_png_recompression_enabled():
+                        # only waits for the PNGs still queued once the rest of the export is done
+                        with TestTime.span("recompress png"):
+                            __recompress_summary = PngRecompressor.finish()
+                MediaExporter.log_summary(__export_summary)
+                if ToolConfig.is_png_recompression_enabled():
+                    PngRecompressor.log_summary(__recompress_summary)
+
+                if ToolConfig.is_output_dedupe_enabled():
+                    with TestTime.span("link duplicates"):
+                        __dedupe_summary = MediaDeduplicator.link_duplicates(__duplicate_pairs, __group_ids, __canonical_dsts)
+                    MediaDeduplicator.log_summary(__dedupe_summary)
+                MediaRules.log_summary(__rule_counts)
+                RunStats.log_summary("Suffix tool export summary")
+                return True
+
+            # finish an interrupted run from its journal before planning anything new
+            if SuffixTool.resume_interrupted_run(max_workers=max_workers) is not None:
+                Logger.log_message("info", "Run the suffix tool again to process any other changes")
+                return True
+
+            # several consoles and worker processes configured -- plan consoles in parallel processes, balanced across roots
+            __balanced = ToolConfig.get_worker_processes() > 1 and len(ToolConfig.target_media_dirs) > 1
+            if __balanced and incremental:
+                Logger.log_message("info", "Planning on worker processes -- the file index is not used to skip unchanged media dirs", print_to_console=False)
+
+            # persistent index in output dir lets reruns skip media dirs that have not changed since the last run
+            __incremental = incremental and not __balanced and bool(ToolConfig.output_dir) and FileIndex.open(ToolConfig.output_dir)
+
+            __suffix_state = SuffixTool.get_suffix_state(action)
+
+            def __on_result(src: Path, dst: Path, renamed: bool) -> None:
+                RenameJournal.record_result(src, dst, renamed)
+                if not __incremental:
+                    return
+                if renamed:
+                    FileIndex.record_rename(src, dst, __suffix_state)
+                else:
+                    FileIndex.mark_directory_dirty(src.parent)
+
+            RenameJournal.begin(action)
+            if __balanced:
+                __plan = SuffixTool.build_balanced_rename_plan(action, max_processes=ToolConfig.get_worker_processes(), max_per_root=ToolConfig.get_max_workers_per_root())
+            else:
+                __plan = SuffixTool.build_rename_plan(action, incremental=__incremental)
+            # a media type dir with skipped files is not up to date, so it is checked again next run
+            __plan = SuffixTool.__apply_media_rules(__plan, __rule_counts, on_skip=(lambda src: FileIndex.mark_directory_dirty(src.parent)) if __incremental else None)
+            # the rename plan is streamed, so this span includes scanning and planning
+            with TestTime.span("plan + apply"):
+                SuffixTool.apply_rename_plan(RenameJournal.journal_plan(__plan), max_workers=max_workers, on_result=__on_result)
+            RenameJournal.end()
+            GamelistRewriter.update_from_last_run()
+
+            if __incremental:
+                with TestTime.span("index commit"):
+                    __indexed_dirs = FileIndex.commit_directories(__suffix_state, ToolConfig.get_target_media_file_types())
+                Logger.log_message("info", f"{__indexed_dirs} media type directories recorded as up to date in file index", print_to_console=False)
+
+            MediaRules.log_summary(__rule_counts)
+            RunStats.log_summary("Suffix tool summary")
+            return True
 
         except Exception as e:
             Logger.log_message("critical", f"SuffixTool.run_tool() has failed: {e}")
+            return False
+
+        finally:
+            FileIndex.close()
+            RenameJournal.close()
+
+    def resume_run(run: JournalRun, max_workers: int=constants.RENAME_MAX_WORKERS) -> tuple[int, int]:
+        '''
+        Applies the renames an interrupted journal run planned but never recorded as done or failed, without rescanning
+
+        A planned rename whose source is gone and whose destination exists already happened before the interruption, and is only recorded as done
+        '''
+        __resolved = {src for src, _ in run.done} | {src for src, _ in run.failed}
+        __pending = [(src, dst) for src, dst in run.planned if src not in __resolved]
+        Logger.log_message("info", f"{len(run.done)} renames already done, {len(__pending)} still pending")
+
+        RenameJournal.reopen()
+        try:
+            __counts = SuffixTool.apply_rename_plan(SuffixTool.__iter_pending(__pending), max_workers=max_workers, on_result=RenameJournal.record_result)
+            RenameJournal.end()
+            GamelistRewriter.update_from_last_run()
+            RunStats.log_summary("Resumed run summary")
+            return __counts
+
+        finally:
+            RenameJournal.close()
+
+    def resume_interrupted_run(max_workers: int=constants.RENAME_MAX_WORKERS) -> JournalRun | None:
+        '''
+        Resumes the journal's last run if it was interrupted, and returns it (None if there was nothing to resume)
+
+        Must be called before any new run begins -- `RenameJournal.begin()` rotates the journal, after which the interrupted run can no longer be resumed
+        '''
+        __last_run = RenameJournal.read_last_run()
+        if __last_run is None or __last_run.complete:
+            return None
+
+        Logger.log_message("warning", f"Previous run '{__last_run.run_id}' was interrupted -- resuming it from the rename journal")
+        SuffixTool.resume_run(__last_run, max_workers=max_workers)
+        return __last_run
+
+    def undo_last_run(max_workers: int=constants.RENAME_MAX_WORKERS) -> tuple[int, int] | None:
+        '''
+        Reverses every rename of the last journaled run, without rescanning, and returns (renamed, failed) counts -- None if the undo could not run
+
+        An interrupted run is resumed first, so it is undone as a whole -- if it was an undo itself, resuming it completes the requested undo
+        The undo is journaled as a run of its own, so an interrupted undo can be resumed and an undo can itself be undone
+        '''
+        Logger.log_message("info", "Undoing the last suffix tool run...")
+        try:
+            return SuffixTool.__undo_last_run(max_workers)
+
+        except Exception as e:
+            Logger.log_message("critical", f"SuffixTool.undo_last_run() has failed: {e}")
+            return None
+
+        finally:
+            RenameJournal.close()
+
+    def __undo_last_run(max_workers: int) -> tuple[int, int]:
+        RunStats.reset(aggregate=ToolConfig.is_aggregate_logging_enabled(), file_details=ToolConfig.is_file_detail_logging_enabled(), progress_interval=ToolConfig.get_progress_interval())
+        __resumed = SuffixTool.resume_interrupted_run(max_workers=max_workers)
+        if __resumed is not None:
+            if __resumed.action == RenameJournal.UNDO:
+                __undo_run = RenameJournal.read_last_run()
+                return len(__undo_run.done), len(__undo_run.failed)
+            # the undo gets a summary of its own
+            RunStats.reset(aggregate=ToolConfig.is_aggregate_logging_enabled(), file_details=ToolConfig.is_file_detail_logging_enabled(), progress_interval=ToolConfig.get_progress_interval())
+
+        __run = RenameJournal.read_last_run()
+        if __run is None:
+            Logger.log_message("warning", f"No rename journal found at '{RenameJournal.get_journal_path()}' -- nothing to undo")
+            return 0, 0
+
+        # an interrupted run may have applied planned renames it never recorded as done
+        __done = {src: dst for src, dst in __run.done}
+        __failed = {src for src, _ in __run.failed}
+        for src, dst in __run.planned:
+            if src not in __done and src not in __failed and not os.path.exists(src) and os.path.exists(dst):
+                __done[src] = dst
+
+        Logger.log_message("info", f"Undoing {len(__done)} renames of run '{__run.run_id}' ({__run.action})...")
+        RenameJournal.begin(RenameJournal.UNDO, undoes=__run.run_id)
+        try:
+            __undo_plan = ((dst, src) for src, dst in reversed(list(__done.items())))
+            __counts = SuffixTool.apply_rename_plan(RenameJournal.journal_plan(SuffixTool.__iter_pending(__undo_plan)), max_workers=max_workers, on_result=RenameJournal.record_result)
+            RenameJournal.end()
+            GamelistRewriter.update_from_last_run()
+            RunStats.log_summary("Undo summary")
+            return __counts
+
+        finally:
+            RenameJournal.close()
+
+    def build_rename_plan(action: str, media_dirs: Iterable[Path] | None=None, incremental: bool=False) -> Iterator[tuple[Path, Path]]:
+        '''
+        Lazily yields the (src, dst) pairs that need renaming; skipped files and collisions are logged and left out of the plan
+        '''
+        yield from SuffixTool.__iter_renames(SuffixTool.iter_planned_renames(action, media_dirs, incremental=incremental))
+
+    def build_balanced_rename_plan(action: str, media_dirs: Iterable[Path] | None=None, max_processes: int | None=None, max_per_root: int=constants.MAX_WORKERS_PER_ROOT) -> Iterator[tuple[Path, Path]]:
+        '''
+        Same plan as `build_rename_plan()`, but each console media dir is scanned and classified by `plan_media_dir()` on a process pool scheduled by `WorkScheduler`
+
+        Pairs are yielded as each console's plan completes, so renames of finished consoles start while larger ones are still being planned
+        '''
+        if media_dirs is None:
+            media_dirs = ToolConfig.target_media_dirs
+
+        __file_types = ToolConfig.get_target_media_file_types()
+        with TestTime.span("pre-count"):
+            __units = WorkScheduler.count_work_units(media_dirs, __file_types)
+        Logger.log_message("info", f"Planning {len(__units)} consoles ({sum(unit.file_count for unit in __units):,} files) on {max_processes or os.cpu_count()} worker processes", print_to_console=False)
+
+        __task_args = (action, dict(ToolConfig.get_suffixes_by_media_type_dict()), tuple(sorted(__file_types)))
+
+        def __iter_planned() -> Iterator[PlannedRename]:
+            for unit, future in WorkScheduler.run(__units, SuffixTool.plan_media_dir, __task_args, max_workers=max_processes, max_per_device=max_per_root):
+                try:
+                    __rows = future.result()
+                except Exception as e:
+                    Logger.log_message("error", f"Unable to scan '{unit.media_dir}': {e}")
+                    continue
+
+                for media_type, status, src, dst in __rows:
+                    yield PlannedRename(unit.console, media_type, status, Path(src), Path(dst) if dst is not None else None, None)
+
+        yield from SuffixTool.__iter_renames(__iter_planned())
+
+    def plan_media_dir(media_dir: str, action: str, suffixes_by_media_type: dict[str, str], file_types: tuple[str, ...]) -> list[tuple[str, str, str, str | None]]:
+        '''
+        Worker process task -- scans and classifies one console media dir without using the config, and returns (media type, status, src, dst) rows
+        '''
+        __matcher = SuffixMatcher(suffixes_by_media_type, file_types)
+        __console = Path(media_dir).parent.name
+        __rows = []
+        for media_type_entry in MediaWalker.scan_subdirectories(media_dir):
+            if __matcher.get_suffix(media_type_entry.name) is None:
+                continue
+            __entries = MediaWalker.scan_media_files(media_type_entry.path, frozenset(file_types))
+            # no logging in worker processes -- names carrying another media type's suffix are only counted as skipped
+            for planned in SuffixTool.__classify_entries(__console, media_type_entry.name, __entries, __matcher, action, report_foreign=False):
+                __rows.append((planned.media_type, planned.status, str(planned.src), str(planned.dst) if planned.dst is not None else None))
+        return __rows
+
+    def build_export_plan(action: str, output_dir: Path, media_dirs: Iterable[Path] | None=None, inventory: MediaInventory | None=None) -> Iterator[tuple[Path, Path]]:
+        '''
+        Lazily yields (src, dst) pairs that export every target media file to `output_dir`, mirroring `<console>/<media_dir>/<media_type>` and applying the suffix `action` to the exported name
+
+        If an already built `inventory` is given, it is planned from instead of scanning `media_dirs`
+        '''
+        __media_dir_identifier = ToolConfig.get_media_dir_identifier()
+        __planned = SuffixTool.iter_inventory_renames(inventory, action) if inventory is not None else SuffixTool.iter_planned_renames(action, media_dirs)
+        for planned in __planned:
+            if planned.status == SuffixTool.COLLISION:
+                RunStats.record(planned.console, planned.media_type, RunStats.COLLIDED)
+                if RunStats.is_file_detail_enabled():
+                    Logger.log_message("warning", f"Skipped export of '{planned.src}' -- '{planned.dst.name}' already exists")
+                continue
+
+            __export_name = planned.dst.name if planned.status == SuffixTool.RENAME else planned.src.name
+            yield planned.src, Path(output_dir) / planned.console / __media_dir_identifier / planned.media_type / __export_name
+
+    def iter_planned_renames(action: str, media_dirs: Iterable[Path] | None=None, incremental: bool=False) -> Iterator[PlannedRename]:
+        '''
+        Classifies every target media file in `media_dirs` (defaults to `ToolConfig.target_media_dirs`) for the given `action` ("add" or "remove")
+
+        Collisions and already suffixed files are detected from the names returned by the directory scan, without any additional stat calls
+
+        If `incremental` is True, the open `FileIndex` is used to skip unchanged media dirs and files already processed with `action`
+        '''
+        if action not in ("add", "remove"):
+            raise ValueError(f"Invalid suffix action '{action}' -- expected 'add' or 'remove'")
+
+        if media_dirs is None:
+            media_dirs = ToolConfig.target_media_dirs
+
+        __matcher = ToolConfig.get_suffix_matcher()
+        __file_types = ToolConfig.get_target_media_file_types()
+
+        __suffix_state = SuffixTool.get_suffix_state(action)
+        __known_dir_mtimes = FileIndex.get_dir_mtimes(__suffix_state) if incremental else None
+
+        for console_media in MediaWalker.walk_media_dirs(media_dirs, file_types=__file_types, known_dir_mtimes=__known_dir_mtimes, adaptive_max_workers=ToolConfig.get_adaptive_io_max_workers()):
+            if console_media.error is not None:
+                Logger.log_message("error", f"Unable to scan '{console_media.media_path}': {console_media.error}")
+                continue
+
+            for media_type, entries in console_media.media_files.items():
+                if __matcher.get_suffix(media_type) is None:
+                    continue
+
+                if not incremental:
+                    yield from SuffixTool.__classify_entries(console_media.console, media_type, entries, __matcher, action)
+                    continue
+
+                # only classify files that are new or changed since they were last indexed
+                __media_type_dir = os.path.join(console_media.media_path, media_type)
+                FileIndex.track_directory(__media_type_dir, console_media.media_mtimes.get(media_type))
+                __indexed = FileIndex.get_file_states(__media_type_dir)
+                __pending = [entry for entry in entries if not FileIndex.is_file_current(entry, __indexed.get(entry.name), __suffix_state)]
+
+                for planned in SuffixTool.__classify_entries(console_media.console, media_type, entries, __matcher, action, pending=__pending):
+                    match planned.status:
+                        case SuffixTool.SKIP:
+                            FileIndex.record_file(planned.src, __suffix_state, stat_result=planned.entry.stat())
+                        case SuffixTool.COLLISION:
+                            FileIndex.mark_directory_dirty(__media_type_dir)
+                    yield planned
+
+    def iter_inventory_renames(inventory: MediaInventory, action: str) -> Iterator[PlannedRename]:
+        '''
+        Same classification as `iter_planned_renames()`, from an already built `MediaInventory` instead of a directory scan
+        '''
+        if action not in ("add", "remove"):
+            raise ValueError(f"Invalid suffix action '{action}' -- expected 'add' or 'remove'")
+
+        __matcher = ToolConfig.get_suffix_matcher()
+        for directory in inventory.iter_directories():
+            if __matcher.get_suffix(directory.media_type) is None:
+                continue
+
+            __media_type_dir = Path(directory.media_dir) / directory.media_type
+            __names = inventory.get_names(directory.start, directory.end)
+            __on_foreign = lambda name, match, media_type_dir=__media_type_dir: SuffixTool.__log_foreign_suffix(media_type_dir / name, match)
+            for name, status, new_name in SuffixTool.__classify_names(directory.media_type, __names, __matcher, action, on_foreign=__on_foreign):
+                yield PlannedRename(directory.console, directory.media_type, status, __media_type_dir / name, __media_type_dir / new_name if new_name else None, None)
+
+    def get_suffix_state(action: str) -> str:
+        '''
+        Returns the file index state for `action` under the configured suffixes and file types -- changing either invalidates everything indexed before
+        '''
+        return FileIndex.get_suffix_state(action, ToolConfig.get_target_media_suffix_pairs(), ToolConfig.get_target_media_file_types())
+
+    def classify_new_files(media_type_dir: Path | str, names: Iterable[str], action: str) -> Iterator[PlannedRename]:
+        '''
+        Classifies newly added files of one media type dir the same way the planners do, e.g. for watch mode
+
+        The dir is listed once for collision detection -- names that are gone by now, or are not a target file type, are left out
+        '''
+        __media_type_dir = Path(media_type_dir)
+        __matcher = ToolConfig.get_suffix_matcher()
+        __file_types = ToolConfig.get_target_media_file_types()
+        try:
+            __taken_names = os.listdir(__media_type_dir)
+        except OSError as e:
+            Logger.log_message("error", f"Unable to scan '{__media_type_dir}': {e}")
+            return
+
+        __present = set(__taken_names)
+        __names = sorted(name for name in names if name in __present and MediaWalker.has_file_type(name, __file_types))
+        __on_foreign = lambda name, match: SuffixTool.__log_foreign_suffix(__media_type_dir / name, match)
+        for name, status, new_name in SuffixTool.__classify_names(__media_type_dir.name, __names, __matcher, action, taken_names=__taken_names, on_foreign=__on_foreign):
+            yield PlannedRename(__media_type_dir.parents[1].name, __media_type_dir.name, status, __media_type_dir / name, __media_type_dir / new_name if new_name else None, None)
+
+    def apply_rename_plan(plan: Iterable[tuple[Path, Path]], max_workers: int=constants.RENAME_MAX_WORKERS, on_result: Callable[[Path, Path, bool], None] | None=None) -> tuple[int, int]:
+        '''
+        Applies (src, dst) renames from `plan` on a pool of `max_workers` threads so renames on slow storage overlap
+
+        At most twice the pool's limit of renames are in flight at once, so the plan is consumed lazily rather than loaded into memory
+        With "adaptive_io" enabled, `max_workers` is only the starting limit, adjusted to rename latency (see `AdaptiveExecutor`)
+
+        `on_result(src, dst, renamed)` is called from the worker thread after each rename attempt
+
+        Returns a tuple of (renamed, failed) counts
+        '''
+        __lock = threading.Lock()
+        __counts = {"renamed": 0, "failed": 0}
+
+        __count_bytes = ToolConfig.is_byte_counting_enabled()
+
+        def __rename_task(src: Path, dst: Path) -> None:
+            __renamed = SuffixTool.__rename(src, dst, __executor.retry)
+            with __lock:
+                __counts["renamed" if __renamed else "failed"] += 1
+
+            __bytes = 0
+            if __renamed and __count_bytes:
+                # the byte count is informational -- a file already moved on (or an unreachable share) must not hide the rename from `on_result`
+                try:
+                    __bytes = os.stat(dst).st_size
+                except OSError:
+                    pass
+            RunStats.record_path(dst if __renamed else src, RunStats.RENAMED if __renamed else RunStats.FAILED, __bytes)
+            if on_result is not None:
+                on_result(src, dst, __renamed)
+
+        with AdaptiveExecutor(max_workers, "SuffixTool", ToolConfig.get_adaptive_io_max_workers()) as __executor:
+            for src, dst in plan:
+                __executor.submit(__rename_task, src, dst)
+        __executor.log_summary()
+
+        return __counts["renamed"], __counts["failed"]
+
+    def __classify_entries(console: str, media_type: str, entries: list[os.DirEntry], matcher: SuffixMatcher, action: str, pending: list[os.DirEntry] | None=None, report_foreign: bool=True) -> Iterator[PlannedRename]:
+        '''
+        Classifies `pending` entries (defaults to all `entries`); every entry in the directory counts towards collision detection
+        '''
+        __entries = entries if pending is None else pending
+        __on_foreign = None
+        if report_foreign and __entries:
+            __media_type_dir = Path(__entries[0].path).parent
+            __on_foreign = lambda name, match: SuffixTool.__log_foreign_suffix(__media_type_dir / name, match)
+        __classified = SuffixTool.__classify_names(media_type, [entry.name for entry in __entries], matcher, action, taken_names=[entry.name for entry in entries], on_foreign=__on_foreign)
+        for entry, (_, status, new_name) in zip(__entries, __classified):
+            __src = Path(entry.path)
+            yield PlannedRename(console, media_type, status, __src, __src.with_name(new_name) if new_name else None, entry)
+
+    def __classify_names(media_type: str, names: list[str], matcher: SuffixMatcher, action: str, taken_names: Iterable[str] | None=None, on_foreign: Callable[[str, SuffixMatch], None] | None=None) -> Iterator[tuple[str, str, str | None]]:
+        '''
+        Yields (name, status, new name) for each of `names`; `taken_names` (defaults to `names`) is every name in the directory, for collision detection
+
+        Each name is matched against every configured suffix in one pass (longest suffix wins), so a name carrying another media type's suffix
+        (e.g. "covers/Game-image.png") is skipped and passed to `on_foreign(name, match)` instead of being suffixed a second time
+        '''
+        # names already present in (or planned for) this directory, normalized for case-insensitive filesystems
+        __taken_names = {os.path.normcase(name) for name in (names if taken_names is None else taken_names)}
+        __suffix = matcher.get_suffix(media_type)
+
+        for name, match in zip(names, matcher.classify_batch(names)):
+            if match.suffix and match.suffix != __suffix:
+                if on_foreign is not None:
+                    on_foreign(name, match)
+                yield name, SuffixTool.SKIP, None
+                continue
+
+            __new_name = None
+            if __suffix is not None and match.extension:
+                if action == "add" and not match.suffix:
+                    __new_name = f"{match.stem}{__suffix}.{match.extension}"
+                # a name that is only the suffix (e.g. "-thumb.png") has no stem to keep
+                elif action == "remove" and match.suffix and match.stem:
+                    __new_name = f"{match.stem}.{match.extension}"
+
+            # already in desired state
+            if __new_name is None:
+                yield name, SuffixTool.SKIP, None
+                continue
+
+            if os.path.normcase(__new_name) in __taken_names:
+                yield name, SuffixTool.COLLISION, __new_name
+                continue
+
+            __taken_names.add(os.path.normcase(__new_name))
+            yield name, SuffixTool.RENAME, __new_name
+
+    def __iter_renames(planned_renames: Iterable[PlannedRename]) -> Iterator[tuple[Path, Path]]:
+        # yields the (src, dst) pairs to rename, counting skipped files and logging collisions
+        for planned in planned_renames:
+            match planned.status:
+                case SuffixTool.RENAME:
+                    yield planned.src, planned.dst
+                case SuffixTool.SKIP:
+                    RunStats.record(planned.console, planned.media_type, RunStats.SKIPPED)
+                case SuffixTool.COLLISION:
+                    RunStats.record(planned.console, planned.media_type, RunStats.COLLIDED)
+                    if RunStats.is_file_detail_enabled():
+                        Logger.log_message("warning", f"Skipped '{planned.src}' -- '{planned.dst.name}' already exists")
+
+    def __log_foreign_suffix(path: Path, match: SuffixMatch) -> None:
+        Logger.log_message("warning", f"Skipped '{path}' -- it carries the '{match.suffix}' suffix of '{match.media_type}'", print_to_console=RunStats.is_file_detail_enabled())
+
+    def __iter_pending(pairs: Iterable[tuple[Path, Path]]) -> Iterator[tuple[Path, Path]]:
+        # yields renames that can still be applied; ones that already happened are journaled as done, and conflicts are left alone
+        for src, dst in pairs:
+            __src_exists = os.path.exists(src)
+            __dst_exists = os.path.exists(dst)
+
+            if __src_exists and not __dst_exists:
+                yield src, dst
+            elif __dst_exists and not __src_exists:
+                RenameJournal.record_result(src, dst, True)
+                RunStats.record_path(dst, RunStats.SKIPPED)
+            else:
+                RenameJournal.record_result(src, dst, False)
+                RunStats.record_path(src, RunStats.COLLIDED if __dst_exists else RunStats.FAILED)
+                Logger.log_message("warning", f"Unable to rename '{src}' to '{Path(dst).name}' -- {'both names exist' if __dst_exists else 'neither name exists'}")
+
+    def __apply_media_rules(pairs: Iterable[tuple[Path, Path]], counts: dict[str, list[int]], on_skip: Callable[[Path], None] | None=None) -> Iterable[tuple[Path, Path]]:
+        # filters the plan through the configured "media_rules" -- header metadata is cached in the file index when there is an output dir
+        __rules = ToolConfig.get_media_rules()
+        if not __rules:
+            return pairs
+        if ToolConfig.output_dir:
+            FileIndex.open(ToolConfig.output_dir)
+        return MediaRules.filter_pairs(pairs, __rules, counts, on_skip=on_skip)
+
+    def __split_png_pairs(pairs: Iterable[tuple[Path, Path]]) -> Iterator[tuple[Path, Path]]:
+        # yields non-PNG pairs and submits PNG pairs to the started `PngRecompressor` pool
+        for src, dst in pairs:
+            if src.suffix.lower() == ".png":
+                PngRecompressor.submit(src, dst)
+            else:
+                yield src, dst
+
+    def __rename(src: Path, dst: Path, retry: Callable | None=None) -> bool:
+        try:
+            if retry is not None:
+                # a rename is not idempotent -- after a transient error, it may already have happened on the share
+                retry(os.rename, src, dst, applied=lambda: not os.path.exists(src) and os.path.exists(dst))
+            else:
+                os.rename(src, dst)
+            if RunStats.is_file_detail_enabled():
+                Logger.log_message("info", f"Renamed '{src}' to '{dst.name}'", print_to_console=False)
+            return True
+
+        except Exception as e:
+            Logger.log_message("error", f"Unable to rename '{src}' to '{dst.name}': {e}")
+            return False
+
+    def run_unit_test() -> None:
+        ToolConfig()
+        Logger.log_message("info", f"{Formatter.generate_header("Testing SuffixTool resume and undo", capitalize=False)}")
+
+        # the test journals runs of its own -- the real journal and its previous run are set aside and put back afterwards
+        __journal_path = RenameJournal.get_journal_path()
+        __journal_paths = (__journal_path, __journal_path.with_name(__journal_path.name + ".prev"))
+        for path in __journal_paths:
+            if path.exists():
+                os.replace(path, path.with_name(path.name + ".unit_test"))
+
+        try:
+            with tempfile.TemporaryDirectory() as __temp_dir:
+                __media_type_dir = Path(__temp_dir) / "unit_test_console" / "downloaded_media" / "covers"
+                __media_type_dir.mkdir(parents=True)
+                __plan = [(__media_type_dir / f"{name}.png", __media_type_dir / f"{name}-image.png") for name in ("Game A", "Game B")]
+                for src, _ in __plan:
+                    src.write_bytes(b"")
+
+                # a run interrupted after its first rename -- both renames planned, only one recorded as done
+                RenameJournal.begin("add")
+                __journaled = list(RenameJournal.journal_plan(__plan))
+                os.rename(*__journaled[0])
+                RenameJournal.record_result(*__journaled[0], True)
+                RenameJournal.close()
+
+                __run = RenameJournal.read_last_run()
+                Logger.log_message("info", f"read_last_run() returned {len(__run.planned)} planned, {len(__run.done)} done, complete {__run.complete}")
+                assert not __run.complete and __run.planned == __plan and __run.done == __plan[:1], f"interrupted run read as {__run}"
+
+                __counts = SuffixTool.resume_run(__run, max_workers=2)
+                Logger.log_message("info", f"resume_run() returned {__counts}")
+                assert __counts == (1, 0) and all(dst.exists() and not src.exists() for src, dst in __plan), f"resume_run() returned {__counts}"
+                assert RenameJournal.read_last_run().complete, "resumed run was not marked complete"
+
+                __counts = SuffixTool.undo_last_run(max_workers=2)
+                Logger.log_message("info", f"undo_last_run() returned {__counts}")
+                assert __counts == (2, 0) and all(src.exists() and not dst.exists() for src, dst in __plan), f"undo_last_run() returned {__counts}"
+                __undo_run = RenameJournal.read_last_run()
+                assert __undo_run.action == RenameJournal.UNDO and __undo_run.undoes == __run.run_id and __undo_run.complete, f"undo run read as {__undo_run}"
+
+        except Exception as e:
+            Logger.log_message("critical", f"SuffixTool unit test has failed: {e}")
+
+        finally:
+            RenameJournal.close()
+            for path in __journal_paths:
+                if path.exists():
+                    os.remove(path)
+                if path.with_name(path.name + ".unit_test").exists():
+                    os.replace(path.with_name(path.name + ".unit_test"), path)
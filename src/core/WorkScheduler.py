@@ -0,0 +1,90 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import multiprocessing
+import os
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from common import constants
+from common.Singleton import Singleton
+from core.MediaWalker import MediaWalker
+
+class WorkUnit(NamedTuple):
+    console: str
+    media_dir: Path
+    root: Path                  # consoles dir the console belongs to
+    device: int                 # `st_dev` of the media dir -- roots on the same disk share a concurrency limit
+    file_count: int             # from the pre-count, used to order units largest first
+
+class WorkScheduler(metaclass=Singleton):
+    '''
+    Splits a run into one work unit per console media dir and runs them on a process pool
+
+    Units are sized by a fast pre-count (directory listings only, no stat calls) and dispatched largest first, so the longest units never start last
+    There is no fixed assignment of units to workers: whenever a worker is free it takes the largest remaining unit of any disk with spare capacity,
+    so a worker that finishes early picks up work another disk's queue would otherwise leave waiting
+
+    At most `max_per_device` units of the same disk run at once, so several roots on one disk are not scanned in parallel beyond what it can serve
+    '''
+
+    def count_work_units(media_dirs: Iterable[Path], file_types: Iterable[str] | None=None, max_workers: int=constants.SCAN_MAX_WORKERS) -> list[WorkUnit]:
+        '''
+        Pre-counts the target media files of each media dir concurrently and returns its work units, largest first
+        '''
+        __file_types = MediaWalker.normalize_file_types(file_types)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="WorkScheduler") as __executor:
+            __units = list(__executor.map(lambda media_dir: WorkScheduler.__count_unit(Path(media_dir), __file_types), media_dirs))
+        return sorted(__units, key=lambda unit: unit.file_count, reverse=True)
+
+    def run(units: Iterable[WorkUnit], task: Callable, args: tuple=(), max_workers: int | None=None, max_per_device: int=constants.MAX_WORKERS_PER_ROOT) -> Iterator[tuple[WorkUnit, Future]]:
+        '''
+        Runs `task(str(unit.media_dir), *args)` for every unit on a pool of `max_workers` processes and yields (unit, completed future) as units finish
+
+        `task` must be a picklable module or class level function, and should return plain data
+        Workers are started with `PROCESS_START_METHOD` ("spawn"), not forked from this already threaded process, so `task` must not rely on state set up at runtime (e.g. the config)
+        '''
+        __max_workers = max_workers or os.cpu_count() or 1
+
+        # per-device queues, each largest first
+        __queues = {}
+        for unit in sorted(units, key=lambda unit: unit.file_count, reverse=True):
+            __queues.setdefault(unit.device, deque()).append(unit)
+
+        __running = {}              # future -> unit
+        __running_per_device = dict.fromkeys(__queues, 0)
+
+        with ProcessPoolExecutor(max_workers=__max_workers, mp_context=multiprocessing.get_context(constants.PROCESS_START_METHOD)) as __executor:
+            while __queues or __running:
+                # fill free workers with the largest waiting unit of any device below its limit
+                while len(__running) < __max_workers:
+                    __devices = [device for device in __queues if __running_per_device[device] < max_per_device]
+                    if not __devices:
+                        break
+
+                    __device = max(__devices, key=lambda device: __queues[device][0].file_count)
+                    __unit = __queues[__device].popleft()
+                    if not __queues[__device]:
+                        del __queues[__device]
+
+                    __running[__executor.submit(task, str(__unit.media_dir), *args)] = __unit
+                    __running_per_device[__device] += 1
+
+                __done, _ = wait(__running, return_when=FIRST_COMPLETED)
+                for future in __done:
+                    __unit = __running.pop(future)
+                    __running_per_device[__unit.device] -= 1
+                    yield __unit, future
+
+    def __count_unit(media_dir: Path, file_types: frozenset[str] | None) -> WorkUnit:
+        __file_count = 0
+        try:
+            __device = os.stat(media_dir).st_dev
+            for media_type_entry in MediaWalker.scan_subdirectories(media_dir):
+                with os.scandir(media_type_entry.path) as __entries:
+                    __file_count += sum(1 for entry in __entries if MediaWalker.has_file_type(entry.name, file_types))
+
+        except OSError:
+            # unreadable dirs are still scheduled, so the planning task reports the error
+            __device = -1
+
+        return WorkUnit(media_dir.parent.name, media_dir, media_dir.parent.parent, __device, __file_count)
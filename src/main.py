@@ -1,26 +1,277 @@
-import unit_tests
+import argparse
+import json
+import os
+from pathlib import Path
+import sys
+import threading
+
 from common import constants
+from config_loaders.ToolConfig import ToolConfig
+from core.ExportVerifier import ExportVerifier
+from core.MediaInventory import MediaInventory
+from core.MediaMetadataReport import MediaMetadataReport
+from core.MediaReport import MediaReport
+from core.MediaWatcher import MediaWatcher
+from core.RenamePlan import RenamePlan
+from core.SuffixTool import SuffixTool
 from utils.Logger import Logger
-from utils.TestTime import TestTime
-from utils.Formatter import Formatter
+from utils.RunStats import RunStats
 
-from config_loaders.ToolConfig import ToolConfig
-from pathlib import Path
+EXIT_OK = 0
+EXIT_FAILED = 1                 # some files failed, or the command itself failed part way
+EXIT_INVALID_CONFIG = 3         # 2 is taken by argparse usage errors
 
-def main():
-    print("running Main...")
 
+class JsonLinesOutput:
+    '''
+    Writes one JSON object per line to stdout, for pipelines -- every record has a "type" field
 
+    Records may come from the progress timer thread while the command writes its own, so writes are serialized
+    '''
+    __slots__ = ("__enabled", "__lock")
 
-### main ###
-if (__name__ == "__main__"):
-    if constants.UNIT_TESTS:
-        #unit_tests.run_unit_tests()
+    def __init__(self, enabled: bool):
+        self.__enabled = enabled
+        self.__lock = threading.Lock()
+
+    def is_enabled(self) -> bool:
+        return self.__enabled
+
+    def emit(self, record_type: str, **fields) -> None:
+        if not self.__enabled:
+            return
+        __line = json.dumps({"type": record_type, **fields}, default=str)
+        with self.__lock:
+            sys.stdout.write(__line + "\n")
+            sys.stdout.flush()
+
+
+def add_common_options(parser: argparse.ArgumentParser, default=None) -> None:
+    '''
+    Adds the options shared by every subcommand, so they can be given before or after it
+
+    Subcommands add them with `default=argparse.SUPPRESS`, so an option given before the subcommand is not reset by the subcommand's own default
+    '''
+    parser.add_argument("--config", type=Path, default=default, help=f"config file (default: config/{constants.CONFIG_FILE})")
+    parser.add_argument("--log", type=Path, default=default, help="event log file (default: eventlog.csv)")
+    parser.add_argument("--consoles-dir", type=Path, action="append", default=default, help="consoles dir, replacing the configured one(s) -- repeat for several roots")
+    parser.add_argument("--output-dir", type=Path, default=default, help="output dir, replacing the configured one")
+    parser.add_argument("--action", choices=("add", "remove"), default=default, help="suffix action, replacing the configured \"suffix_action\"")
+    parser.add_argument("--workers", type=int, default=default, help="threads for renames and exports (adaptive I/O starting limit)")
+    parser.add_argument("--processes", type=int, default=default, help="worker processes for planning, replacing the configured \"worker_processes\"")
+    parser.add_argument("--progress-interval", type=float, default=default, help="seconds between progress updates (0 disables them)")
+    parser.add_argument("--json", action="store_true", default=default if default is argparse.SUPPRESS else False, help="write JSON lines records to stdout instead of colored console text")
+    parser.add_argument("--async-log", action="store_true", default=default if default is argparse.SUPPRESS else False, help="write console and event log output on a background thread, as the \"async_logging\" log setting does")
+    parser.add_argument("--yes", action="store_true", default=default if default is argparse.SUPPRESS else False, help="create a missing output dir instead of failing (the \"prompt\" policy never prompts here)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    __parser = argparse.ArgumentParser(prog="rommediatool", description="Add or remove media type suffixes in ES-DE style downloaded_media folders")
+    add_common_options(__parser)
+    __commands = __parser.add_subparsers(dest="command", required=True, metavar="command")
+    __common = argparse.ArgumentParser(add_help=False)
+    add_common_options(__common, default=argparse.SUPPRESS)
+
+    __scan = __commands.add_parser("scan", parents=[__common], help="list every target media file")
+    __scan.add_argument("--sizes", action="store_true", help="include size and mtime of each file (one stat per file)")
+
+    __plan = __commands.add_parser("plan", parents=[__common], help="save a rename plan without renaming anything")
+    __plan.add_argument("--plan", type=Path, help=f"plan file, .csv or JSON lines (default: <output_dir>/{constants.RENAME_PLAN_FILE})")
+    __plan.add_argument("--sizes", action="store_true", help="include file sizes in the plan")
 
-        ToolConfig()
-        ToolConfig.is_config_valid()
-            
+    __apply = __commands.add_parser("apply", parents=[__common], help="run the suffix tool, or apply a saved plan")
+    __apply.add_argument("--plan", type=Path, help="apply this saved plan instead of planning a new run")
+    __apply.add_argument("--dry-run", action="store_true", help="only plan the run, as the plan command does")
 
+    __verify = __commands.add_parser("verify", parents=[__common], help="validate the config and discover target media dirs, optionally checking the exported output")
+    __verify.add_argument("--export", action="store_true", help="compare the output dir against the source media by name, size and mtime")
+    __verify.add_argument("--deep", action="store_true", help="also compare content hashes (implies --export)")
+    __verify.add_argument("--recopy", action="store_true", help="re-export mismatched files (implies --export)")
+    __verify.add_argument("--diff", type=Path, help=f"diff file (default: <output_dir>/{constants.EXPORT_DIFF_FILE})")
+    __commands.add_parser("stats", parents=[__common], help="count files and bytes per console and media type")
 
+    __report = __commands.add_parser("report", parents=[__common], help="report orphaned media and ROMs with missing media")
+    __report.add_argument("--report", type=Path, help=f"report file (default: <output_dir>/{constants.MEDIA_REPORT_FILE})")
+
+    __inspect = __commands.add_parser("inspect", parents=[__common], help="read header metadata of every media file and match it against \"media_rules\"")
+    __inspect.add_argument("--report", type=Path, help=f"report file (default: <output_dir>/{constants.MEDIA_METADATA_FILE})")
+
+    __commands.add_parser("undo", parents=[__common], help="reverse every rename of the last run recorded in the rename journal")
+
+    __commands.add_parser("watch", parents=[__common], help="suffix newly added media as it arrives")
+    return __parser
+
+
+def get_config_overrides(args: argparse.Namespace) -> dict:
+    __overrides = {}
+    if args.consoles_dir:
+        __overrides.setdefault(constants.CONFIG_TARGET_DIR_KEY, {})["consoles_dir"] = [str(path) for path in args.consoles_dir]
+    if args.output_dir:
+        __overrides.setdefault(constants.CONFIG_TARGET_DIR_KEY, {})["output_dir"] = str(args.output_dir)
+    if args.action:
+        __overrides.setdefault(constants.CONFIG_TOOL_SETTINGS_KEY, {})["suffix_action"] = args.action
+    if args.processes:
+        __overrides.setdefault(constants.CONFIG_TOOL_SETTINGS_KEY, {})["worker_processes"] = args.processes
+    if args.progress_interval is not None:
+        __overrides.setdefault(constants.CONFIG_LOG_SETTINGS_KEY, {})["progress_interval_seconds"] = args.progress_interval
+    if args.yes:
+        __overrides.setdefault(constants.CONFIG_TARGET_DIR_KEY, {})["missing_output_dir_policy"] = "create"
+    return __overrides
+
+
+def run_scan(args: argparse.Namespace, output: JsonLinesOutput) -> int:
+    __inventory = MediaInventory.scan(ToolConfig.target_media_dirs, ToolConfig.get_target_media_file_types(), include_stats=args.sizes)
+    if output.is_enabled():
+        for directory in __inventory.iter_directories():
+            for index in range(directory.start, directory.end):
+                __sizes = {"size": __inventory.get_size(index), "mtime_ns": __inventory.get_mtime_ns(index)} if args.sizes else {}
+                output.emit("file", console=directory.console, media_type=directory.media_type, path=str(__inventory.get_path(index)), **__sizes)
+    __inventory.log_summary("Scan summary")
+    output.emit("summary", files=len(__inventory), bytes=sum(__inventory.get_sizes()) if args.sizes else None)
+    return EXIT_OK
+
+
+def run_plan(args: argparse.Namespace, output: JsonLinesOutput) -> int:
+    def __emit_summary(summary: dict[tuple[str, str], list[int]]) -> None:
+        for (console, media_type), counter in sorted(summary.items()):
+            output.emit("plan", console=console, media_type=media_type, rename=counter[0], skip=counter[1], collision=counter[2], bytes=counter[3])
+
+    __plan_path = RenamePlan.run(plan_path=getattr(args, "plan", None), include_sizes=getattr(args, "sizes", None) or None, on_summary=__emit_summary)
+    if __plan_path is None:
+        output.emit("error", message="Planning has failed -- see the event log")
+        return EXIT_FAILED
+
+    output.emit("result", plan=str(__plan_path))
+    return EXIT_OK
+
+
+def run_apply(args: argparse.Namespace, output: JsonLinesOutput) -> int:
+    if args.dry_run:
+        return run_plan(args, output)
+
+    __max_workers = args.workers or constants.RENAME_MAX_WORKERS
+    if args.plan:
+        __completed = RenamePlan.apply(args.plan, max_workers=__max_workers) is not None
     else:
-        main()
\ No newline at end of file
+        __completed = SuffixTool.run_tool(max_workers=__max_workers)
+
+    __totals = RunStats.get_totals()
+    output.emit("result", completed=__completed, **__totals)
+    return EXIT_FAILED if not __completed or __totals[RunStats.FAILED] else EXIT_OK
+
+
+def run_undo(args: argparse.Namespace, output: JsonLinesOutput) -> int:
+    __counts = SuffixTool.undo_last_run(max_workers=args.workers or constants.RENAME_MAX_WORKERS)
+    __totals = RunStats.get_totals()
+    output.emit("result", completed=__counts is not None, **__totals)
+    return EXIT_FAILED if __counts is None or __counts[1] or __totals[RunStats.FAILED] else EXIT_OK
+
+
+def run_verify(args: argparse.Namespace, output: JsonLinesOutput) -> int:
+    # config was already validated before the command ran -- report what was found
+    output.emit("media_dirs", media_dirs=[str(media_dir) for media_dir in ToolConfig.target_media_dirs], output_dir=str(ToolConfig.output_dir))
+    if not (args.export or args.deep or args.recopy):
+        return EXIT_OK
+
+    __mismatches = ExportVerifier.run(deep=args.deep, recopy=args.recopy, diff_path=args.diff, max_workers=args.workers or constants.HASH_MAX_WORKERS)
+    if __mismatches is None:
+        output.emit("result", mismatches=None)
+        return EXIT_FAILED
+
+    for mismatch in __mismatches:
+        output.emit("mismatch", status=mismatch.status, console=mismatch.console, media_type=mismatch.media_type, src=mismatch.src, dst=mismatch.dst, detail=mismatch.detail)
+    output.emit("result", mismatches=len(__mismatches))
+    return EXIT_FAILED if __mismatches else EXIT_OK
+
+
+def run_stats(args: argparse.Namespace, output: JsonLinesOutput) -> int:
+    __inventory = MediaInventory.scan(ToolConfig.target_media_dirs, ToolConfig.get_target_media_file_types())
+    for (console, media_type), (files, total_bytes) in sorted(__inventory.summarize().items()):
+        output.emit("stats", console=console, media_type=media_type, files=files, bytes=total_bytes)
+    __inventory.log_summary("Library stats")
+    output.emit("summary", files=len(__inventory), bytes=sum(__inventory.get_sizes()), memory_bytes=__inventory.get_nbytes())
+    return EXIT_OK
+
+
+def run_report(args: argparse.Namespace, output: JsonLinesOutput) -> int:
+    __report_path = MediaReport.run(args.report)
+    output.emit("result", report=str(__report_path) if __report_path is not None else None)
+    return EXIT_OK if __report_path is not None else EXIT_FAILED
+
+
+def run_inspect(args: argparse.Namespace, output: JsonLinesOutput) -> int:
+    __report_path = MediaMetadataReport.run(args.report, on_file=(lambda record: output.emit("metadata", **record)) if output.is_enabled() else None)
+    output.emit("result", report=str(__report_path) if __report_path is not None else None)
+    return EXIT_OK if __report_path is not None else EXIT_FAILED
+
+
+def run_watch(args: argparse.Namespace, output: JsonLinesOutput) -> int:
+    MediaWatcher.run()
+    return EXIT_OK
+
+
+COMMANDS = {
+    "scan": run_scan,
+    "plan": run_plan,
+    "apply": run_apply,
+    "undo": run_undo,
+    "verify": run_verify,
+    "stats": run_stats,
+    "report": run_report,
+    "inspect": run_inspect,
+    "watch": run_watch,
+}
+
+
+def main(argv: list[str] | None=None) -> int:
+    '''
+    Runs one command non-interactively and returns its exit code
+
+    With --json, console text is turned off and stdout only carries JSON lines records ("file", "plan", "stats", "progress", "validation", "result", ...), while eventlog.csv is written as usual
+    '''
+    __parser = build_parser()
+    __args = __parser.parse_args(argv)
+    if __args.command == "apply" and __args.dry_run and __args.plan:
+        __parser.error("--dry-run plans a new run and cannot be combined with --plan")
+    __output = JsonLinesOutput(__args.json)
+
+    if __args.json:
+        Logger.set_console_output(False)
+        RunStats.set_progress_handler(lambda progress: __output.emit("progress", **progress))
+
+    Logger.init(__args.log or Path("eventlog.csv"))
+    # commands never prompt -- a "prompt" policy for a missing output dir fails instead (or creates it with --yes)
+    ToolConfig.set_interactive(False)
+    try:
+        try:
+            ToolConfig.init(__args.config, overrides=get_config_overrides(__args) or None)
+        except SystemExit:
+            # the config file is missing or malformed -- already logged by ToolConfig
+            __output.emit("validation", valid=False, errors=[{"level": "critical", "config_key": "config", "message": "Unable to load the config file"}], warnings=[])
+            return EXIT_INVALID_CONFIG
+
+        # log records are handed to a background writer from here on -- shutdown_logging() drains them before exit
+        if __args.async_log or ToolConfig.is_async_logging_enabled():
+            Logger.enable_async_logging()
+
+        __valid = ToolConfig.is_config_valid(exit_on_error=False)
+        __report = ToolConfig.validation_report.to_dict() if ToolConfig.validation_report is not None else {"valid": __valid, "errors": [], "warnings": []}
+        __output.emit("validation", **{**__report, "valid": __valid})
+        if not __valid:
+            return EXIT_INVALID_CONFIG
+
+        return COMMANDS[__args.command](__args, __output)
+
+    except BrokenPipeError:
+        # the reading end of a pipeline closed early (e.g. `| head`) -- stop quietly, without a traceback on the closed stdout
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_FAILED
+
+    finally:
+        RunStats.set_progress_handler(None)
+        Logger.shutdown_logging()
+
+
+### main ###
+if (__name__ == "__main__"):
+    sys.exit(main())
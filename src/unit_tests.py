@@ -1,4 +1,7 @@
 from config_loaders.ToolConfig import ToolConfig
+from core.AdaptiveExecutor import AimdController
+from core.MediaMetadata import MediaMetadata
+from core.SuffixTool import SuffixTool
 from utils.Formatter import Formatter
 from utils.Logger import Logger
 
@@ -9,6 +12,12 @@ def run_unit_tests():
     
     # ToolConfig.py
     ToolConfig.run_unit_test()
+    # MediaMetadata.py
+    MediaMetadata.run_unit_test()
+    # AdaptiveExecutor.py
+    AimdController.run_unit_test()
+    # SuffixTool.py
+    SuffixTool.run_unit_test()
     
 
 if __name__ == "__main__":
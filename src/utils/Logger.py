@@ -1,14 +1,45 @@
+import atexit
 import logging
+import logging.handlers
 from pathlib import Path
+import queue
 import shutil
 import sys
 
+from common import constants
 from common.Singleton import Singleton
 from utils.Formatter import Formatter
 from utils.TestTime import TestTime
 from utils.TextColor import TextColor
 
 
+class _BlockingQueueHandler(logging.handlers.QueueHandler):
+    # block when the bounded queue is full instead of raising queue.Full, so callers are throttled to the writer's pace
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.queue.put(record, block=True)
+
+    # records are only consumed in-process and log_message() never passes args or exc_info, so skip the default format-and-copy step
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _BlockingQueueListener(logging.handlers.QueueListener):
+    # the default stop() sentinel uses put_nowait(), which fails if the bounded queue happens to be full
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel, block=True)
+
+
+class _ConsoleFormatter(logging.Formatter):
+    # console formatting done on the background writer thread in async mode, using the precomputed level prefixes
+    def __init__(self, prefixes: dict[str, tuple[str, str]]):
+        super().__init__(datefmt='%m/%d/%Y %H:%M:%S')
+        self.__prefixes = prefixes
+
+    def format(self, record: logging.LogRecord) -> str:
+        __prefix, __postfix = self.__prefixes[record.levelname]
+        return f'[{TextColor.BLACK}{self.formatTime(record, self.datefmt)}{TextColor.END}] {__prefix}{record.getMessage()}{__postfix}'
+
+
 class Logger(metaclass=Singleton):
     
     # the code block below is necessary to add custom 'result' log level to logging
@@ -21,88 +52,189 @@ class Logger(metaclass=Singleton):
             self._log(Logger.RESULT_LEVEL_NUM, message, args, **kwargs)
 
     logging.Logger.result = __result
+
+    # level numbers, labels and color codes are computed once here instead of on every log_message() call
+    __LEVEL_COLORS = {
+        'INFO': '',                     # default
+        'RESULT': TextColor.GREEN,      # green
+        'DEBUG': TextColor.CYAN,        # cyan
+        'WARNING': TextColor.PURPLE,    # purple
+        'ERROR': TextColor.YELLOW,      # yellow
+        'CRITICAL': TextColor.RED,      # red
+    }
+    __LONGEST_LEVEL_LEN = max(len(name) for name in logging._nameToLevel.keys())
+    __LEVEL_NUMS = {}
+    __CONSOLE_PREFIXES = {}             # level name -> (colored label prefix, color reset postfix)
+    for __level_name, __level_color in __LEVEL_COLORS.items():
+        __LEVEL_NUMS[__level_name] = logging._nameToLevel[__level_name]
+        # generate a "label" formatted with padding, text alignment, and a specified symbol, representing the level
+        __level_label = Formatter.pad_field_label(__level_name, longest_field_len=__LONGEST_LEVEL_LEN, symbol='>>', alignment='center')
+        __CONSOLE_PREFIXES[__level_name] = (f'{__level_color}{__level_label} ', TextColor.END if __level_color else '')
+    del __level_name, __level_color, __level_label
+
+    # async mode state -- see enable_async_logging()
+    __async_logger = None
+    __async_listener = None
     
-    try:        
-        # init logging module to enable error logging
-        __logger = logging.getLogger('eventlog')
-        # TODO - consider setting "setLevel" as a global var
-        __logger.setLevel(logging.DEBUG)
-        
-        __formatter = logging.Formatter(fmt='%(asctime)s.%(msecs)03d, %(levelname)s, %(message)s', datefmt='%m/%d/%Y %H:%M:%S')
-        
-        __eventlog = logging.FileHandler(filename='.\\eventlog.csv', mode='w')
-        __eventlog.setFormatter(__formatter)
-        
-        __logger.addHandler(__eventlog)
-        
-        __logging_enabled = True
+    # eventlog.csv handler is created by init() on first use, so importing this module has no side effects
+    __initialized = False
+    __logging_enabled = False
+    __console_enabled = True            # off when stdout carries machine-readable output, see set_console_output()
+    __logger = logging.getLogger('eventlog')
+    __formatter = logging.Formatter(fmt='%(asctime)s.%(msecs)03d, %(levelname)s, %(message)s', datefmt='%m/%d/%Y %H:%M:%S')
+    __eventlog = None
 
-    except Exception as e:
-        print(f'CRITICAL >> Exception during Logger init, {e}')
-        while True:
-            user_continue = str(input('Would you like to continue with console output only? [y/n]:\n$ ')).lower()
-            match user_continue:
-                case 'y' | 'yes':
-                    __logging_enabled = False
-                    break
+    def __init__(self):
+        # keep `Logger()` working as the explicit init entry point
+        Logger.init()
 
-                case 'n' | 'no':
-                    print('INFO     >> Please verify that "eventlog.csv" is not open somewhere else and try again.')
-                    print('INFO     >> Program closing...')
-                    sys.exit()
+    def init(log_path: Path | str=Path('eventlog.csv')) -> None:
+        '''
+        Creates the eventlog.csv file handler -- called automatically by the first `log_message()`
+        '''
+        if Logger.__initialized:
+            return
+        Logger.__initialized = True
 
-                case _:
-                    print("ERROR    >> invalid entry - please enter 'y' or 'n'\n")
+        try:        
+            # init logging module to enable error logging
+            # TODO - consider setting "setLevel" as a global var
+            Logger.__logger.setLevel(logging.DEBUG)
+            
+            Logger.__eventlog = logging.FileHandler(filename=log_path, mode='w')
+            Logger.__eventlog.setFormatter(Logger.__formatter)
+            
+            Logger.__logger.addHandler(Logger.__eventlog)
+            
+            Logger.__logging_enabled = True
+
+        except Exception as e:
+            print(f'CRITICAL >> Exception during Logger init, {e}')
+
+            # never block on a prompt when running unattended (cron, pipes, tests)
+            if not sys.stdin or not sys.stdin.isatty():
+                print('WARNING  >> Non-interactive session -- continuing with console output only')
+                Logger.__logging_enabled = False
+                return
+
+            while True:
+                user_continue = str(input('Would you like to continue with console output only? [y/n]:\n$ ')).lower()
+                match user_continue:
+                    case 'y' | 'yes':
+                        Logger.__logging_enabled = False
+                        break
+
+                    case 'n' | 'no':
+                        print('INFO     >> Please verify that "eventlog.csv" is not open somewhere else and try again.')
+                        print('INFO     >> Program closing...')
+                        sys.exit()
+
+                    case _:
+                        print("ERROR    >> invalid entry - please enter 'y' or 'n'\n")
+
+        if Logger.__logging_enabled:
+            Logger.log_message("info", "Logging successfully initialized")
+
+    def get_log_path() -> Path | None:
+        if Logger.__eventlog is None:
+            return None
+        return Path(Logger.__eventlog.baseFilename)
+
+    def set_console_output(enabled: bool) -> None:
+        '''
+        Turns console output of every message on or off -- eventlog.csv output is unaffected
+        '''
+        Logger.__console_enabled = enabled
 
-    
-    
     def is_logging_enabled() -> bool:          
         return Logger.__logging_enabled
         
+    def is_async_logging_enabled() -> bool:
+        return Logger.__async_listener is not None
+        
     def log_message(log_level: str, message: str, write_to_log: bool=True, print_to_console: bool=True) -> None:        
+        if not Logger.__initialized:
+            Logger.init()
+
+        __log_level = log_level.upper()
+        __write_to_log = write_to_log and Logger.is_logging_enabled()
+        print_to_console = print_to_console and Logger.__console_enabled
+
+        # async mode -- hand record to background writer; console and eventlog.csv output both happen on the writer thread
+        if Logger.__async_logger is not None:
+            if print_to_console or __write_to_log:
+                Logger.__async_logger.log(Logger.__LEVEL_NUMS[__log_level], message, extra={'to_console': print_to_console, 'to_log': __write_to_log})
+            return
+
         if print_to_console:
-            # generate a "label" formatted with padding, text alignment, and a specified symbol, representing the specified log level
-            __level_label = Formatter.pad_field_label(f'{log_level.upper()}', longest_field_len=len(max(Logger.__get_log_level_list(), key=len)), symbol='>>', alignment='center')
-            
-            # color message based on log-level severity using ANSI color codes
-            match log_level.upper():
-                case 'INFO':
-                    __labeled_message = f'{__level_label} {message}'                    # default 
-                case 'RESULT':
-                    __labeled_message = f'{TextColor.GREEN}{__level_label} {message}{TextColor.END}'   # green
-                case 'DEBUG':
-                    __labeled_message = f'{TextColor.CYAN}{__level_label} {message}{TextColor.END}'   # cyan 
-                case 'WARNING':
-                    __labeled_message = f'{TextColor.PURPLE}{__level_label} {message}{TextColor.END}'   # purple  
-                case 'ERROR':                
-                    __labeled_message = f'{TextColor.YELLOW}{__level_label} {message}{TextColor.END}'   # yellow
-                case 'CRITICAL':
-                    __labeled_message = f'{TextColor.RED}{__level_label} {message}{TextColor.END}'   # red
+            # color message based on log-level severity using precomputed ANSI color codes and labels
+            __prefix, __postfix = Logger.__CONSOLE_PREFIXES[__log_level]
             
             # console output        
-            print(f'[{TextColor.BLACK}{TestTime.get_fnow()}{TextColor.END}] {__labeled_message}')         # dark gray
+            print(f'[{TextColor.BLACK}{TestTime.get_fnow()}{TextColor.END}] {__prefix}{message}{__postfix}')         # dark gray
         
         # eventlog.csv output, if logging enabled
-        if write_to_log and Logger.is_logging_enabled():
-            __log_level = log_level.upper()
-            match __log_level:
-                case 'INFO':
-                    Logger.__logger.info(message)
-                case 'RESULT':
-                    Logger.__logger.result(message)
-                case 'DEBUG':
-                    Logger.__logger.debug(message)
-                case 'WARNING':
-                    Logger.__logger.warning(message)
-                case 'ERROR':
-                    Logger.__logger.error(message)
-                case 'CRITICAL':
-                    Logger.__logger.critical(message)
-        else:
-            pass
-    
-    def __get_log_level_list() -> list[str]:
-        return [name for name in logging._nameToLevel.keys()]
+        if __write_to_log:
+            Logger.__logger.log(Logger.__LEVEL_NUMS[__log_level], message)
+
+    def enable_async_logging(max_queue_size: int=constants.LOG_QUEUE_SIZE) -> None:
+        '''
+        Routes console and eventlog.csv output through a bounded queue drained by a background QueueListener thread
+
+        When the queue is full, `log_message()` blocks until the writer catches up rather than growing memory without bound
+        '''
+        if Logger.__async_listener is not None:
+            return
+
+        Logger.init()
+        __queue = queue.Queue(maxsize=max_queue_size)
+
+        __console_handler = logging.StreamHandler(sys.stdout)
+        __console_handler.setFormatter(_ConsoleFormatter(Logger.__CONSOLE_PREFIXES))
+        __console_handler.addFilter(lambda record: record.to_console)
+        __handlers = [__console_handler]
+
+        if Logger.is_logging_enabled():
+            __file_handler = logging.FileHandler(filename=Logger.__eventlog.baseFilename, mode='a')
+            __file_handler.setFormatter(Logger.__formatter)
+            __file_handler.addFilter(lambda record: record.to_log)
+            __handlers.append(__file_handler)
+
+            # flush and release synchronous handler so both handlers do not interleave writes
+            Logger.__logger.removeHandler(Logger.__eventlog)
+            Logger.__eventlog.close()
+
+        Logger.__async_logger = logging.getLogger('eventlog.async')
+        Logger.__async_logger.setLevel(logging.DEBUG)
+        Logger.__async_logger.propagate = False
+        Logger.__async_logger.addHandler(_BlockingQueueHandler(__queue))
+
+        Logger.__async_listener = _BlockingQueueListener(__queue, *__handlers)
+        Logger.__async_listener.start()
+
+        # drain queued records if the program exits without calling shutdown_logging() (e.g. sys.exit() on invalid config)
+        atexit.register(Logger.disable_async_logging)
+
+    def disable_async_logging() -> None:
+        '''
+        Drains the queue, stops the background writer and returns to synchronous output
+        '''
+        if Logger.__async_listener is None:
+            return
+
+        Logger.__async_listener.stop()
+        for handler in Logger.__async_listener.handlers:
+            handler.close()
+        for handler in list(Logger.__async_logger.handlers):
+            Logger.__async_logger.removeHandler(handler)
+
+        Logger.__async_listener = None
+        Logger.__async_logger = None
+
+        if Logger.is_logging_enabled():
+            Logger.__eventlog = logging.FileHandler(filename=Logger.__eventlog.baseFilename, mode='a')
+            Logger.__eventlog.setFormatter(Logger.__formatter)
+            Logger.__logger.addHandler(Logger.__eventlog)
     
     def export_log(log_export_path: Path) -> None:          
         try:             
@@ -110,7 +242,7 @@ class Logger(metaclass=Singleton):
             Logger.log_message('info', f'Attempting export of, "eventlog.csv", to {log_export_path}')
 
             # copy target log to export destination specified in config.json
-            shutil.copy('eventlog.csv', log_export_path)
+            shutil.copy(Logger.get_log_path(), log_export_path)
             Logger.log_message('result', f'Log export successful!')
          
         except Exception as e:
@@ -118,6 +250,7 @@ class Logger(metaclass=Singleton):
             Logger.log_message('info', 'Export attempt failed... log will not be exported')
     
     def shutdown_logging() -> None:     
+        Logger.disable_async_logging()
         return logging.shutdown()
 
 
@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+import cProfile
+import io
+import json
+import os
+from pathlib import Path
+import pstats
+from typing import Iterator
+
+from common import constants
+from common.Singleton import Singleton
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+from utils.TestTime import Span, TestTime
+
+
+class RunProfiler(metaclass=Singleton):
+    '''
+    Reports the spans recorded with `TestTime.span()` at the end of a run, and optionally profiles the run with cProfile
+
+    Output files are written next to the event log: a Chrome trace of every span (open in chrome://tracing or Perfetto) and, when profiling, a pstats dump
+    '''
+
+    def get_output_path(filename: str) -> Path:
+        __log_path = Logger.get_log_path()
+        return (__log_path.parent if __log_path is not None else Path(".")) / filename
+
+    @contextmanager
+    def profile(enabled: bool=True) -> Iterator[None]:
+        '''
+        Runs the `with` block under cProfile, dumps the stats next to the event log and logs the slowest functions by cumulative time
+
+        cProfile only sees the calling thread -- time spent in worker threads shows up as waits on their futures
+        '''
+        if not enabled:
+            yield
+            return
+
+        __profiler = cProfile.Profile()
+        __profiler.enable()
+        try:
+            yield
+        finally:
+            __profiler.disable()
+            __stats_path = RunProfiler.get_output_path(constants.PROFILE_STATS_FILE)
+            try:
+                __profiler.dump_stats(__stats_path)
+                __stream = io.StringIO()
+                pstats.Stats(__profiler, stream=__stream).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(constants.PROFILE_TOP_FUNCTIONS)
+                Logger.log_message("info", __stream.getvalue(), print_to_console=False)
+                Logger.log_message("info", f"Profile written to '{__stats_path}' -- view with `python -m pstats {__stats_path.name}`")
+
+            except Exception as e:
+                Logger.log_message("error", f"Unable to write profile to '{__stats_path}': {e}")
+
+    def summarize_spans(spans: list[Span]) -> list[dict]:
+        '''
+        Groups spans by name and console, in order of first start, and returns one row per group with call count, total and max milliseconds
+        '''
+        __rows = {}
+        for span in sorted(spans, key=lambda span: span.start_ns):
+            __console = span.attrs.get("console")
+            __row = __rows.get((span.name, __console))
+            if __row is None:
+                __row = __rows[(span.name, __console)] = {"name": span.name, "console": __console, "depth": span.depth, "calls": 0, "total_ms": 0.0, "max_ms": 0.0}
+            __duration_ms = (span.end_ns - span.start_ns) / 1e6
+            __row["calls"] += 1
+            __row["total_ms"] += __duration_ms
+            __row["max_ms"] = max(__row["max_ms"], __duration_ms)
+        return list(__rows.values())
+
+    def log_span_summary(header: str="Run timing summary") -> None:
+        __rows = RunProfiler.summarize_spans(TestTime.get_spans())
+        if not __rows:
+            return
+
+        __labels = [("  " * row["depth"]) + row["name"] + (f" [{row['console']}]" if row["console"] else "") for row in __rows]
+        __longest_label = max(len(label) for label in __labels)
+        Logger.log_message("info", Formatter.generate_header(header))
+        for label, row in zip(__labels, __rows):
+            __label = Formatter.pad_field_label(label, __longest_label, symbol=":")
+            Logger.log_message("result", f"{__label} {row['total_ms']:10.1f} ms total, {row['calls']:6d} call(s), {row['max_ms']:10.1f} ms max")
+
+        if TestTime.get_dropped_span_count():
+            Logger.log_message("warning", f"{TestTime.get_dropped_span_count()} span(s) were not recorded -- more than {constants.SPAN_LIMIT} spans in this run")
+
+    def write_trace(trace_path: Path | None=None) -> Path | None:
+        '''
+        Writes every recorded span as Chrome trace "complete" events, with the span summary under "otherData", and returns the trace path
+        '''
+        if trace_path is None:
+            trace_path = RunProfiler.get_output_path(constants.SPAN_TRACE_FILE)
+
+        __spans = TestTime.get_spans()
+        __origin_ns = min((span.start_ns for span in __spans), default=0)
+        __pid = os.getpid()
+        __trace = {
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": "rommediatool",
+                    "ph": "X",
+                    "ts": (span.start_ns - __origin_ns) / 1000,
+                    "dur": (span.end_ns - span.start_ns) / 1000,
+                    "pid": __pid,
+                    "tid": span.thread_id,
+                    "args": span.attrs,
+                }
+                for span in __spans
+            ],
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "started": TestTime.get_fstart(),
+                "dropped_spans": TestTime.get_dropped_span_count(),
+                "summary": RunProfiler.summarize_spans(__spans),
+            },
+        }
+
+        try:
+            with open(trace_path, "w", encoding="utf-8") as __trace_file:
+                json.dump(__trace, __trace_file, default=str)
+            Logger.log_message("info", f"Span trace written to '{trace_path}'", print_to_console=False)
+            return trace_path
+
+        except Exception as e:
+            Logger.log_message("error", f"Unable to write span trace to '{trace_path}': {e}")
+            return None
@@ -0,0 +1,144 @@
+from pathlib import Path
+import threading
+import time
+from typing import Callable
+
+from common import constants
+from common.Singleton import Singleton
+from utils.Formatter import Formatter
+from utils.Logger import Logger
+
+
+class RunStats(metaclass=Singleton):
+    '''
+    In-memory per-console, per-media-type counters for a run
+
+    In aggregate mode, per-file events are only counted -- a background timer logs progress every `progress_interval` seconds while files are being processed, and a single summary table is logged at the end of the run
+    Recording a file never checks the clock, and a stalled run (e.g. a slow network share) still reports progress on time
+    '''
+    RENAMED = "renamed"
+    EXPORTED = "exported"
+    LINKED = "linked"
+    SKIPPED = "skipped"
+    COLLIDED = "collided"
+    FAILED = "failed"
+
+    OUTCOMES = (RENAMED, EXPORTED, LINKED, SKIPPED, COLLIDED, FAILED)
+    __BYTES = len(OUTCOMES)         # index of byte count in counter lists
+
+    __lock = threading.Lock()
+    __counters = {}                 # (console, media_type) -> [count per outcome..., bytes]
+    __totals = [0] * (len(OUTCOMES) + 1)
+    __aggregate = True
+    __file_details = False
+    __start_time = time.monotonic()
+    __progress_stop = None          # threading.Event of the running progress timer
+    __progress_handler = None       # receives progress dicts instead of them being logged, see set_progress_handler()
+
+    def reset(aggregate: bool=True, file_details: bool=False, progress_interval: float=constants.PROGRESS_INTERVAL_SECONDS) -> None:
+        RunStats.stop_progress()
+        with RunStats.__lock:
+            RunStats.__counters = {}
+            RunStats.__totals = [0] * (len(RunStats.OUTCOMES) + 1)
+            RunStats.__aggregate = aggregate
+            RunStats.__file_details = file_details
+            RunStats.__start_time = time.monotonic()
+
+        if aggregate and progress_interval > 0:
+            RunStats.__progress_stop = threading.Event()
+            threading.Thread(target=RunStats.__run_progress_timer, args=(RunStats.__progress_stop, progress_interval), name="RunStats-progress", daemon=True).start()
+
+    def stop_progress() -> None:
+        '''
+        Stops the progress timer started by `reset()` -- called by `log_summary()`
+        '''
+        if RunStats.__progress_stop is not None:
+            RunStats.__progress_stop.set()
+            RunStats.__progress_stop = None
+
+    def set_progress_handler(handler: Callable[[dict], None] | None) -> None:
+        '''
+        Sends each progress update to `handler` (e.g. to write machine-readable progress records) instead of logging it; None restores logging
+        '''
+        RunStats.__progress_handler = handler
+
+    def is_aggregate_enabled() -> bool:
+        return RunStats.__aggregate
+
+    def is_file_detail_enabled() -> bool:
+        '''
+        Returns True if per-file messages should be logged -- always in non-aggregate mode, and only when requested in aggregate mode
+        '''
+        return RunStats.__file_details or not RunStats.__aggregate
+
+    def record(console: str, media_type: str, outcome: str, num_bytes: int=0) -> None:
+        __outcome_index = RunStats.OUTCOMES.index(outcome)
+
+        with RunStats.__lock:
+            __counter = RunStats.__counters.get((console, media_type))
+            if __counter is None:
+                __counter = RunStats.__counters[(console, media_type)] = [0] * (len(RunStats.OUTCOMES) + 1)
+            __counter[__outcome_index] += 1
+            __counter[RunStats.__BYTES] += num_bytes
+            RunStats.__totals[__outcome_index] += 1
+            RunStats.__totals[RunStats.__BYTES] += num_bytes
+
+    def record_path(path: Path, outcome: str, num_bytes: int=0) -> None:
+        '''
+        Records an outcome for a file laid out as `<console>/<media_dir>/<media_type>/<file>`
+        '''
+        __path = Path(path)
+        RunStats.record(__path.parents[2].name, __path.parent.name, outcome, num_bytes)
+
+    def get_progress() -> dict:
+        '''
+        Returns the run totals with the number of files processed, seconds elapsed and files per second so far
+        '''
+        __progress = RunStats.get_totals()
+        __progress["processed"] = sum(__progress[outcome] for outcome in RunStats.OUTCOMES)
+        __progress["elapsed_s"] = time.monotonic() - RunStats.__start_time
+        __progress["files_per_s"] = __progress["processed"] / max(__progress["elapsed_s"], 1e-9)
+        return __progress
+
+    def get_totals() -> dict[str, int]:
+        with RunStats.__lock:
+            __totals = dict(zip(RunStats.OUTCOMES, RunStats.__totals))
+            __totals["bytes"] = RunStats.__totals[RunStats.__BYTES]
+            return __totals
+
+    def log_summary(title: str="Run summary") -> None:
+        RunStats.stop_progress()
+        with RunStats.__lock:
+            __rows = sorted(RunStats.__counters.items())
+            __totals = list(RunStats.__totals)
+            __elapsed = time.monotonic() - RunStats.__start_time
+
+        __labels = [f"{console}/{media_type}" for (console, media_type), _ in __rows] + ["TOTAL"]
+        __longest_label = max(len(label) for label in __labels)
+
+        Logger.log_message("info", Formatter.generate_header(title))
+        for label, (_, counter) in zip(__labels, __rows):
+            Logger.log_message("info", f"{Formatter.pad_field_label(label, __longest_label)} {RunStats.__format_counter(counter)}")
+
+        Logger.log_message("result", f"{Formatter.pad_field_label('TOTAL', __longest_label)} {RunStats.__format_counter(__totals)} in {__elapsed:.1f}s")
+
+    def __format_counter(counter: list[int]) -> str:
+        # only show outcomes that occurred, to keep lines short
+        __outcomes = " | ".join(f"{outcome} {count:,}" for outcome, count in zip(RunStats.OUTCOMES, counter) if count) or "no files"
+        return f"{__outcomes} | {counter[RunStats.__BYTES] / 1_048_576:,.1f} MiB"
+
+    def __run_progress_timer(stop: threading.Event, interval: float) -> None:
+        __last_processed = 0
+        while not stop.wait(interval):
+            __progress = RunStats.get_progress()
+            # nothing new since the last update -- stay quiet rather than repeat the same line
+            if __progress["processed"] == __last_processed:
+                continue
+            __last_processed = __progress["processed"]
+
+            __handler = RunStats.__progress_handler
+            if __handler is not None:
+                __handler(__progress)
+            else:
+                __counter = [__progress[outcome] for outcome in RunStats.OUTCOMES] + [__progress["bytes"]]
+                Logger.log_message("info", f"Progress: {__progress['processed']:,} files processed ({RunStats.__format_counter(__counter)}) -- {__progress['files_per_s']:,.0f} files/s")
@@ -1,13 +1,33 @@
+from contextlib import contextmanager
 from datetime import datetime
 from datetime import timedelta
+import functools
+import threading
 import time
+from typing import Callable, Iterator, NamedTuple
 
+from common import constants
 from common.Singleton import Singleton
 
 
+class Span(NamedTuple):
+    name: str
+    start_ns: int               # `time.perf_counter_ns()` at span start
+    end_ns: int
+    depth: int                  # nesting level within the thread that recorded the span
+    thread_id: int
+    attrs: dict                 # e.g. {"console": "snes"} for per-console breakdowns
+
+
 class TestTime(metaclass=Singleton):
     __fstart = datetime.now().strftime('%m/%d/%Y %H:%M:%S')
     start_time = time.monotonic()
+    __fnow = __fstart
+    __fnow_second = -1
+
+    __spans = []
+    __dropped_spans = 0
+    __span_stack = threading.local()
     
     
     def get_fstart() -> str:
@@ -17,7 +37,12 @@ class TestTime(metaclass=Singleton):
         return time.monotonic()
     
     def get_fnow() -> str:
-        return datetime.now().strftime('%m/%d/%Y %H:%M:%S')
+        # timestamp only has 1 second resolution, so reuse the formatted string until the second changes
+        __now = int(time.time())
+        if __now != TestTime.__fnow_second:
+            TestTime.__fnow = datetime.fromtimestamp(__now).strftime('%m/%d/%Y %H:%M:%S')
+            TestTime.__fnow_second = __now
+        return TestTime.__fnow
     
     def get_timediff(start_time: float) -> str:
         __end_time = time.monotonic()
@@ -44,6 +69,51 @@ class TestTime(metaclass=Singleton):
         else:
             return f'{hours} hours, {minutes} minutes, and {seconds_ms} seconds'
 
+    @contextmanager
+    def span(name: str, **attrs) -> Iterator[None]:
+        '''
+        Records the time spent in the `with` block as a `Span` -- spans opened inside it (on the same thread) are nested under it
+
+        Meant for run phases and per-console work, not per-file calls; at most `constants.SPAN_LIMIT` spans are kept per run
+        '''
+        __depth = getattr(TestTime.__span_stack, "depth", 0)
+        TestTime.__span_stack.depth = __depth + 1
+        __start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            __end_ns = time.perf_counter_ns()
+            TestTime.__span_stack.depth = __depth
+            # list.append is atomic, so worker threads can record spans without a lock
+            if len(TestTime.__spans) < constants.SPAN_LIMIT:
+                TestTime.__spans.append(Span(name, __start_ns, __end_ns, __depth, threading.get_ident(), attrs))
+            else:
+                TestTime.__dropped_spans += 1
+
+    def timed(name: str | None=None) -> Callable:
+        '''
+        Decorator that records every call of the decorated function as a span named `name` (defaults to the function's qualified name)
+        '''
+        def __decorator(function: Callable) -> Callable:
+            __name = name or function.__qualname__
+
+            @functools.wraps(function)
+            def __wrapper(*args, **kwargs):
+                with TestTime.span(__name):
+                    return function(*args, **kwargs)
+            return __wrapper
+        return __decorator
+
+    def get_spans() -> list[Span]:
+        return list(TestTime.__spans)
+
+    def get_dropped_span_count() -> int:
+        return TestTime.__dropped_spans
+
+    def reset_spans() -> None:
+        TestTime.__spans = []
+        TestTime.__dropped_spans = 0
+
     
     
 